@@ -57,6 +57,10 @@ notes:
         action = 'store_true',
         help   = 'when creating new connections make them ipc:// instead of tcp://',
     )
+    parser.add_argument('--shm',
+        action = 'store_true',
+        help   = 'when creating new connections make them shm:// (shared memory images) instead of tcp://',
+    )
     parser.add_argument('-s', '--solo',
         action = 'store_true',
         help   = 'run a single Filter in same process',
@@ -88,7 +92,7 @@ notes:
 
     # parse filters
 
-    filters = parse_filters(args[:idx:-1], opts.ipc)
+    filters = parse_filters(args[:idx:-1], opts.ipc, opts.shm)
 
     # run
 
@@ -101,7 +101,7 @@ def filter_can_do_filter_outputs(filter_cls):
 
 
 def parse_filters(
-    args: list[str], ipc: bool = False
+    args: list[str], ipc: bool = False, shm: bool = False
 ) -> List[Tuple[Type, dict, str]]:  # -> [(filter class, config, referenced name), ...]  - [(filter_example.example.Example, {...}, 'Example')]
     """Parse command args to list of filter classes and configs."""
 
@@ -290,7 +290,7 @@ def parse_filters(
 
         if output.startswith(
             "tcp://"
-        ):  # parse 'tcp://' source and reserve ports, 'ipc://' output is unchanged as source
+        ):  # parse 'tcp://' source and reserve ports, 'ipc://' or 'shm://' output is unchanged as source
             addr, port = (output[6:].rsplit(":", 1) + ["5550"])[:2]
             output = f'tcp://{"localhost" if addr[:1] in "*0" else addr}:{port}'
 
@@ -337,8 +337,10 @@ def parse_filters(
                 )
 
             else:
-                if ipc:
-                    source_by_id[id] = new_source = f"ipc://{id_config.id}"
+                if ipc or shm:
+                    source_by_id[id] = new_source = (
+                        f"{'shm' if shm else 'ipc'}://{id_config.id}"
+                    )
                     id_config.outputs = new_source
 
                 else:
@@ -5,12 +5,14 @@ import re
 import sys
 import threading
 from multiprocessing import synchronize
+from queue import Queue, Empty, Full
 from time import time
 from typing import Any, Callable, Literal
 
 from .dlcache import is_cached_file, dlcache
 from .frame import Frame
 from .mq import POLL_TIMEOUT_MS, is_mq_addr, MQ
+from .zeromq import ZMQWaker
 from .logging import Logger
 from .utils import JSONType, json_getval, simpledeepcopy, dict_without, split_commas_maybe, rndstr, \
     timestr, parse_time_interval, parse_date_and_or_time, hide_uri_users_and_pwds, \
@@ -79,13 +81,21 @@ class FilterConfig(adict):  # types are informative to you as in the end they're
     sources_balance:     bool | None
     sources_timeout:     int | None
     sources_low_latency: bool | None
+    sources_decode:      bool | None
+    sources_prefetch:    int | None
+
+    batch_size:          int | None
+    batch_timeout_ms:    int | None
+
+    pipeline:            bool | None
 
     outputs:             str | list[str] | None
     outputs_balance:     bool | None
     outputs_timeout:     int | None
     outputs_required:    str | None
     outputs_metrics:     str | bool | None
-    outputs_jpg:         bool | None
+    outputs_jpg:         bool | str | None
+    outputs_codec:       str | None
 
     exit_after:          float | str | None  # '[[[days:]hrs:]mins:]secs[.subsecs]' or '@date/time/datetime'
 
@@ -111,9 +121,9 @@ class Filter:
             Unique string identifier for this filter. If this is not provided then it will be randomly generated.
 
         sources:
-            Sources for this filter, they can be either other filters ('tcp://', 'ipc://') or filter specific URIs like
-            'file://', 'rtsp://', 'http://', etc... When thet are other filters they are handled here and take the
-            following form (there can be multiple delimited by commas, whitespace is ignored):
+            Sources for this filter, they can be either other filters ('tcp://', 'ipc://', 'shm://') or filter specific
+            URIs like 'file://', 'rtsp://', 'http://', etc... When thet are other filters they are handled here and take
+            the following form (there can be multiple delimited by commas, whitespace is ignored):
 
                 "tcp://127.0.0.1" - All topics are received (not including "_metrics" if present).
                 "tcp://127.0.0.1;" - Only the 'main' topic is received.
@@ -126,7 +136,8 @@ class Filter:
         sources_balance:
             Source(s) are load balanced (previously split across multiple identical pipelines) so join them again here
             into one stream. This filter will act as if the multiple upstream `sources` are one single filter running
-            faster than it could if it were only one element. Must be paired with `outputs_balance` upstreamn.
+            faster than it could if it were only one element. Frames are put back in order in a reorder buffer so
+            workers of different speeds don't lose frames. Must be paired with `outputs_balance` upstreamn.
 
         sources_timeout:
             If specified then this is the maximum number of milliseconds to wait for any input from `sources`, on
@@ -139,15 +150,47 @@ class Filter:
             the moment of the request (like video), this will increase the amount of time that has passed between frame
             generation and when you get it (higher latency). Global env var default ZMQ_LOW_LATENCY.
 
+        sources_decode:
+            Decode jpg images of received `frames` on receipt (in parallel across topics) instead of lazily on first
+            access of the image. Useful with `pipeline` where this happens in the receive thread, pointless for filters
+            which don't look at the images. Global env var default SOURCES_DECODE.
+
+        sources_prefetch:
+            Number of frames upstream is allowed to send ahead of the frame this filter last received, instead of just
+            the one next frame preemptively requested normally. They wait in the socket buffers so that throughput is
+            not capped at one frame per round trip over high latency links or with bursty processing, at the cost of
+            up to that many frames of extra latency. Not used with `sources_low_latency`. Global env var default
+            ZMQ_PREFETCH, normally 1.
+
+        batch_size:
+            Opt-in batching, if more than 1 then up to this many received `frames` are collected and passed in a list
+            to process_batch() at once (which should be overridden for vectorized processing, by default it just calls
+            process() for each). The results are sent downstream in order as if they had come from process() one by
+            one. Only applies to filters with `sources`. Default 1.
+
+        batch_timeout_ms:
+            Maximum number of milliseconds to wait for more `frames` to fill a batch after the first one is received,
+            on timeout the batch is processed with as many as were received. Default 50.
+
+        pipeline:
+            Run the receive (including decoding of incoming messages) and the send (including encoding, jpg and
+            otherwise) in their own background threads with at most one `frames` buffered in between each of them and
+            process(). This way process() of one `frames` overlaps the receive of the next and the send of the previous
+            instead of all three running one after the other. Nothing changes for process() or process_batch(), which
+            still run in the main thread, but up to one `frames` of extra latency is added on each side. Default False.
+
         outputs:
-            Where other filters will connect to get their data, e.g. "tcp://127.0.0.1", "tcp://*:5552", "ipc://name".
-            NOT the destination filters themselves! Repeat, this is a bind point where this filter will listen for
-            connections, not where it should connect to send data. This field is also commonly overloaded by specific
-            output filters like video or messaging queue outputs.
+            Where other filters will connect to get their data, e.g. "tcp://127.0.0.1", "tcp://*:5552", "ipc://name",
+            "shm://name" (same host only, images passed through shared memory). NOT the destination filters themselves!
+            Repeat, this is a bind point where this filter will listen for connections, not where it should connect to
+            send data. This field is also commonly overloaded by specific output filters like video or messaging queue
+            outputs.
 
         outputs_balance:
-            Balance sending frames across all outputs. Not normal operation, meant for a load balancing topology. Must
-            be paired with `sources_balance` downstream.
+            Balance sending frames across all outputs. Not normal operation, meant for a load balancing topology. Each
+            frame goes to the output expected to get to it soonest going by how many frames it has in flight and its
+            observed time per frame, so workers of different speeds get work in proportion. Must be paired with
+            `sources_balance` downstream.
 
         outputs_timeout:
             If specified then this is the maximum number of milliseconds to wait for to output `frames`, on timeout
@@ -160,7 +203,15 @@ class Filter:
         outputs_jpg:
             Whether to output images as jpg True, False makes sure NOT to output them as jpg even if returned from
             process() as such, None uses env var default which is normally to pass them on as they are returned from
-            process(). Global env var default ZMQ_LOW_LATENCY. Gloval env var default OUTPUTS_JPG.
+            process(). 'auto' picks per output between as is, jpg of decreasing quality and downscaled jpg according to
+            how much each output holds up sending (limits OUTPUTS_JPG_MIN_QUALITY and OUTPUTS_JPG_MAX_DOWNSCALE), so
+            local outputs get raw and remote ones as much jpg as they need. Global env var default ZMQ_LOW_LATENCY.
+            Gloval env var default OUTPUTS_JPG.
+
+        outputs_codec:
+            Codec for frame data sent on outputs, 'json', 'orjson' (same as json on the wire but faster, needs orjson) or
+            'msgpack' (binary, keeps bytes as they are, needs msgpack here and downstream). Numpy arrays in frame data
+            are sent as is in their own message parts with any codec. Global env var default OUTPUTS_CODEC.
 
         exit_after:
             Exit after this amount of time in seconds or as a formatted string '[[[days[d]:]hrs:]mins:]secs[.subsecs]'.
@@ -245,7 +296,17 @@ class Filter:
     From mq.py:
         OUTPUTS_JPG:
             If 'true'ish then encode output images to network as jpg, 'false'ish only send decoded, 'null' send as is as
-            was passed from process().
+            was passed from process(), 'auto' to choose per output (see `outputs_jpg`).
+
+        OUTPUTS_JPG_MIN_QUALITY:
+            Lowest jpg quality 'auto' `outputs_jpg` will go down to. Default 50.
+
+        OUTPUTS_JPG_MAX_DOWNSCALE:
+            Largest downscale denominator (1, 2, 4 or 8) 'auto' `outputs_jpg` will go down to after the lowest quality.
+            Downstream gets smaller images. Default 1, never downscale.
+
+        OUTPUTS_CODEC:
+            Default codec for frame data on outputs, 'json', 'orjson' or 'msgpack'. Default 'json'.
 
         OUTPUTS_METRICS:
             If true then send metrics as '_metrics' on all zeromq outputs. If false then don't send. If string then is
@@ -256,6 +317,13 @@ class Filter:
             officially connected or not. Default true to support doubly ephemeral '??' listeners which are most likely
             the only things connected. Does not affect metrics on normal output channels.
 
+        SOURCES_DECODE:
+            Default for `sources_decode` if not explicitly specified. Default false.
+
+        MQ_IMAGE_THREADS:
+            Number of worker threads for jpg encoding of outgoing and decoding of incoming images when a message has
+            more than one topic needing it, 0 or 1 for serial. Default min(4, cpu count).
+
         MQ_LOG:
             Default outputs logging if not explicitly specified. Default 'none'.
 
@@ -263,6 +331,22 @@ class Filter:
             Whether to sync expected message IDs between outgoing and incoming zeromq message queues. Advanced thing,
             don't touch unless u know what u doing.
 
+    From frame.py:
+        FRAME_JPG_BACKEND:
+            Library for jpg encoding and decoding, 'turbojpeg' (needs PyTurboJPEG), 'cv2' or 'auto'. Default 'auto'.
+
+        FRAME_JPG_QUALITY:
+            Quality of jpg encoding, 1 to 100. Default 95.
+
+        FRAME_JPG_SUBSAMPLING:
+            Chroma subsampling of jpg encoding, '444', '422' or '420'. Default '420'.
+
+        FRAME_JPG_FAST_DCT:
+            If 'true'ish then use the fast DCT for jpg encoding and decoding (turbojpeg backend only). Default false.
+
+        FRAME_CACHE_SIZE:
+            Maximum number of cached readonly format / scale conversions per readonly image, 0 disables. Default 8.
+
     From metrics.py:
         GPU_METRICS:
             Set to 'false'ish to turn off GPU metrics.
@@ -301,8 +385,13 @@ class Filter:
             messages even with LINGER set high.
 
         ZMQ_POLL_TIMEOUT:
-            Length to wait in milliseconds each poll for a message to come in in milliseconds. Requests for more frames
-            are sent at this interval as well.
+            Length to wait in milliseconds each poll for a message to come in in milliseconds. Unanswered requests for
+            more frames are resent at this interval as well, backing off up to ZMQ_REQ_IVL_MAX while nothing comes in.
+            Filters don't poll for exit, their stop event wakes the pollers directly.
+
+        ZMQ_REQ_IVL_MAX:
+            Maximum interval in milliseconds for resending unanswered requests, must be comfortably less than
+            ZMQ_CONN_TIMEOUT. Default ZMQ_CONN_TIMEOUT / 4.
 
         ZMQ_CONN_TIMEOUT:
             Length of time in milliseconds without receiving anything from a downstream connection in order to consider
@@ -327,11 +416,41 @@ class Filter:
             If 'true'ish then favor lower latency over higher throughput. Will only help in some cases with the right
             properties. Really on things immediately downstream of VideoIn.
 
+        ZMQ_PREFETCH:
+            Default for `sources_prefetch` if not explicitly specified. Default 1.
+
+        ZMQ_REORDER_TIMEOUT:
+            Milliseconds a `sources_balance` filter waits for a missing frame from a worker while holding later ones
+            before giving up on it. Default ZMQ_CONN_TIMEOUT.
+
+        ZMQ_REORDER_MAX:
+            Number of frames a `sources_balance` filter holds waiting for a missing one before it stops requesting more
+            from the workers which are already past it. Default 32.
+
+        ZMQ_TOPIC_FILTER:
+            Only publish (and encode) the topics which at least one downstream filter is subscribed to, they say which
+            in their requests. Doubly ephemeral '??' listeners only see what the others want. Default false.
+
         ZMQ_WARN_NEWER:
             Warn on newer messages than expected.
 
         ZMQ_WARN_OLDER:
             Warn on older messages than expected.
+
+        ZMQ_SHM_SLOTS:
+            Maximum number of shared memory slots in the ring for each topic message part on 'shm://' outputs. If this
+            many are pinned by receivers still holding on to them then messages are sent inline.
+
+        ZMQ_SHM_MIN_SIZE:
+            Message parts smaller than this many bytes are sent inline even on 'shm://' outputs.
+
+        ZMQ_ENV_BINARY:
+            If 'false'ish then never advertise or send binary message envelopes, only JSON (for outside listeners which
+            only understand JSON). Binary envelopes are still understood if received.
+
+        ZMQ_RECV_ZEROCOPY_MIN:
+            Received message parts of at least this many bytes are passed on as readonly memoryviews of the zeromq
+            message buffer instead of being copied into bytes.
     """
 
     config:  FilterConfig
@@ -511,20 +630,32 @@ class Filter:
     
     emitter:FilterLineage.OpenFilterLineage = set_open_lineage()
     def process_frames_metadata(self,frames, emitter):
-            
-            keys = list(frames.keys())
-            filtered_dict = None
-            for key in keys:
-                frame_dict = frames[key].__dict__
-                filtered_dict = dict(list(frame_dict.items())[2:])
-            emitter.update_heartbeat_lineage(facets=filtered_dict)
+        """Update lineage facets from `frames` immediately, normally sampled by the emitter's heartbeat thread instead."""
+        emitter.update_heartbeat_lineage(facets=FilterLineage.frames_to_facets(frames))
+
     def process_frames(self, frames: dict[str, Frame]) -> dict[str, Frame] | Callable[[], dict[str, Frame] | None] | None:
         """Call process() and deal with it if returns a Callable."""
-        if frames:
-            proces_frames_data = threading.Thread(target=self.process_frames_metadata, args=(frames, self.emitter))
-            proces_frames_data.start()
-       
-        if (frames := self.process(frames)) is None:
+        if frames and (emitter := self.emitter) is not None:
+            emitter.sample_frames(frames)
+
+        return self.normalize_processed(self.process(frames))
+
+    def process_frames_batch(self, frames_batch: list[dict[str, Frame]]) \
+            -> list[dict[str, Frame] | Callable[[], dict[str, Frame] | None] | None]:
+        """Call process_batch() and deal with each result like process_frames()."""
+
+        if (emitter := self.emitter) is not None:
+            emitter.sample_frames(frames_batch[-1])
+
+        if len(results := self.process_batch(frames_batch)) != len(frames_batch):
+            raise ValueError(f'process_batch() returned {len(results)} results for {len(frames_batch)} frames')
+
+        return [self.normalize_processed(frames) for frames in results]
+
+    @staticmethod
+    def normalize_processed(frames: dict[str, Frame] | Frame | Callable[[], dict[str, Frame] | Frame | None] | None) \
+            -> dict[str, Frame] | Callable[[], dict[str, Frame] | None] | None:
+        if frames is None:
             return None
 
         if callable(frames):
@@ -532,30 +663,100 @@ class Filter:
         else:
             return {'main': frames} if isinstance(frames, Frame) else frames
 
-    def loop_once(self) -> None:
-        """Loop twice."""
+    def wait_timeout(self, timeout: float) -> int | None:
+        """How long in milliseconds a single MQ wait should block for an overall `timeout` (which may be inf). The MQ
+        is woken by the stop event so the wait can be the whole thing (None if forever), unless there is no stop waker
+        or we wait on the pipeline queue instead, in which case it is sliced to check for stop regularly."""
 
-        sources_timeout = self.sources_timeout
+        if getattr(self, 'waker', None) is None or self.pipeline_recv_queue is not None:
+            return min(POLL_TIMEOUT_MS, timeout)
+
+        return None if timeout == float('inf') else int(timeout)
+
+    def send_frames(self, frames: dict[str, Frame] | Callable[[], dict[str, Frame] | None] | None) -> None:
         outputs_timeout = self.outputs_timeout
 
-        while (frames := self.mq.recv(min(POLL_TIMEOUT_MS, sources_timeout))) is None:
+        while not self.mq.send(frames, wait := self.wait_timeout(outputs_timeout)):
             if self.stop_evt.is_set():
                 self.exit()
 
-            if (sources_timeout := sources_timeout - POLL_TIMEOUT_MS) <= 0:
-                frames = {}
+            if wait is not None and (outputs_timeout := outputs_timeout - wait) <= 0:
+                break
+
+    def recv_frames(self, timeout: int | None) -> tuple[dict[str, Frame], Any] | None:
+        """Receive `frames` along with the message id state they need to be sent with, or None on timeout. Comes from
+        the pipeline receive thread if that is running, otherwise directly from the MQ."""
+
+        if (recv_queue := self.pipeline_recv_queue) is None:
+            return None if (frames := self.mq.recv(timeout)) is None else (frames, self.mq.send_state)
+
+        if (exc := self.pipeline_exc) is not None:
+            raise exc
+
+        try:
+            return recv_queue.get(timeout=timeout / 1000)
+        except Empty:
+            return None
+
+    def send_frames_with_state(self, frames: dict[str, Frame] | Callable[[], dict[str, Frame] | None] | None,
+                               send_state: Any) -> None:
+        """Send processed `frames` with the message id state they were received with. Hands them off to the pipeline
+        send thread if that is running, otherwise sends directly."""
+
+        if (send_queue := self.pipeline_send_queue) is None:
+            self.mq.send_state = send_state
 
+            self.send_frames(frames)
+
+            return
+
+        while True:
+            if (exc := self.pipeline_exc) is not None:
+                raise exc
+
+            try:
+                send_queue.put((frames, send_state), timeout=POLL_TIMEOUT_SEC)
+            except Full:
+                if self.stop_evt.is_set():
+                    self.exit()
+            else:
                 break
 
-        frames = self.process_frames(frames)
+    def loop_once(self) -> None:
+        """Loop twice."""
+
+        sources_timeout = self.sources_timeout
 
-        while not self.mq.send(frames, min(POLL_TIMEOUT_MS, outputs_timeout)):
+        while (res := self.recv_frames(wait := self.wait_timeout(sources_timeout))) is None:
             if self.stop_evt.is_set():
                 self.exit()
 
-            if (outputs_timeout := outputs_timeout - POLL_TIMEOUT_MS) <= 0:
+            if wait is not None and (sources_timeout := sources_timeout - wait) <= 0:
+                res = ({}, None if self.pipeline_recv_queue is not None else self.mq.send_state)
+
                 break
 
+        frames, send_state = res
+
+        if (batch_size := self.batch_size) == 1 or not frames:
+            self.send_frames_with_state(self.process_frames(frames), send_state)
+
+        else:  # collect more frames for batch, remembering the message id state of each so they go out with the right ids
+            frames_batch = [frames]
+            send_states  = [send_state]
+            t_end        = time() + self.batch_timeout_ms / 1000
+
+            while len(frames_batch) < batch_size and (timeout := int((t_end - time()) * 1000)) > 0:
+                if (res := self.recv_frames(self.wait_timeout(timeout))) is not None:
+                    frames_batch.append(res[0])
+                    send_states.append(res[1])
+
+                elif self.stop_evt.is_set():
+                    self.exit()
+
+            for frames, send_state in zip(self.process_frames_batch(frames_batch), send_states):
+                self.send_frames_with_state(frames, send_state)
+
         if (exit_after_t := self.exit_after_t) is not None and time() >= exit_after_t:
             self.exit('exit_after')
   
@@ -586,9 +787,9 @@ class Filter:
                 logger.error(exc)
 
         if (sources := config.sources) and not all(is_mq_addr(bad_src := source) for source in sources):
-            raise ValueError(f'invalid source {bad_src!r}, only tcp:// or ipc:// sources allowed')
+            raise ValueError(f'invalid source {bad_src!r}, only tcp://, ipc:// or shm:// sources allowed')
         if (outputs := config.outputs) and not all(is_mq_addr(bad_out := output) for output in outputs):
-            raise ValueError(f'invalid output {bad_out!r}, only tcp:// or ipc:// outputs allowed')
+            raise ValueError(f'invalid output {bad_out!r}, only tcp://, ipc:// or shm:// outputs allowed')
 
         self.logger.set_fixed_metrics(**(config.extra_metrics or {}),
             dim_environment            = ENVIRONMENT if (env := config.environment) is None else env,
@@ -613,6 +814,7 @@ class Filter:
 
             logger.info(f'exit scheduled at: {dt.isoformat()}')
 
+        self.waker           = ZMQWaker(self.stop_evt)  # wakes up MQ waits on stop so they don't need to poll for it
         self.sources_timeout = float('inf') if (to := config.sources_timeout) is None else int(to)
         self.outputs_timeout = float('inf') if (to := config.outputs_timeout) is None else int(to)
         srcs_n_topics        = None if sources is None else [self.parse_topics(s) for s in sources]
@@ -620,20 +822,103 @@ class Filter:
         self.mq = MQ(srcs_n_topics, outputs, config.id,
             srcs_balance  = bool(config.sources_balance),
             srcs_low_lat  = None if (_ := config.sources_low_latency) is None else bool(_),
+            srcs_decode   = None if (_ := config.sources_decode) is None else bool(_),
+            srcs_prefetch = None if (_ := config.sources_prefetch) is None else int(_),
             outs_balance  = bool(config.outputs_balance),
             outs_required = config.outputs_required,
             outs_jpg      = config.outputs_jpg,
+            outs_codec    = config.outputs_codec,
             outs_metrics  = config.outputs_metrics,
             metrics_cb    = self.logger.write_metrics if self.logger.enabled else None,
             on_exit_msg   = on_exit_msg,
             mq_log        = config.mq_log,
             mq_msgid_sync = config.mq_msgid_sync,
+            waker         = self.waker,
         )
 
+        self.batch_size       = 1 if (bs := config.batch_size) is None or self.mq.receiver is None else int(bs)
+        self.batch_timeout_ms = 50 if (to := config.batch_timeout_ms) is None else int(to)
+
+        self.pipeline_recv_queue = None
+        self.pipeline_send_queue = None
+        self.pipeline_exc        = None
+        self.pipeline_evt        = threading.Event()
+        self.pipeline_threads    = []
+
+        if config.pipeline:
+            self.pipeline_send_queue = Queue(1)
+
+            self.pipeline_threads.append(threading.Thread(target=self.pipeline_send_thread, daemon=True))
+
+            if self.mq.receiver is not None:  # no point in a receive thread if there is nothing to receive
+                self.pipeline_recv_queue = Queue(1)
+
+                self.pipeline_threads.append(threading.Thread(target=self.pipeline_recv_thread, daemon=True))
+
+            for thread in self.pipeline_threads:
+                thread.start()
+
     def fini(self):
         """Shut down inter-filter communication and any other system level stuff."""
+        self.pipeline_stop()
         self.emitter.emit_stop()
         self.mq.destroy()
+        self.waker.close()
+
+    def pipeline_recv_thread(self):
+        """Receive `frames` with their message id states into the receive queue until told to stop."""
+
+        try:
+            recv_queue = self.pipeline_recv_queue
+            evt        = self.pipeline_evt
+
+            while not evt.is_set():
+                if (res := self.mq.recv(POLL_TIMEOUT_MS, with_state=True)) is not None:
+                    while not evt.is_set():
+                        try:
+                            recv_queue.put(res, timeout=POLL_TIMEOUT_SEC)
+                        except Full:
+                            pass
+                        else:
+                            break
+
+        except BaseException as exc:  # handed over to be raised in the main thread
+            self.pipeline_exc = exc
+
+    def pipeline_send_thread(self):
+        """Send `frames` with their message id states from the send queue until told to stop."""
+
+        try:
+            send_queue = self.pipeline_send_queue
+            evt        = self.pipeline_evt
+
+            while not evt.is_set():
+                try:
+                    frames, send_state = send_queue.get(timeout=POLL_TIMEOUT_SEC)
+                except Empty:
+                    continue
+
+                self.mq.send_state = send_state
+                outputs_timeout    = self.outputs_timeout
+
+                while not self.mq.send(frames, min(POLL_TIMEOUT_MS, outputs_timeout)):
+                    if evt.is_set() or (outputs_timeout := outputs_timeout - POLL_TIMEOUT_MS) <= 0:
+                        break
+
+        except BaseException as exc:  # handed over to be raised in the main thread
+            self.pipeline_exc = exc
+
+    def pipeline_stop(self):
+        """Stop and wait for pipeline threads if they are running, must be done before anything else touches the MQ
+        from the main thread. Idempotent."""
+
+        if threads := getattr(self, 'pipeline_threads', None):
+            self.pipeline_evt.set()
+
+            for thread in threads:
+                thread.join()
+
+            self.pipeline_threads = []
 
     # - FOR SUBCLASS ---------------------------------------------------------------------------------------------------
 
@@ -663,6 +948,12 @@ class Filter:
             elif not isinstance(extra_metrics, dict):
                 raise ValueError(f'invalid extra_metrics {extra_metrics!r}, must be list or dict of key/value pairs')
 
+        if (batch_size := config.batch_size) is not None and (not isinstance(batch_size, int) or batch_size < 1):
+            raise ValueError(f'invalid batch_size {batch_size!r}, must be an int >= 1')
+        if (batch_timeout_ms := config.batch_timeout_ms) is not None and \
+                (not isinstance(batch_timeout_ms, (int, float)) or batch_timeout_ms < 0):
+            raise ValueError(f'invalid batch_timeout_ms {batch_timeout_ms!r}, must be a number >= 0')
+
         if (mq_log := config.mq_log) is not None:
             if (new_mq_log := MQ.LOG_MAP.get(mq_log)) is None:
                 raise ValueError(f'invalid mq_log {mq_log!r}, must be one of {list(MQ.LOG_MAP)}')
@@ -708,6 +999,15 @@ class Filter:
 
         raise NotImplementedError
 
+    def process_batch(self, frames_batch: list[dict[str, Frame]]) \
+            -> list[dict[str, Frame] | Frame | Callable[[], dict[str, Frame] | Frame | None] | None]:
+        """Batched processing, only called if config `batch_size` is more than 1. Gets a list of `frames` as they were
+        received, in order, and must return a list of the same length of results for each of them, each one being
+        anything that process() can return. Override this for vectorized processing, the default just calls process()
+        for each `frames`."""
+
+        return [self.process(frames) for frames in frames_batch]
+
 
     # - PUBLIC ---------------------------------------------------------------------------------------------------------
 
@@ -791,6 +1091,8 @@ class Filter:
                     finally:
                         is_exc = isinstance(sys.exc_info()[1], Exception)
 
+                        filter.pipeline_stop()
+
                         if prop_exit & (2 if is_exc else 1):
                             filter.mq.send_exit_msg('error' if is_exc else 'clean')
 
@@ -819,6 +1121,7 @@ class Filter:
         finally:
             cls.emitter.stop_lineage_heart_beat()
             cls.emitter.emit_stop()
+            cls.emitter.shutdown()
             stop_evt.set()
 
     @staticmethod
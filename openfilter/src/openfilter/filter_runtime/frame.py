@@ -3,22 +3,226 @@ minimize format conversions and redundant jpg encoding. So that for example if a
 network, and it is only read, that the jpg data is available on the way out without having to reencode.
 
 WARNING! Grayscale hasn't gotten all the love it probably deserves.
+
+YUV 4:2:0 formats 'NV12' (Y plane then interleaved UV plane) and 'I420' (Y plane then U plane then V plane) are stored
+as a single 2D uint8 array of shape (height * 3 // 2, width) like ffmpeg and cv2 use them, so `frame.shape` is the shape
+of that array while `frame.height` and `frame.width` are those of the picture. Both must be even. Conversions to other
+formats are lazy like all the others, GRAY from YUV is just the Y plane. Raw YUV is half the size of BGR over the
+network and can be passed between video decode and encode without any color conversion.
+
+Environment variables:
+    FRAME_JPG_BACKEND: Which library does jpg encoding and decoding. 'turbojpeg' uses libjpeg-turbo directly through
+        PyTurboJPEG (must be installed), 'cv2' uses OpenCV, 'auto' uses turbojpeg if available otherwise cv2. Default
+        'auto'.
+
+    FRAME_JPG_QUALITY: Quality of jpg encoding, 1 to 100. Default 95.
+
+    FRAME_JPG_SUBSAMPLING: Chroma subsampling of jpg encoding, one of '444', '422' or '420'. Default '420'.
+
+    FRAME_JPG_FAST_DCT: If 'true'ish then use the fast (less accurate) DCT for jpg encoding and decoding. Only has an
+        effect with the turbojpeg backend. Default false.
+
+    FRAME_CACHE_SIZE: Maximum number of readonly conversions (other formats and scales) of a readonly image kept
+        cached, least recently used are dropped first. 0 disables caching. Default 8.
 """
 
+import os
+import weakref
 from typing import Any, Literal, Union
 
 import cv2
 import numpy as np
 from numpy import ndarray
 
+from .utils import json_getval
+
 __all__ = ['ShapeAndFormat', 'Frame']
 
 ShapeAndFormat = tuple[tuple[int, int, int] | tuple[int, int], str]
 
+FRAME_JPG_BACKEND     = (os.getenv('FRAME_JPG_BACKEND') or 'auto').lower()
+FRAME_JPG_QUALITY     = int(os.getenv('FRAME_JPG_QUALITY') or 95)
+FRAME_JPG_SUBSAMPLING = os.getenv('FRAME_JPG_SUBSAMPLING') or '420'
+FRAME_JPG_FAST_DCT    = bool(json_getval((os.getenv('FRAME_JPG_FAST_DCT') or 'false').lower()))
+FRAME_CACHE_SIZE      = int(os.getenv('FRAME_CACHE_SIZE') or 8)
+
+JPG_SCALES            = (1, 2, 4, 8)  # supported scaled decode denominators, 1/1, 1/2, 1/4 and 1/8
+
+if FRAME_JPG_BACKEND not in ('auto', 'turbojpeg', 'cv2'):
+    raise ValueError(f"invalid FRAME_JPG_BACKEND {FRAME_JPG_BACKEND!r}, must be one of 'auto', 'turbojpeg' or 'cv2'")
+if not 1 <= FRAME_JPG_QUALITY <= 100:
+    raise ValueError(f'invalid FRAME_JPG_QUALITY {FRAME_JPG_QUALITY}, must be 1 to 100')
+if FRAME_JPG_SUBSAMPLING not in ('444', '422', '420'):
+    raise ValueError(f"invalid FRAME_JPG_SUBSAMPLING {FRAME_JPG_SUBSAMPLING!r}, must be one of '444', '422' or '420'")
+
+turbojpeg = None
+
+if FRAME_JPG_BACKEND != 'cv2':
+    try:
+        from turbojpeg import TurboJPEG, TJPF_BGR, TJPF_GRAY, TJSAMP_444, TJSAMP_422, TJSAMP_420, TJSAMP_GRAY, \
+            TJFLAG_FASTDCT, tjMCUWidth, tjMCUHeight
+
+        turbojpeg = TurboJPEG()  # can fail if the libturbojpeg shared library is not found
+
+    except (ImportError, OSError, RuntimeError):
+        if FRAME_JPG_BACKEND == 'turbojpeg':
+            raise
+
+HAS_TURBOJPEG = turbojpeg is not None
+
+if HAS_TURBOJPEG:
+    TJ_SUBSAMPLING = {'444': TJSAMP_444, '422': TJSAMP_422, '420': TJSAMP_420}[FRAME_JPG_SUBSAMPLING]
+    TJ_FLAGS       = TJFLAG_FASTDCT if FRAME_JPG_FAST_DCT else 0
+
+CV2_ENCODE_PARAMS = [cv2.IMWRITE_JPEG_QUALITY, FRAME_JPG_QUALITY, cv2.IMWRITE_JPEG_SAMPLING_FACTOR, {
+    '444': cv2.IMWRITE_JPEG_SAMPLING_FACTOR_444,
+    '422': cv2.IMWRITE_JPEG_SAMPLING_FACTOR_422,
+    '420': cv2.IMWRITE_JPEG_SAMPLING_FACTOR_420,
+}[FRAME_JPG_SUBSAMPLING]]
+
+CV2_YUV2 = {
+    ('NV12', 'RGB'): cv2.COLOR_YUV2RGB_NV12,
+    ('NV12', 'BGR'): cv2.COLOR_YUV2BGR_NV12,
+    ('I420', 'RGB'): cv2.COLOR_YUV2RGB_I420,
+    ('I420', 'BGR'): cv2.COLOR_YUV2BGR_I420,
+}
+
+CV2_REDUCED = {  # (color, gray) imdecode flags for each scale
+    1: (cv2.IMREAD_COLOR, cv2.IMREAD_GRAYSCALE),
+    2: (cv2.IMREAD_REDUCED_COLOR_2, cv2.IMREAD_REDUCED_GRAYSCALE_2),
+    4: (cv2.IMREAD_REDUCED_COLOR_4, cv2.IMREAD_REDUCED_GRAYSCALE_4),
+    8: (cv2.IMREAD_REDUCED_COLOR_8, cv2.IMREAD_REDUCED_GRAYSCALE_8),
+}
+
+
+def yuv_planes(image: ndarray, format: str) -> tuple[ndarray, list[ndarray]]:
+    """Split YUV image into Y plane (h, w) and list of chroma planes, [UV (h/2, w/2, 2)] for NV12 or [U (h/2, w/2),
+    V (h/2, w/2)] for I420. Views if image is contiguous."""
+
+    h, w = image.shape[0] * 2 // 3, image.shape[1]
+    uv   = image[h:].reshape(-1)
+
+    if format == 'NV12':
+        return image[:h], [uv.reshape(h // 2, w // 2, 2)]
+
+    return image[:h], [uv[:(n := h // 2 * (w // 2))].reshape(h // 2, w // 2), uv[n:].reshape(h // 2, w // 2)]
+
+
+def yuv_merge(y: ndarray, chroma: list[ndarray], format: str) -> ndarray:
+    """Make new YUV image in `format` from Y plane and chroma planes as returned by yuv_planes(), the chroma planes can
+    be given in either layout (one interleaved UV or separate U and V)."""
+
+    h, w  = y.shape
+    image = np.empty((h * 3 // 2, w), np.uint8)
+    uv    = image[h:].reshape(-1)
+
+    image[:h] = y
+
+    if format == 'NV12':
+        uv = uv.reshape(h // 2, w // 2, 2)
+
+        if len(chroma) == 1:
+            uv[:] = chroma[0]
+        else:
+            uv[..., 0], uv[..., 1] = chroma
+
+    elif len(chroma) == 1:
+        uv[:(n := h // 2 * (w // 2))], uv[n:] = chroma[0][..., 0].reshape(-1), chroma[0][..., 1].reshape(-1)
+
+    else:
+        uv[:(n := h // 2 * (w // 2))], uv[n:] = chroma[0].reshape(-1), chroma[1].reshape(-1)
+
+    return image
+
+
+def cvt_format(image: ndarray, src: str, dst: str) -> ndarray:
+    """Convert image from format `src` to different format `dst`, always returns a NEW image. RGB / BGR / GRAY to YUV
+    needs even dimensions."""
+
+    if src in Frame.YUV_FORMATS:
+        if dst == 'GRAY':
+            return image[:image.shape[0] * 2 // 3].copy()
+        if dst in Frame.YUV_FORMATS:
+            return yuv_merge(*yuv_planes(image, src), dst)
+
+        return cv2.cvtColor(image, CV2_YUV2[src, dst])
+
+    if dst in Frame.YUV_FORMATS:
+        h, w = image.shape[:2]
+
+        if h & 1 or w & 1:
+            raise ValueError(f'YUV format {dst} needs even dimensions, not {w}x{h}')
+        if src == 'GRAY':
+            return yuv_merge(image, [np.full((h // 2, w // 2, 2), 128, np.uint8)], dst)
+
+        image = cv2.cvtColor(image, cv2.COLOR_RGB2YUV_I420 if src == 'RGB' else cv2.COLOR_BGR2YUV_I420)
+
+        return image if dst == 'I420' else yuv_merge(*yuv_planes(image, 'I420'), dst)
+
+    if dst == 'GRAY':
+        return cv2.cvtColor(image, cv2.COLOR_RGB2GRAY if src == 'RGB' else cv2.COLOR_BGR2GRAY)
+
+    return cv2.cvtColor(image, cv2.COLOR_RGB2BGR)  # RGB <-> BGR or GRAY -> 3 channels
+
+
+def jpg_encode(image: ndarray, quality: int | None = None) -> bytes | bytearray:
+    """Encode a BGR or GRAY image (an RGB image is encoded as if it were BGR, same as cv2, so it will decode back to the
+    same RGB image) to jpg with the configured backend, quality (unless `quality` is given) and subsampling."""
+
+    quality = FRAME_JPG_QUALITY if quality is None else quality
+
+    if turbojpeg is not None:
+        if image.ndim == 2:
+            return turbojpeg.encode(image[..., None], quality, TJPF_GRAY, TJSAMP_GRAY, TJ_FLAGS)
+
+        return turbojpeg.encode(image, quality, TJPF_BGR, TJ_SUBSAMPLING, TJ_FLAGS)
+
+    res, buf = cv2.imencode('.jpg', image, CV2_ENCODE_PARAMS if quality == FRAME_JPG_QUALITY else
+        [cv2.IMWRITE_JPEG_QUALITY, quality, *CV2_ENCODE_PARAMS[2:]])
+
+    if not res:
+        raise RuntimeError('jpg encoding failed')
+
+    buf.flags.writeable = False  # so that jpg isn't writable, no I won't repeat numpy spelling mistakes!
+
+    return bytearray(memoryview(buf))
+
+
+def jpg_decode(jpg: bytes | bytearray, gray: bool = False, scale: int = 1) -> ndarray:
+    """Decode a jpg to a BGR (or GRAY) image, optionally scaled down by 1/`scale` (one of JPG_SCALES) during decode
+    which is much cheaper than a full decode. Resulting dimensions are the full dimensions divided by `scale` and rounded
+    up."""
+
+    if turbojpeg is not None:
+        image = turbojpeg.decode(jpg, TJPF_GRAY if gray else TJPF_BGR, None if scale == 1 else (1, scale), TJ_FLAGS)
+
+        return image.reshape(image.shape[:2]) if gray else image
+
+    if (image := cv2.imdecode(np.frombuffer(jpg, np.uint8), CV2_REDUCED[scale][gray])) is None:
+        raise ValueError('the provided image blob is invalid or in an unsupported format')
+
+    return image
+
+
+def jpg_decode_roi(jpg: bytes | bytearray, gray: bool, x: int, y: int, w: int, h: int) -> ndarray | None:
+    """Decode only the region x, y, w, h (must be inside the image) of a jpg by losslessly cropping it to the MCU blocks
+    covering the region first, so the blocks outside are never decoded. Returns None if the backend can't do this
+    (cv2), in which case you have to do a full decode and slice."""
+
+    if turbojpeg is None:
+        return None
+
+    _, _, subsample, _ = turbojpeg.decode_header(jpg)
+    x0                 = x - x % tjMCUWidth[subsample]  # crop origin must be MCU aligned
+    y0                 = y - y % tjMCUHeight[subsample]
+    image              = jpg_decode(turbojpeg.crop(jpg, x0, y0, x + w - x0, y + h - y0), gray)
+
+    return image[y - y0 : y - y0 + h, x - x0 : x - x0 + w]
+
 
 class Frame:
     """Frame with attached data dictionary. Automatic handling and caching and passthrough of jpg encoded image. Also
-    convenience functions for RGB/BGR/GRAY and RW/RO.
+    convenience functions for RGB/BGR/GRAY/NV12/I420 and RW/RO.
 
     Create:
         Frame(image: ndarray | None, data: dict | None, format: str | None)  - if data is None then set to empty {}
@@ -31,6 +235,13 @@ class Frame:
     Notes:
         * Use 'frame.rw_rgb' in place of "frame.rw.rgb' or 'frame.rgb.rw', it will always give the most efficient
         conversion from whatever you start with. Obiously same for '.ro' and '.bgr'.
+        * The jpg of a writable image is cached until the image is possibly mutated, which is assumed on access of
+        '.image', '.rw', '.rw_rgb' or '.rw_bgr' of that Frame. If you modify the image through a reference you got
+        earlier then call 'frame.touch()' before asking for '.jpg' again.
+        * Readonly conversions of a readonly image (format and scale, e.g. '.rgb', '.gray', '.decoded_at(1/2)') are
+        cached in one cache shared by the original Frame and all Frames converted from it, so 'frame.rgb.gray' is
+        'frame.gray'. The cache is bounded by FRAME_CACHE_SIZE and survives pickling, 'Frame.cache_hits' and
+        'Frame.cache_misses' count lookups over all Frames.
     """
 
     image:     np.ndarray | None  # be aware can be readonly, in order to guarantee writable .image use 'frame.rw.image'
@@ -53,12 +264,15 @@ class Frame:
     is_rgb:    bool | None
     is_bgr:    bool | None
     is_gray:   bool | None
+    is_yuv:    bool | None
 
     rw:        'Frame'
     ro:        'Frame'
     rgb:       'Frame'
     bgr:       'Frame'
     gray:      'Frame'
+    nv12:      'Frame'
+    i420:      'Frame'
 
     rw_rgb:    'Frame'
     rw_bgr:    'Frame'
@@ -70,11 +284,20 @@ class Frame:
     __image:   np.ndarray | Literal[False] | None
     __data:    dict[str, Any]
     __jpg:     bytes | bytearray | Literal[False] | None
+    __version: int                               # bumped on possible mutation of writable image, see touch()
+    __jpg_rw:  tuple[int, bytes | bytearray]    # (__version, jpg) cached encoding of writable image
+    __cache:   dict[tuple[str, int], 'Frame']   # {(format, scale): Frame} readonly conversions, LRU order, only in root
+    __root:    weakref.ref                      # to Frame holding the __cache this Frame was converted from and is in
+    __scale:   int                              # 1/scale of full size image, for converted Frames from decoded_at()
     __shapef:  ShapeAndFormat | None
 
 
-    FORMATS          = ('RGB', 'BGR', 'GRAY')
+    FORMATS          = ('RGB', 'BGR', 'GRAY', 'NV12', 'I420')
     FORMATS_AND_NONE = FORMATS + (None,)
+    YUV_FORMATS      = ('NV12', 'I420')
+
+    cache_hits       = 0
+    cache_misses     = 0
 
     def __init__(self,
         image:  Union[np.ndarray, 'Frame', dict, None] = None,
@@ -111,9 +334,17 @@ class Frame:
                 self.__jpg = False  # False means jpg of valid image not created yet because None means no image at all
 
                 if (lshape := len(shape := image.shape)) == 2:
-                    self.__shapef = (shape, 'GRAY')
+                    if (format := Frame.validate_format_or_Frame(format)) not in Frame.YUV_FORMATS:
+                        self.__shapef = (shape, 'GRAY')
+                    elif shape[0] % 3 or shape[1] & 1:
+                        raise ValueError(f'invalid {format} image shape {shape}')
+                    else:
+                        self.__shapef = (shape, format)
+
                 elif lshape != 3 or shape[2] != 3:
                     raise ValueError('invalid image')
+                elif (format := Frame.validate_format_or_Frame(format)) in Frame.YUV_FORMATS:
+                    raise ValueError(f'{format} image must be 2D')
                 elif (format := Frame.validate_format_or_Frame(format)) is None:
                     raise ValueError('must specify format here')
                 else:
@@ -129,10 +360,11 @@ class Frame:
 
     def __reduce__(self):
         return (Frame.unreduce, (image := self.__image, self.__data, self.__jpg, self.__shapef,
-            image.flags.writeable if isinstance(image, ndarray) else None))
+            image.flags.writeable if isinstance(image, ndarray) else None,
+            cache and {key: frame.__image for key, frame in cache.items()} if (cache := getattr(self, '_Frame__cache', None)) else None))
 
     @staticmethod
-    def unreduce(image, data, jpg, shapef, writeable):
+    def unreduce(image, data, jpg, shapef, writeable, cache=None):
         frame          = Frame()
         frame.__image  = image
         frame.__data   = data
@@ -145,8 +377,69 @@ class Frame:
             except Exception:
                 pass
 
+        if cache:
+            for (format, scale), image in cache.items():
+                image.flags.writeable = False
+
+                frame.__cache_put(Frame(image, frame, format), scale)
+
         return frame
 
+    def __cache_root(self) -> 'Frame':
+        return self if (root := getattr(self, '_Frame__root', None)) is None or (root := root()) is None else root
+
+    def __cache_get(self, format: str, scale: int = 1) -> Union['Frame', None]:
+        """Get cached readonly Frame of the same picture as self in `format` and 1/`scale` size of self, or None if not
+        present."""
+
+        root = self.__cache_root()
+        key  = (format, getattr(self, '_Frame__scale', 1) * scale)
+
+        if key == (root.__shapef[1], getattr(root, '_Frame__scale', 1)):
+            new = root
+
+        elif (cache := getattr(root, '_Frame__cache', None)) is None or (new := cache.pop(key, None)) is None:
+            Frame.cache_misses += 1
+
+            return None
+
+        else:
+            cache[key] = new  # move to most recently used
+
+        Frame.cache_hits += 1
+
+        return new
+
+    def __cache_put(self, new: 'Frame', scale: int = 1) -> 'Frame':
+        """Put readonly Frame `new` converted from self at 1/`scale` size of self into the cache, returns `new`."""
+
+        new.__scale = scale = getattr(self, '_Frame__scale', 1) * scale
+
+        if FRAME_CACHE_SIZE:
+            if (cache := getattr(root := self.__cache_root(), '_Frame__cache', None)) is None:
+                root.__cache = cache = {}
+
+            new.__root                      = weakref.ref(root)  # weak so that there are no reference cycles
+            cache[(new.__shapef[1], scale)] = new
+
+            while len(cache) > FRAME_CACHE_SIZE:
+                del cache[next(iter(cache))]
+
+        return new
+
+    def __ro_convert(self, format: str) -> 'Frame':
+        """Get cached or convert and cache readonly Frame in `format` from self. If self is writable then the cache is
+        dropped on touch()."""
+
+        if (new := self.__cache_get(format)) is None:
+            image = self.image if (image := self.__image) is False else image
+            image = cvt_format(image, self.__shapef[1], format)
+
+            image.flags.writeable = False
+            new                   = self.__cache_put(Frame(image, self, format))
+
+        return new
+
     @staticmethod
     def validate_format_or_Frame(format: Union[str, 'Frame', None]) -> str:
         """Allows None as a format, keep this in mind if you only want an ACTUAL format and check for it yourself."""
@@ -183,10 +476,23 @@ class Frame:
 
     @staticmethod
     def decode(blob: bytes | bytearray, format: str | None):
-        if (image := cv2.imdecode(np.frombuffer(blob, np.uint8), cv2.IMREAD_COLOR if format != 'GRAY' else 0)) is None:
+        if blob[:2] == b'\xff\xd8':
+            image = jpg_decode(blob, format == 'GRAY')
+
+        elif (image := cv2.imdecode(np.frombuffer(blob, np.uint8), cv2.IMREAD_COLOR if format != 'GRAY' else 0)) is None:
             raise ValueError('the provided image blob is invalid or in an unsupported format')
 
-        return image
+        return cvt_format(image, 'BGR', format) if format in Frame.YUV_FORMATS else image
+
+    @staticmethod
+    def image_shape(height: int, width: int, format: str | None) -> tuple[int, int, int] | tuple[int, int]:
+        """Shape of the image array of a picture of these dimensions in `format`."""
+
+        return (
+            (height, width) if format == 'GRAY' else
+            (height * 3 // 2, width) if format in Frame.YUV_FORMATS else
+            (height, width, 3)
+        )
 
     @staticmethod
     def from_blob(
@@ -211,7 +517,7 @@ class Frame:
 
         if (have_dims := height is not None and width is not None) and is_jpg:
             frame.__image  = False
-            frame.__shapef = ((height, width) if format == 'GRAY' else (height, width, 3), format or 'BGR')
+            frame.__shapef = (Frame.image_shape(height, width, format), format or 'BGR')
 
         else:
             frame.__image  = image = Frame.decode(blob, format)
@@ -221,7 +527,7 @@ class Frame:
                 image.flags.writeable = False
 
             if have_dims:
-                assert image.shape[:2] == (height, width), f'blob decoded dimensions {image.shape[:2]} do not match specified dimensions {(height, width)}'
+                assert image.shape[:2] == Frame.image_shape(height, width, format)[:2], f'blob decoded dimensions {image.shape[:2]} do not match specified dimensions {(height, width)}'
 
         return frame
 
@@ -237,9 +543,108 @@ class Frame:
 
         return copy
 
+    def decoded_at(self, scale: float) -> 'Frame':
+        """Return a Frame with the image scaled down to `scale` of full size (1, 1/2, 1/4 or 1/8), sharing data. If the
+        Frame has a jpg (like a jpg-only Frame from the network) then the jpg is decoded directly at the reduced size,
+        which is several times cheaper than a full decode, otherwise the decoded image is resized. The new Frame is
+        readonly and cached if self is readonly. Scale 1 returns self. YUV dimensions are rounded up to even."""
+
+        if (shapef := self.__shapef) is None or scale == 1:
+            return self
+
+        if (denom := round(1 / scale) if scale > 0 else 0) not in JPG_SCALES or denom * scale != 1:
+            raise ValueError(f'invalid scale {scale!r}, must be one of 1, 1/2, 1/4 or 1/8')
+
+        if (is_ro := self.is_ro) and (new := self.__cache_get(shapef[1], denom)) is not None:
+            return new
+
+        height = -(-self.height // denom)
+        width  = -(-self.width // denom)
+
+        if is_yuv := (format := shapef[1]) in Frame.YUV_FORMATS:
+            height, width = (height + 1) & ~1, (width + 1) & ~1  # YUV 4:2:0 needs even dimensions
+
+        if jpg := self.__jpg:
+            image = jpg_decode(jpg, format == 'GRAY', denom)
+
+            if is_yuv:
+                if image.shape[:2] != (height, width):  # odd scaled dimension, duplicate last row / column
+                    image = cv2.copyMakeBorder(image, 0, height - image.shape[0], 0, width - image.shape[1], cv2.BORDER_REPLICATE)
+
+                image = cvt_format(image, 'BGR', format)
+
+        elif is_yuv:
+            y, chroma = yuv_planes(self.__image, format)
+            image     = yuv_merge(cv2.resize(y, (width, height), interpolation=cv2.INTER_AREA),
+                [cv2.resize(c, (width // 2, height // 2), interpolation=cv2.INTER_AREA) for c in chroma], format)
+
+        else:  # not jpg-only so have __image
+            image = cv2.resize(self.__image, (width, height), interpolation=cv2.INTER_AREA)
+
+        image.flags.writeable = False
+        new                   = Frame(image, self, shapef[1])
+
+        return self.__cache_put(new, denom) if is_ro else new
+
+    def crop(self, x: int, y: int, w: int, h: int) -> 'Frame':
+        """Return a NEW Frame with the region of the image at x, y of size w x h (clipped to the image), sharing data.
+        For a raw image this is a zero-copy view which has the same writability as self, so writing to a writable crop
+        modifies the image of self as well (touch() self if you need its jpg after that). For a jpg-only Frame only the
+        blocks covering the region are decoded if the jpg backend supports it (turbojpeg) and the crop is readonly,
+        otherwise the whole jpg is decoded (and kept in self) and the crop is a view of that. YUV images can not be viewed
+        like this so a YUV crop is a copy (with same writability), and the region is expanded to even coordinates."""
+
+        if (shapef := self.__shapef) is None:
+            return self
+
+        height, width, format = self.height, self.width, shapef[1]
+
+        x0, y0 = max(0, x), max(0, y)
+        x1, y1 = min(width, x + w), min(height, y + h)
+
+        if x1 <= x0 or y1 <= y0:
+            raise ValueError(f'crop region {(x, y, w, h)} does not intersect {width}x{height} image')
+
+        if is_yuv := format in Frame.YUV_FORMATS:  # 4:2:0 chroma needs even region
+            x0, y0, x1, y1 = x0 & ~1, y0 & ~1, (x1 + 1) & ~1, (y1 + 1) & ~1
+
+        if self.__image is False and (image := jpg_decode_roi(self.__jpg, format == 'GRAY', x0, y0, x1 - x0, y1 - y0)) is not None:
+            if is_yuv:
+                image = cvt_format(image, 'BGR', format)
+
+            image.flags.writeable = False
+
+        elif is_yuv:
+            planey, chroma        = yuv_planes(image := self.image, format)
+            writeable             = image.flags.writeable
+            image                 = yuv_merge(planey[y0 : y1, x0 : x1], [c[y0 // 2 : y1 // 2, x0 // 2 : x1 // 2] for c in chroma], format)
+            image.flags.writeable = writeable
+
+        else:
+            image = self.image[y0 : y1, x0 : x1]
+
+        return Frame(image, self, format)
+
+    def roi(self, x0: int, y0: int, x1: int, y1: int) -> 'Frame':
+        """Same as crop() but the region is given as corners, x1 and y1 are exclusive."""
+
+        return self.crop(x0, y0, x1 - x0, y1 - y0)
+
+    def touch(self) -> 'Frame':
+        """Mark the image as possibly modified, invalidates the cached jpg and conversions of a writable image. Returns
+        self."""
+
+        self.__version = getattr(self, '_Frame__version', 0) + 1
+
+        if getattr(self, '_Frame__cache', None):
+            self.__cache = None
+
+        return self
+
     @property
     def image(self):
-        """May decode jpg-only frame to ro image if only had jpg and no image yet."""
+        """May decode jpg-only frame to ro image if only had jpg and no image yet. Access to a writable image counts as
+        possible modification (see touch())."""
 
         if (image := self.__image) is False:
             self.__image          = image = Frame.decode(self.__jpg, self.__shapef[1])
@@ -247,6 +652,9 @@ class Frame:
 
             assert image.shape == self.__shapef[0], f'jpg decoded shape {image.shape} does not match specified shape {self.__shapef[0]}'
 
+        elif image is not None and image.flags.writeable:
+            self.touch()
+
         return image
 
     @property
@@ -267,7 +675,7 @@ class Frame:
 
     @property
     def height(self):
-        return None if (shapef := self.__shapef) is None else shapef[0][0]
+        return None if (shapef := self.__shapef) is None else shapef[0][0] * 2 // 3 if shapef[1] in Frame.YUV_FORMATS else shapef[0][0]
 
     @property
     def width(self):
@@ -280,28 +688,47 @@ class Frame:
     @property
     def jpg(self):
         """Potentially caching jpg encoding, or maybe it came from the network originally encoded and is already
-        available. A jpg is always returned, it is cached in self for future returns if self is readonly."""
+        available. A jpg is always returned, it is cached in self for future returns if self is readonly, or until the
+        image is possibly modified if self is writable (see touch())."""
 
         if (jpg := self.__jpg) is False:
-            image    = self.__image
-            res, buf = cv2.imencode('.jpg', image)
+            version = getattr(self, '_Frame__version', 0)
 
-            if not res:
-                raise RuntimeError('jpg encoding failed')
+            if (format := self.__shapef[1]) in Frame.YUV_FORMATS:
+                encode = lambda image: jpg_encode(cvt_format(image, format, 'BGR'))
+            else:
+                encode = jpg_encode
 
-            buf.flags.writeable = False  # so that jpg isn't writable, no I won't repeat numpy spelling mistakes!
-            jpg                 = bytearray(memoryview(buf))
+            if not (image := self.__image).flags.writeable:  # if we are a readonly image then cache encoded jpg
+                self.__jpg = jpg = encode(image)
 
-            if not image.flags.writeable:  # if we are a readonly image then cache encoded jpg
-                self.__jpg = jpg
+            elif (jpg_rw := getattr(self, '_Frame__jpg_rw', None)) is not None and jpg_rw[0] == version:
+                jpg = jpg_rw[1]
+
+            else:
+                self.__jpg_rw = (version, jpg := encode(image))
 
         return jpg
 
+    def jpg_at(self, quality: int) -> bytes | bytearray:
+        """A jpg encoded at `quality` instead of FRAME_JPG_QUALITY, not cached. Just `jpg` at that quality."""
+
+        if quality == FRAME_JPG_QUALITY:
+            return self.jpg
+
+        image = self.image if (image := self.__image) is False else image  # decode jpg-only without counting as touch
+
+        if (format := self.__shapef[1]) in Frame.YUV_FORMATS:
+            return jpg_encode(cvt_format(image, format, 'BGR'), quality)
+
+        return jpg_encode(image, quality)
+
     @property
     def has_jpg(self):
         """Whether this Frame already has an encoded jpg ready for return without having to encode."""
 
-        return None if (jpg := self.__jpg) is None else jpg is not False
+        return None if (jpg := self.__jpg) is None else jpg is not False or (
+            (jpg_rw := getattr(self, '_Frame__jpg_rw', None)) is not None and jpg_rw[0] == getattr(self, '_Frame__version', 0))
 
     @property
     def has_raw(self):
@@ -335,13 +762,19 @@ class Frame:
     def is_gray(self):
         return None if (shapef := self.__shapef) is None else shapef[1] == 'GRAY'
 
+    @property
+    def is_yuv(self):
+        return None if (shapef := self.__shapef) is None else shapef[1] in Frame.YUV_FORMATS
+
     @property
     def rw(self):
-        """If already writable return self. If jpg-only image then decode and return a NEW Frame with a NEW writable
-        copy of that image."""
+        """If already writable return self (touched, see touch()). If jpg-only image then decode and return a NEW Frame
+        with a NEW writable copy of that image."""
 
-        if (image := self.__image) is None or (image is not False and image.flags.writeable):
+        if (image := self.__image) is None:
             return self
+        if image is not False and image.flags.writeable:
+            return self.touch()
 
         return Frame(self.image.copy(), self, self.__shapef[1])
 
@@ -366,16 +799,10 @@ class Frame:
         if ((shapef := self.__shapef) and shapef[1]) in ('RGB', None):
             return self
 
-        if (image := self.image).flags.writeable:
-            new = Frame(cv2.cvtColor(image, cv2.COLOR_RGB2BGR), self, 'RGB')
-        elif (new := getattr(self, '_Frame__ro_rgb', None)) is not None:
-            return new
+        if self.is_ro:
+            return self.__ro_convert('RGB')
 
-        else:
-            self.__ro_rgb = new   = Frame(image := cv2.cvtColor(image, cv2.COLOR_RGB2BGR), self, 'RGB')
-            image.flags.writeable = False
-
-        return new
+        return Frame(cvt_format(self.__image, shapef[1], 'RGB'), self, 'RGB')
 
     @property
     def bgr(self):
@@ -385,16 +812,10 @@ class Frame:
         if ((shapef := self.__shapef) and shapef[1]) in ('BGR', None):
             return self
 
-        if (image := self.image).flags.writeable:
-            new = Frame(cv2.cvtColor(image, cv2.COLOR_RGB2BGR), self, 'BGR')
-        elif (new := getattr(self, '_Frame__ro_bgr', None)) is not None:
-            return new
-
-        else:
-            self.__ro_bgr = new   = Frame(image := cv2.cvtColor(image, cv2.COLOR_RGB2BGR), self, 'BGR')
-            image.flags.writeable = False
+        if self.is_ro:
+            return self.__ro_convert('BGR')
 
-        return new
+        return Frame(cvt_format(self.__image, shapef[1], 'BGR'), self, 'BGR')
 
     @property
     def gray(self):
@@ -404,16 +825,36 @@ class Frame:
         if ((shapef := self.__shapef) and (format := shapef[1])) in ('GRAY', None):
             return self
 
-        if (image := self.image).flags.writeable:
-            new = Frame(cv2.cvtColor(image, cv2.COLOR_RGB2GRAY if format == 'RGB' else cv2.COLOR_BGR2GRAY), self, 'GRAY')
-        elif (new := getattr(self, '_Frame__ro_gray', None)) is not None:
-            return new
+        if self.is_ro:
+            return self.__ro_convert('GRAY')
 
-        else:
-            self.__ro_gray = new  = Frame(image := cv2.cvtColor(image, cv2.COLOR_RGB2GRAY if format == 'RGB' else cv2.COLOR_BGR2GRAY), self, 'GRAY')
-            image.flags.writeable = False
+        return Frame(cvt_format(self.__image, format, 'GRAY'), self, 'GRAY')
 
-        return new
+    @property
+    def nv12(self):
+        """Return self if already NV12 (rw or ro) else convert and return converted Frame with same writability. Decodes
+        a non-NV12 jpg-only Frame to an actual image then converts. Dimensions must be even."""
+
+        if ((shapef := self.__shapef) and (format := shapef[1])) in ('NV12', None):
+            return self
+
+        if self.is_ro:
+            return self.__ro_convert('NV12')
+
+        return Frame(cvt_format(self.__image, format, 'NV12'), self, 'NV12')
+
+    @property
+    def i420(self):
+        """Return self if already I420 (rw or ro) else convert and return converted Frame with same writability. Decodes
+        a non-I420 jpg-only Frame to an actual image then converts. Dimensions must be even."""
+
+        if ((shapef := self.__shapef) and (format := shapef[1])) in ('I420', None):
+            return self
+
+        if self.is_ro:
+            return self.__ro_convert('I420')
+
+        return Frame(cvt_format(self.__image, format, 'I420'), self, 'I420')
 
     @property
     def rw_rgb(self):
@@ -423,8 +864,10 @@ class Frame:
             return self
         if shapef[1] == 'RGB':
             return self if (image := self.image).flags.writeable else Frame(image.copy(), self, 'RGB')
+        if self.is_ro and (new := self.__cache_get('RGB')) is not None:
+            return Frame(new.__image.copy(), self, 'RGB')
 
-        return Frame(cv2.cvtColor(self.image, cv2.COLOR_RGB2BGR), self, 'RGB')
+        return Frame(cvt_format(self.image, shapef[1], 'RGB'), self, 'RGB')
 
     @property
     def rw_bgr(self):
@@ -434,8 +877,10 @@ class Frame:
             return self
         if shapef[1] == 'BGR':
             return self if (image := self.image).flags.writeable else Frame(image.copy(), self, 'BGR')
+        if self.is_ro and (new := self.__cache_get('BGR')) is not None:
+            return Frame(new.__image.copy(), self, 'BGR')
 
-        return Frame(cv2.cvtColor(self.image, cv2.COLOR_RGB2BGR), self, 'BGR')
+        return Frame(cvt_format(self.image, shapef[1], 'BGR'), self, 'BGR')
 
     @property
     def ro_rgb(self):
@@ -451,12 +896,8 @@ class Frame:
 
             new = Frame(new_image := image.copy(), self, 'RGB')
 
-        elif (new := getattr(self, '_Frame__ro_rgb', None)) is not None:
-            return new
-
         else:
-            new           = Frame(new_image := cv2.cvtColor(image := self.image, cv2.COLOR_RGB2BGR), self, 'RGB')
-            self.__ro_rgb = new
+            return self.__ro_convert('RGB')
 
         new_image.flags.writeable = False
 
@@ -476,12 +917,8 @@ class Frame:
 
             new = Frame(new_image := image.copy(), self, 'BGR')
 
-        elif (new := getattr(self, '_Frame__ro_bgr', None)) is not None:
-            return new
-
         else:
-            new           = Frame(new_image := cv2.cvtColor(image := self.image, cv2.COLOR_RGB2BGR), self, 'BGR')
-            self.__ro_bgr = new
+            return self.__ro_convert('BGR')
 
         new_image.flags.writeable = False
 
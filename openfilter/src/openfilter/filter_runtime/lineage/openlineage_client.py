@@ -3,15 +3,20 @@ import uuid
 import threading
 import logging
 import os
+from collections import deque
 from datetime import datetime, timezone
+from functools import lru_cache
 from typing import Any
 
-from dataclasses import make_dataclass, field
+from dataclasses import make_dataclass
 
 from openlineage.client.client import OpenLineageClient
 from openlineage.client.transport.http import ApiKeyTokenProvider, HttpConfig, HttpTransport
 from openlineage.client.facet import BaseFacet
 from openlineage.client.run import RunEvent, RunState, Run, Job
+from openlineage.client.serde import Serde
+
+from openfilter.filter_runtime.rolllog import RollLog
 
 
 def normalize_facet_keys(data: dict) -> dict:
@@ -33,6 +38,24 @@ def flatten_dict(d: dict, parent_key='', sep='__'):
             items[new_key] = v
     return items
 
+def frames_to_facets(frames: dict) -> dict | None:
+    """Lineage facets from the frame attributes past image and data, of the last topic in `frames`."""
+    filtered_dict = None
+    for frame in frames.values():
+        filtered_dict = dict(list(frame.__dict__.items())[2:])
+    return filtered_dict
+
+FACET_PRODUCER = "https://github.com/PlainsightAI/openfilter/tree/0.1.2/openfilter/lineage"
+FACET_SCHEMA_URL = "https://github.com/PlainsightAI/openfilter/lineage/schema/OpenFilterConfigRunFacet.json"
+
+@lru_cache(maxsize=256)
+def openfilter_facet_schema(fields: tuple[tuple[str, type], ...]) -> type:
+    """Facet dataclass for these field names and types. Synthesized only once per distinct schema since heartbeats
+    mostly repeat the same one, and bounded so long running filters with changing schemas don't grow forever. Raises
+    on invalid or duplicate field names."""
+    return make_dataclass("OpenFilterFacet", [*fields, ("_producer", str), ("schemaURL", str), ("type", str)],
+                          bases=(BaseFacet,))
+
 def create_openfilter_facet_with_fields(data: dict,filter_name:str) -> BaseFacet:
     data = normalize_facet_keys(data)
     data = flatten_dict(data)
@@ -42,21 +65,8 @@ def create_openfilter_facet_with_fields(data: dict,filter_name:str) -> BaseFacet
         elif v is None:
             data[k] = ""
 
-    fields = []
-    for k, v in data.items():
-        if isinstance(v, (list, dict)):
-            fields.append((k, type(v), field(default_factory=lambda v=v: v)))
-        else:
-            fields.append((k, type(v), field(default=v)))
-
-    fields += [
-        ("_producer", str, field(default="https://github.com/PlainsightAI/openfilter/tree/0.1.2/openfilter/lineage")),
-        ("schemaURL", str, field(default="https://github.com/PlainsightAI/openfilter/lineage/schema/OpenFilterConfigRunFacet.json")),
-        ("type", str, field(default=filter_name))
-    ]
-    
-    DynamicFacet = make_dataclass("OpenFilterFacet", fields, bases=(BaseFacet,))
-    return DynamicFacet().__dict__
+    openfilter_facet_schema(tuple((k, type(v)) for k, v in data.items()))  # validate field names, once per schema
+    return {**data, "_producer": FACET_PRODUCER, "schemaURL": FACET_SCHEMA_URL, "type": filter_name}
 
 
 def create_openlineage_job(name: str = None, facets: dict[Any, Any] = None, namespace: str = "Openfilter") -> Job:
@@ -92,6 +102,161 @@ def get_http_client(url: str=None, endpoint: str = None, verify: bool = False, a
 
 
 
+def event_to_dict(event: RunEvent) -> dict:
+    return Serde.to_dict(event)
+
+def event_from_dict(data: dict) -> RunEvent:
+    run, job = data["run"], data["job"]
+    return RunEvent(
+        eventType=RunState(data["eventType"]),
+        eventTime=data["eventTime"],
+        run=Run(runId=run["runId"], facets=run.get("facets") or {}),
+        job=Job(namespace=job["namespace"], name=job["name"], facets=job.get("facets") or {}),
+        producer=data["producer"],
+        schemaURL=data.get("schemaURL"),
+    )
+
+
+class AsyncEmitter:
+    """Emits events to `client` from a background thread so that a slow or down lineage endpoint never blocks the
+    filter. Whatever is queued when the thread wakes up is sent as one batch. While the endpoint is failing events are
+    spooled to a size bounded RollLog under `spool_path` (if given, otherwise they are dropped) and replayed in order,
+    before anything new, once it comes back. Spooled events left over from a previous run are replayed as well."""
+
+    def __init__(self, client, spool_path: str | None = None, spool_prefix: str = "lineage", spool_size: int = 10_000_000,
+                 queue_size: int = 1000, retry_interval: float = 5.0):
+        self.client = client
+        self.spool_path = spool_path
+        self.spool_prefix = spool_prefix
+        self.spool_size = spool_size
+        self.retry_interval = retry_interval
+        self._queue = deque(maxlen=queue_size)  # oldest dropped if full
+        self._cond = threading.Condition()
+        self._thread = None
+        self._closing = False
+        self._retry_t = 0.0  # monotonic time before which the endpoint is considered down
+        self._spool = None  # RollLog, opened when first needed
+        self._spooled = False  # whether there is anything in the spool to replay
+        self._inflight = []  # rest of the batch currently being sent, spooled by close() if the deadline hits
+
+    def emit(self, event: RunEvent):
+        with self._cond:
+            self._queue.append(event)
+            if self._thread is None or not self._thread.is_alive():
+                self._closing = False
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def close(self, timeout: float = 2.0):
+        """Send or spool everything queued, waiting at most `timeout` seconds for the endpoint. What could not be sent
+        by then is spooled. The emitter can still be used afterwards, it will start a new thread."""
+        with self._cond:
+            if (thread := self._thread) is None:
+                return
+            self._closing = True
+            self._cond.notify()
+        thread.join(timeout)
+        with self._cond:
+            events = list(self._queue)
+            self._queue.clear()
+            if thread.is_alive():  # stuck sending, may still go through but better twice than never
+                events = self._inflight + events
+        if events:
+            self._spool_write(events)
+        if not thread.is_alive() and self._spool is not None:
+            self._spool.close()
+            self._spool = None
+
+    def _run(self):
+        try:
+            self._spool_open()
+            while True:
+                with self._cond:
+                    while not (self._queue or self._closing or (self._spooled and time.monotonic() >= self._retry_t)):
+                        self._cond.wait(max(0.0, self._retry_t - time.monotonic()) if self._spooled else None)
+                    batch = list(self._queue)
+                    self._queue.clear()
+                    closing = self._closing
+                if time.monotonic() < self._retry_t:  # endpoint down, don't even try till retry time
+                    self._spool_write(batch)
+                elif self._replay():
+                    self._send(batch)
+                else:
+                    self._spool_write(batch)
+                if closing:
+                    with self._cond:
+                        if not self._queue:
+                            self._thread = None
+                            return
+        except Exception as e:
+            logging.error(f"\033[91m[OpenFilterLineage] Emitter thread failed: {e}\033[0m")
+
+    def _send(self, batch: list):
+        for i, event in enumerate(batch):
+            snapshot = event_to_dict(event) if self.spool_path is not None else event  # client adds facets to event
+            self._inflight = [snapshot] + batch[i + 1:]
+            try:
+                self.client.emit(event)
+            except Exception as e:
+                logging.error(f"\033[93m[OpenFilterLineage] Failed to emit event {event.eventType}: {e}\033[0m")
+                self._retry_t = time.monotonic() + self.retry_interval
+                self._spool_write(self._inflight)
+                break
+        self._inflight = []
+
+    def _replay(self) -> bool:
+        """Send everything spooled, in order. Returns True if the spool is now empty."""
+        if not self._spooled:
+            return True
+        spool = self._spool
+        while True:
+            pos = spool.tell()
+            try:
+                if (data := spool.read()) is None:
+                    break
+            except ValueError:  # partial last line from a crash while writing
+                continue
+            try:
+                self.client.emit(event_from_dict(data))
+            except Exception as e:
+                logging.error(f"\033[93m[OpenFilterLineage] Failed to replay spooled event: {e}\033[0m")
+                self._retry_t = time.monotonic() + self.retry_interval
+                spool.seek(pos)
+                return False
+        spool.close()  # all replayed, delete and start fresh next time
+        for logfile in spool.logfiles:
+            try:
+                os.unlink(logfile.path)
+            except FileNotFoundError:
+                pass
+        self._spool = None
+        self._spooled = False
+        return True
+
+    def _spool_open(self):
+        if self.spool_path is None or self._spool is not None:
+            return
+        self._spool = spool = RollLog(self.spool_path, "json", prefix=self.spool_prefix,
+                                      file_size=min(1_000_000, self.spool_size), total_size=self.spool_size)
+        spool.seek(("start", 0))  # anything there is left over from a previous run
+        self._spooled = bool(spool.logfiles)
+
+    def _spool_write(self, events: list[RunEvent | dict]):
+        if not events:
+            return
+        if self.spool_path is None:
+            logging.error(f"\033[93m[OpenFilterLineage] Dropped {len(events)} event(s), no spool\033[0m")
+            return
+        try:
+            self._spool_open()
+            for event in events:
+                self._spool.write(event if isinstance(event, dict) else event_to_dict(event))
+            self._spooled = True
+        except Exception as e:
+            logging.error(f"\033[91m[OpenFilterLineage] Failed to spool {len(events)} event(s): {e}\033[0m")
+
+
 class OpenFilterLineage:
     def __init__(self, client=None, producer="https://github.com/PlainsightAI/openfilter/tree/0.1.2/openfilter/lineage", interval=10, facets={}, filter_name: str = None, job=None):
         self.client = client or get_http_client()
@@ -106,11 +271,27 @@ class OpenFilterLineage:
         self.filter_name = filter_name
         self._stop_event = threading.Event()
         self.filter_model = os.getenv(filter_name.upper() + "_MODEL_NAME") if filter_name else None
+        self.frame_sample_interval = float(os.getenv("OPENLINEAGE_FRAME_SAMPLE_INTERVAL") or self.interval)
+        self.shutdown_timeout = float(os.getenv("OPENLINEAGE_SHUTDOWN_TIMEOUT") or 2)
+        self.async_emitter = AsyncEmitter(
+            self.client,
+            spool_path=os.getenv("OPENLINEAGE_SPOOL_PATH") or None,
+            spool_prefix=f"lineage_{filter_name}" if filter_name else "lineage",
+            spool_size=int(os.getenv("OPENLINEAGE_SPOOL_SIZE") or 10_000_000),
+        )
+        self._terminal_emitted = set()  # ABORT / COMPLETE only go out once per START
+        self._sampled_frames = None  # latest sampled frames, coalescing slot for the heartbeat thread
+        self._next_sample_t = 0.0
 
     def _emit_event(self, event_type, run=None, facets=None):
         try:
             if not os.getenv("OPENLINEAGE_DISABLED", "false").lower() in ("true", "1"):
                 
+                if event_type in (RunState.ABORT, RunState.COMPLETE):
+                    if event_type in self._terminal_emitted:
+                        return
+                    self._terminal_emitted.add(event_type)
+
                 raw_data = self.facets if event_type == RunState.RUNNING else facets
                 data_to_use = dict(raw_data or {})
                 
@@ -130,7 +311,7 @@ class OpenFilterLineage:
                     producer=self.producer
                 )
 
-                self.client.emit(event)
+                self.async_emitter.emit(event)
                
         except Exception as e:
             logging.error(f"\033[93m[OpenFilterLineage] Failed to emit event {event_type}: {e}\033[0m")
@@ -142,6 +323,9 @@ class OpenFilterLineage:
             self.facets["model_name"] = self.filter_model
         
         while not self._stop_event.is_set():
+            if (frames := self._sampled_frames) is not None:
+                self._sampled_frames = None
+                self.update_heartbeat_lineage(facets=frames_to_facets(frames))
             with self._lock:
                 self._emit_event(RunState.RUNNING)
             self._stop_event.wait(self.interval)
@@ -151,6 +335,9 @@ class OpenFilterLineage:
         try:
 
             self.job.name = self.filter_name
+            self._terminal_emitted.clear()
+            if self.filter_name and self.async_emitter.spool_prefix == "lineage":
+                self.async_emitter.spool_prefix = f"lineage_{self.filter_name}"
             
             if(self.filter_model):
                 facets["model_name"] = self.filter_model
@@ -178,8 +365,25 @@ class OpenFilterLineage:
 
     def stop_lineage_heart_beat(self):
         self._stop_event.set()
+
+    def shutdown(self):
+        """Stop the heartbeat and flush queued events, giving up after OPENLINEAGE_SHUTDOWN_TIMEOUT seconds total
+        (whatever is left is spooled)."""
+        deadline = time.monotonic() + self.shutdown_timeout
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(max(0.0, deadline - time.monotonic()))
+        self.async_emitter.close(max(0.0, deadline - time.monotonic()))
             
 
+    def sample_frames(self, frames):
+        """Called for every frame so must be cheap, just keeps a reference to at most one `frames` per sample interval
+        (later ones replace earlier ones not yet picked up) which the heartbeat thread turns into facets on its next
+        beat."""
+        if (t := time.monotonic()) >= self._next_sample_t:
+            self._next_sample_t = t + self.frame_sample_interval
+            self._sampled_frames = frames
+
     def update_heartbeat_lineage(self, *, facets=None, job=None, producer=None):
         with self._lock:
             if facets:
@@ -2,7 +2,21 @@
 
 Environment variables:
     OUTPUTS_JPG: If 'true'ish then encode output images to network as jpg, 'false'ish only send decoded, 'null' send
-        as is as was passed from process().
+        as is as was passed from process(). 'auto' picks per output (bind address) by how much that output holds up
+        sends, from as is through jpg of decreasing quality down to downscaled jpg, see OutputsAuto.
+
+    OUTPUTS_JPG_MIN_QUALITY: Lowest jpg quality OUTPUTS_JPG='auto' will go down to. Default 50.
+
+    OUTPUTS_JPG_MAX_DOWNSCALE: Largest downscale denominator OUTPUTS_JPG='auto' will go down to after the lowest
+        quality, 1 (never downscale, default), 2, 4 or 8. Downstream gets smaller images so only use this if it can
+        deal with that.
+
+    OUTPUTS_CODEC: Codec for frame data on outputs. 'json' is the stdlib, 'orjson' is the same JSON on the wire but much
+        faster, 'msgpack' is binary and keeps bytes as they are (receivers need msgpack installed). Receivers always
+        decode JSON with orjson if it is installed. Default 'json'.
+
+Numpy arrays anywhere in frame data are sent as their own message parts (zero-copy if readonly and contiguous) with
+their dtypes and shapes in the header, regardless of codec, and come out as readonly arrays on the other side.
 
     OUTPUTS_METRICS: If true then send metrics as '_metrics' on all zeromq outputs. If false then don't send. If string
         then is address of dedicated sender for metrics (will not be sent on normal senders).
@@ -11,6 +25,14 @@ Environment variables:
         something is officially connected or not. Default true to support doubly ephemeral '??' listeners which are most
         likely the only things connected. Does not affect metrics on normal output channels.
 
+    SOURCES_DECODE: If 'true'ish then jpg images of received frames are decoded on receipt (in parallel if multiple
+        topics) instead of lazily on first access. Only worth it if most images are accessed, pointless for filters
+        which just pass images through. Default false.
+
+    MQ_IMAGE_THREADS: Number of worker threads for jpg encoding of outgoing and decoding of incoming images when a
+        message has more than one topic needing it, 0 or 1 for serial. Messages with a single image are always done
+        serially in the calling thread. Default min(4, cpu count).
+
     MQ_LOG: Default outputs logging if not explicitly specified, default 'none'.
 
     MQ_MSGID_SYNC: Whether to sync expected message IDs between outgoing and incoming zeromq message queues. Advanced
@@ -19,27 +41,189 @@ Environment variables:
 
 import logging
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from json import loads as json_loads, dumps as json_dumps
 from time import time
-from typing import Callable
+from typing import Any, Callable
 
 import numpy as np
+import zmq
+
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
 
-from .frame import Frame
+try:
+    import msgpack
+    HAS_MSGPACK = True
+except ImportError:
+    HAS_MSGPACK = False
+
+from .frame import FRAME_JPG_QUALITY, JPG_SCALES, Frame
 from .metrics import Metrics
 from .utils import JSONType, json_getval, rndstr
-from .zeromq import ZMQ_POLL_TIMEOUT as POLL_TIMEOUT_MS, is_zeromq_addr as is_mq_addr, ZMQMessage, ZMQSender, ZMQReceiver
+from .zeromq import ZMQ_POLL_TIMEOUT as POLL_TIMEOUT_MS, is_zeromq_addr as is_mq_addr, ZMQMessage, ZMQStateSend, \
+    ZMQSender, ZMQReceiver, ZMQWaker
 
-__all__ = ['is_mq_addr', 'MQ', 'MQSender', 'MQReceiver']
+__all__ = ['is_mq_addr', 'DATA_CODECS', 'MQ', 'MQSender', 'MQReceiver']
 
 logger = logging.getLogger(__name__)
 
-OUTPUTS_JPG          = None if (_ := json_getval((os.getenv('OUTPUTS_JPG') or 'true').lower())) is None else bool(_)
-OUTPUTS_METRICS      = _ if isinstance(_ := json_getval((os.getenv('OUTPUTS_METRICS') or 'true').lower()), bool) else str(_)
-OUTPUTS_METRICS_PUSH = bool(json_getval((os.getenv('OUTPUTS_METRICS_PUSH') or 'true').lower()))
+OUTPUTS_JPG               = None if (_ := json_getval((os.getenv('OUTPUTS_JPG') or 'true').lower())) is None else _ if _ == 'auto' else bool(_)
+OUTPUTS_JPG_MIN_QUALITY   = int(os.getenv('OUTPUTS_JPG_MIN_QUALITY') or 50)
+OUTPUTS_JPG_MAX_DOWNSCALE = int(os.getenv('OUTPUTS_JPG_MAX_DOWNSCALE') or 1)
+OUTPUTS_CODEC             = os.getenv('OUTPUTS_CODEC') or 'json'
+OUTPUTS_METRICS           = _ if isinstance(_ := json_getval((os.getenv('OUTPUTS_METRICS') or 'true').lower()), bool) else str(_)
+OUTPUTS_METRICS_PUSH      = bool(json_getval((os.getenv('OUTPUTS_METRICS_PUSH') or 'true').lower()))
+
+SOURCES_DECODE            = bool(json_getval((os.getenv('SOURCES_DECODE') or 'false').lower()))
+
+MQ_IMAGE_THREADS          = int(os.getenv('MQ_IMAGE_THREADS') or min(4, os.cpu_count() or 1))
+MQ_LOG                    = json_getval((os.getenv('MQ_LOG') or 'false').lower())
+MQ_MSGID_SYNC             = bool(json_getval((os.getenv('MQ_MSGID_SYNC') or 'true').lower()))
+
+MSGPACK_EXT_NDARRAY       = 1
+ND_KEY                    = '__nd__'  # {ND_KEY: index} in sent data stands for ndarray sent as message part index (from 'nd')
+
+DATA_CODECS               = ('json', 'orjson', 'msgpack')
+
+if not 1 <= OUTPUTS_JPG_MIN_QUALITY <= 100:
+    raise ValueError(f'invalid OUTPUTS_JPG_MIN_QUALITY {OUTPUTS_JPG_MIN_QUALITY}, must be 1 to 100')
+if OUTPUTS_JPG_MAX_DOWNSCALE not in JPG_SCALES:
+    raise ValueError(f'invalid OUTPUTS_JPG_MAX_DOWNSCALE {OUTPUTS_JPG_MAX_DOWNSCALE}, must be one of {JPG_SCALES}')
+
+
+_image_pool      = None  # (pid, ThreadPoolExecutor), pid so that a forked child does not try to use parent's threads
+_image_pool_lock = threading.Lock()
+
+
+def image_map(func: Callable[[Any], Any], items: list) -> None:
+    """Call `func` on each of `items` (for jpg encode or decode, which release the GIL) in parallel on the shared image
+    thread pool, or serially in this thread if there is only one item or MQ_IMAGE_THREADS is less than 2. Exceptions
+    are propagated."""
+
+    global _image_pool
+
+    if len(items) < 2 or MQ_IMAGE_THREADS < 2:
+        for item in items:
+            func(item)
+
+        return
+
+    if (image_pool := _image_pool) is None or image_pool[0] != os.getpid():
+        with _image_pool_lock:
+            if (image_pool := _image_pool) is None or image_pool[0] != os.getpid():
+                _image_pool = image_pool = (os.getpid(),
+                    ThreadPoolExecutor(MQ_IMAGE_THREADS, thread_name_prefix='mq-image'))
+
+    for _ in image_pool[1].map(func, items):  # consume to wait for all and raise any exception
+        pass
+
+
+def _nd_default(arrays: list[np.ndarray], obj):
+    if isinstance(obj, np.ndarray) and not obj.dtype.hasobject:
+        arrays.append(obj)
+
+        return {ND_KEY: len(arrays) - 1}
+
+    if isinstance(obj, np.generic):
+        return obj.item()
+
+    raise TypeError(f'Object of type {type(obj).__name__} is not serializable')
+
+
+def _nd_restore(obj, arrays: list[np.ndarray]):
+    if isinstance(obj, dict):
+        if len(obj) == 1 and (idx := obj.get(ND_KEY)) is not None:
+            return arrays[idx]
+
+        for k, v in obj.items():
+            if isinstance(v, (dict, list)):
+                obj[k] = _nd_restore(v, arrays)
+
+    elif isinstance(obj, list):
+        for i, v in enumerate(obj):
+            if isinstance(v, (dict, list)):
+                obj[i] = _nd_restore(v, arrays)
+
+    return obj
+
+
+def _orjson_dumps(data: dict, arrays: list[np.ndarray] | None) -> bytes:
+    try:
+        if arrays is None:
+            return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+        else:
+            return orjson.dumps(data, default=partial(_nd_default, arrays), option=orjson.OPT_NON_STR_KEYS)
+
+    except TypeError:  # something orjson doesn't do (like int too big), let stdlib do it or fail the same way it always has
+        if arrays is not None:
+            del arrays[:]
+
+        return json_dumps(data, separators=(',', ':'), default=None if arrays is None else partial(_nd_default, arrays)).encode()
+
+
+def _json_loads(buf: bytes | memoryview) -> dict:
+    if HAS_ORJSON:
+        try:
+            return orjson.loads(buf)
+        except orjson.JSONDecodeError:  # stdlib json.dumps() writes NaN and Infinity which orjson doesn't read
+            pass
+
+    return json_loads(str(buf, 'utf-8'))
+
+
+def _msgpack_default(obj):
+    if isinstance(obj, np.ndarray) and not obj.dtype.hasobject:
+        return msgpack.ExtType(MSGPACK_EXT_NDARRAY,
+            msgpack.packb([obj.dtype.str, obj.shape, np.ascontiguousarray(obj).data], use_bin_type=True))
+    if isinstance(obj, np.generic):
+        return obj.item()
+
+    raise TypeError(f'can not serialize {type(obj).__name__!r}')
+
+
+def _msgpack_ext_hook(code: int, data: bytes):
+    if code == MSGPACK_EXT_NDARRAY:
+        dtype, shape, buf = msgpack.unpackb(data)
+
+        return np.frombuffer(buf, dtype).reshape(shape)
+
+    return msgpack.ExtType(code, data)
+
+
+def data_encode(data: dict, codec: str = 'json', arrays: list[np.ndarray] | None = None) -> bytes:
+    """Encode frame `data` with `codec`. If `arrays` is a list then ndarray leaves are appended to it and replaced in
+    the encoded data by {ND_KEY: index} so that they can be sent as message parts of their own, otherwise the codec does
+    whatever it does with them. Only costs anything if there are actually arrays present."""
+
+    if codec == 'json':
+        return json_dumps(data, separators=(',', ':'), default=None if arrays is None else partial(_nd_default, arrays)).encode()
+    elif codec == 'orjson':
+        return _orjson_dumps(data, arrays)
+    else:  # codec == 'msgpack'
+        return msgpack.packb(data, default=_msgpack_default if arrays is None else partial(_nd_default, arrays),
+            use_bin_type=True)
+
+
+def data_decode(buf: bytes | memoryview, codec: str | None = None, arrays: list[np.ndarray] | None = None) -> dict:
+    """Decode frame data, putting `arrays` back in place of their {ND_KEY: index} placeholders if present."""
 
-MQ_LOG               = json_getval((os.getenv('MQ_LOG') or 'false').lower())
-MQ_MSGID_SYNC        = bool(json_getval((os.getenv('MQ_MSGID_SYNC') or 'true').lower()))
+    if codec is None:  # json or orjson, same thing on the wire
+        data = _json_loads(buf)
+
+    elif codec != 'msgpack':
+        raise RuntimeError(f'unknown data codec {codec!r}')
+    elif not HAS_MSGPACK:
+        raise RuntimeError('received msgpack data but msgpack is not installed')
+    else:
+        data = msgpack.unpackb(buf, ext_hook=_msgpack_ext_hook, strict_map_key=False)
+
+    return data if not arrays else _nd_restore(data, arrays)
 
 
 class DummyMetrics:
@@ -50,6 +234,96 @@ class DummyMetrics:
         return {'ts': (t := time()), 'fps': 15.0, 'cpu': 0.0, 'mem': 0.0, 'uptime_count': int(t - self.uptime_t)}
 
 
+class OutputsAuto:
+    """Image encoding chosen per output (bind address) for OUTPUTS_JPG='auto'. Each output is at some level of a ladder
+    going from images as they are (raw unless already jpg) through jpg of decreasing quality down to
+    OUTPUTS_JPG_MIN_QUALITY and then downscaled jpg down to 1 / OUTPUTS_JPG_MAX_DOWNSCALE. Local 'ipc://' and 'shm://'
+    outputs start as they are, 'tcp://' ones as full quality jpg. An output which holds up sends (the sender waiting on
+    its clients' requests, ZMQSender.outs_stall) for more than STALL_MORE of the time between sends moves one level
+    further down the ladder, one which almost never does (under STALL_LESS) one level back. A move down which didn't
+    help (the output is slow because of downstream processing rather than the link) is undone, and every reversal of
+    direction doubles the number of sends to wait before moving again so that outputs don't flip back and forth."""
+
+    HOLD       = 30  # sends to wait after a change before considering another, doubled on each reversal
+    HOLD_MAX   = HOLD * 32
+    STALL_MORE = 0.2
+    STALL_LESS = 0.05
+
+    def __init__(self, addrs: list[str], min_quality: int | None = None, max_downscale: int | None = None):
+        min_quality   = OUTPUTS_JPG_MIN_QUALITY if min_quality is None else min_quality
+        max_downscale = OUTPUTS_JPG_MAX_DOWNSCALE if max_downscale is None else max_downscale
+        qualities     = [*range(FRAME_JPG_QUALITY, min_quality, -15), min_quality] if min_quality < FRAME_JPG_QUALITY else \
+            [FRAME_JPG_QUALITY]
+        self.ladder   = [None, *((q, 1) for q in qualities), *((qualities[-1], d) for d in JPG_SCALES[1:] if d <= max_downscale)]
+        self.outs     = {addr: [int(addr.startswith('tcp://')), 0, OutputsAuto.HOLD, None, 0] for addr in addrs}  # {'addr': [level, sends since change, hold, stall before moving down or None, last direction], ...}
+        self.ival     = None  # EWMA of milliseconds between sends
+        self.t_last   = None
+
+    def encodings(self, addrs: list[str]) -> dict[str, tuple[int, int] | None]:
+        """{'addr': (jpg quality, downscale denominator) or None for as is, ...}"""
+
+        return {addr: self.ladder[self.outs[addr][0]] for addr in addrs}
+
+    def topicmsgs(self, frames: dict[str, Frame], outs_codec: str, topics: set[str] | None, addrs: list[str]) \
+            -> dict[str, ZMQMessage]:
+        """Messages for MQ.frames2topicmsgs() encoded for each output, different encodings as dicts by address. Only
+        topics with images are encoded more than once."""
+
+        encs      = self.encodings(addrs)
+        enc0, *_  = uniq = list(dict.fromkeys(encs.values()))
+        topicmsgs = MQ.frames2topicmsgs(frames, enc0, outs_codec, topics)
+
+        if len(uniq) == 1:
+            return topicmsgs
+
+        imgs   = {t: f for t, f in frames.items() if f.has_image}
+        by_enc = {enc0: topicmsgs, **{enc: MQ.frames2topicmsgs(imgs, enc, outs_codec, topics) for enc in uniq[1:]}}
+
+        for topic, msg in topicmsgs.items():
+            if msg is not None and topic in imgs:
+                topicmsgs[topic] = {addr: by_enc[enc][topic] for addr, enc in encs.items()}
+
+        return topicmsgs
+
+    def update(self, stalls: dict[str, float | None], addrs: list[str]):
+        """After each send to `addrs` with the current ZMQSender.outs_stall."""
+
+        t = time()
+
+        if (t_last := self.t_last) is not None:
+            ival      = (t - t_last) * 1000
+            self.ival = ival if self.ival is None else self.ival + (ival - self.ival) * 0.25
+
+        self.t_last = t
+
+        if (ival := self.ival) is None:
+            return
+
+        for addr in addrs:
+            out                                  = self.outs[addr]
+            level, nsent, hold, stall_prev, last = out
+            out[1]                               = nsent = nsent + 1
+
+            if nsent < hold or (stall := stalls.get(addr)) is None:
+                continue
+
+            if stall_prev is not None and stall > stall_prev * 0.8:  # moving down didn't help, undo
+                out[:] = [level - 1, 0, min(hold * 2, OutputsAuto.HOLD_MAX), None, -1]
+
+            elif stall > ival * OutputsAuto.STALL_MORE and level < len(self.ladder) - 1:
+                out[:] = [level + 1, 0, hold if last >= 0 else min(hold * 2, OutputsAuto.HOLD_MAX), stall, 1]
+
+            elif stall < ival * OutputsAuto.STALL_LESS and level > 0:
+                out[:] = [level - 1, 0, hold if last <= 0 else min(hold * 2, OutputsAuto.HOLD_MAX), None, -1]
+
+            else:
+                out[3] = None  # it helped or nothing to compare
+
+            if out[0] != level:
+                logger.debug(f'output {addr} encoding {self.ladder[level]} -> {self.ladder[out[0]]}  '
+                    f'(stall {stall:.1f}ms of {ival:.1f}ms)')
+
+
 class MQ:
     LOG_MAP = {'all': 'all', 'image': 'image', 'data': 'data', 'pretty': 'pretty', 'metrics': 'metrics', 'none': False,
         True: 'all', False: False}
@@ -61,22 +335,35 @@ class MQ:
         *,
         srcs_balance:  bool = False,
         srcs_low_lat:  bool | None = None,
+        srcs_decode:   bool | None = None,
+        srcs_prefetch: int | None = None,
         outs_balance:  bool = False,
         outs_required: list[str] | None = None,
-        outs_jpg:      bool | None = None,
+        outs_jpg:      bool | str | None = None,
+        outs_codec:    str | None = None,
         outs_metrics:  str | bool | None = None,
         metrics_cb:    Callable[[dict], None] | None = None,
         on_exit_msg:   Callable[[str], None] | None = None,
         mq_log:        str | bool | None = None,
         mq_msgid_sync: bool | None = None,
+        waker:         ZMQWaker | None = None,
     ):
+        if (outs_codec := OUTPUTS_CODEC if outs_codec is None else outs_codec) not in DATA_CODECS:
+            raise ValueError(f'invalid outputs codec {outs_codec!r}, must be one of {DATA_CODECS}')
+        if outs_codec == 'orjson' and not HAS_ORJSON or outs_codec == 'msgpack' and not HAS_MSGPACK:
+            raise ValueError(f'outputs codec {outs_codec!r} needs {outs_codec} installed')
+
         self.mq_id         = mq_id or rndstr(8)
         on_exit_msg_       = (lambda m: None) if on_exit_msg is None else (lambda m: on_exit_msg(m[0]))
-        self.sender        = ZMQSender(outs_bind, self.mq_id, on_exit_msg_, outs_balance, outs_required) \
+        self.sender        = ZMQSender(outs_bind, self.mq_id, on_exit_msg_, outs_balance, outs_required, waker) \
             if outs_bind else None
-        self.receiver      = ZMQReceiver(srcs_n_topics, self.mq_id, on_exit_msg_, srcs_balance, srcs_low_lat) \
-            if srcs_n_topics else None
-        self.outs_jpg      = OUTPUTS_JPG if outs_jpg is None else outs_jpg
+        self.receiver      = ZMQReceiver(srcs_n_topics, self.mq_id, on_exit_msg_, srcs_balance, srcs_low_lat, waker,
+            srcs_prefetch) if srcs_n_topics else None
+        self.srcs_decode   = SOURCES_DECODE if srcs_decode is None else srcs_decode
+        self.outs_jpg      = outs_jpg = OUTPUTS_JPG if outs_jpg is None else outs_jpg
+        self.outs_auto     = OutputsAuto([self.sender.pull2addr[p] for p in self.sender.pulls]) \
+            if outs_jpg == 'auto' and self.sender else None
+        self.outs_codec    = outs_codec
         self.outs_metrics  = outs_metrics = OUTPUTS_METRICS if outs_metrics is None else outs_metrics
         self.metrics_cb    = metrics_cb
         self.mq_log        = MQ.LOG_MAP.get(MQ_LOG if mq_log is None else mq_log, False)
@@ -154,7 +441,10 @@ class MQ:
             if self.outs_metrics is True:
                 frames = {**frames, '_metrics': Frame(metrics)}
 
-            return MQ.frames2topicmsgs(frames, self.outs_jpg)
+            if (outs_auto := self.outs_auto) is not None:
+                return outs_auto.topicmsgs(frames, self.outs_codec, self.sender.topics_wanted, self.sender.addrs_sending)
+
+            return MQ.frames2topicmsgs(frames, self.outs_jpg, self.outs_codec, self.sender.topics_wanted)
 
         metrics = None
 
@@ -171,66 +461,137 @@ class MQ:
         self.send_state = None  # in case we get another send() without a matching recv(), will increment msg_id otherwise message would be discarded
 
         if metrics is not None:  # could be None because nothing sent (NOT due to timeout but maybe msg_id invalidated as outdated by downstream) so callback not called and metrics not set
+            if self.outs_auto is not None and frames is not None:
+                self.outs_auto.update(self.sender.outs_stall, self.sender.addrs_sending)
+
             outgone()  # we do this after sender.send() to give that data priority
 
         return True
 
-    def recv(self, timeout: int | None = None) -> dict[str, Frame] | None:
+    def recv(self, timeout: int | None = None, *, with_state: bool = False) \
+            -> dict[str, Frame] | tuple[dict[str, Frame], ZMQStateSend | None] | None:
+        """Receive `frames`, or None on timeout. Normally the message id state for the matching send() is stored in
+        `self.send_state`. If `with_state` is True then it is returned along with the `frames` as a tuple instead and
+        `self.send_state` is not touched, for when recv() and send() run in different threads. In that case the caller
+        must set `self.send_state` to it (in the sending thread) before the matching send()."""
+
         if self.receiver is None:
-            return {}
+            return ({}, None) if with_state else {}
 
         if (res := self.receiver.recv(self.recv_state if self.mq_msgid_sync else None, timeout)) is None:
             return None
 
-        topicmsgs, self.send_state = res
-        self.recv_state            = None  # we already used up this recv_state so set to None to increment automatically next time in case send() is not called to get new state
+        topicmsgs, send_state = res
+        self.recv_state       = None  # we already used up this recv_state so set to None to increment automatically next time in case send() is not called to get new state
 
-        self.metrics_.incoming(frames := MQ.topicmsgs2frames(topicmsgs))
+        self.metrics_.incoming(frames := MQ.topicmsgs2frames(topicmsgs, self.srcs_decode))
+
+        if with_state:
+            return frames, send_state
+
+        self.send_state = send_state
 
         return frames
 
     @staticmethod
-    def frames2topicmsgs(frames: dict[str, Frame], outs_jpg: bool | None = None) -> dict[str, ZMQMessage]:
+    def frames2topicmsgs(
+        frames:     dict[str, Frame],
+        outs_jpg:   bool | tuple[int, int] | None = None,
+        outs_codec: str = 'json',
+        topics:     set[str] | None = None,
+    ) -> dict[str, ZMQMessage]:
+        """If `topics` is not None then only those topics are encoded, the rest are still present but as None so that
+        the sender lists them as published without sending them. `outs_jpg` can also be (jpg quality, downscale
+        denominator) for OutputsAuto."""
+
         topicmsgs = {}
+        do_dc     = outs_codec == 'msgpack'  # orjson is just json on the wire
+
+        if outs_jpg is True:  # encode (and cache in the frames) jpgs of all topics that need it up front, in parallel if multiple
+            image_map(lambda frame: frame.jpg, list({id(f): f for t, f in frames.items()
+                if f.has_image and not f.has_jpg and (topics is None or t in topics)}.values()))
 
         for topic, frame in frames.items():
-            data = json_dumps(frame.data, separators=(',', ':')).encode() if frame.data else None
+            if topics is not None and topic not in topics:
+                topicmsgs[topic] = None
 
-            if not frame.has_image:
-                msg = [None] if data is None else [None, data]
+                continue
 
-            else:
+            data = data_encode(frame.data, outs_codec, arrays := []) if frame.data else None
+            xtra = {}
+            msg  = [None]
+
+            if frame.has_image and isinstance(outs_jpg, tuple):
+                quality, denom = outs_jpg
+                image          = frame if denom == 1 else frame.decoded_at(1 / denom)
+                xtra['img']    = [image.height, image.width, image.format, 'jpg']
+
+                msg.append(image.jpg_at(quality))
+
+            elif frame.has_image:
                 enc  = 'jpg' if (do_jpg := frame.has_jpg if outs_jpg is None else outs_jpg) else 'raw'  # preferentially send jpg if is already encoded
-                xtra = {'img': [frame.height, frame.width, frame.format, enc]}
-                img  = frame.jpg if do_jpg else bytearray(memoryview(frame.image))
-                msg  = [xtra, img] if data is None else [xtra, img, data]
+                xtra['img'] = [frame.height, frame.width, frame.format, enc]
+
+                msg.append(frame.jpg if do_jpg else MQ.array2buffer(frame.image))
+
+            if data is not None:
+                if do_dc:
+                    xtra['dc'] = outs_codec
+
+                msg.append(data)
+
+                if arrays:  # ndarrays from data go as their own parts after the data
+                    xtra['nd'] = [[a.dtype.str, a.shape] for a in arrays]
+
+                    msg.extend(MQ.array2buffer(a) for a in arrays)
 
+            msg[0]           = xtra or None
             topicmsgs[topic] = msg
 
         return topicmsgs
 
     @staticmethod
-    def topicmsgs2frames(topicmsgs: dict[str, ZMQMessage]) -> dict[str, Frame]:
+    def array2buffer(array: np.ndarray) -> zmq.Frame:
+        """Raw image or other array as a zero-copy message part, the zmq.Frame keeps the array alive until it is actually
+        sent. Readonly C-contiguous arrays can be used directly since nobody may change them (images received over
+        'shm://' stay pinned upstream as long as they are referenced), writable or non-contiguous ones are copied once
+        here."""
+
+        if array.flags.writeable or not array.flags.c_contiguous:
+            array = array.copy()  # always C-contiguous
+
+        return zmq.Frame(memoryview(array.reshape(-1)).cast('B'), copy=False)
+
+    @staticmethod
+    def topicmsgs2frames(topicmsgs: dict[str, ZMQMessage], decode: bool = False) -> dict[str, Frame]:
+        """If `decode` then jpg images are decoded here (in parallel if multiple) instead of lazily on first access."""
+
         frames = {}
 
         for topic, msg in topicmsgs.items():
-            xtra    = xtra['img'] if (xtra := msg[0]) else None
+            codec   = (xtra := msg[0] or {}).get('dc')
+            nds     = xtra.get('nd') or ()
+            xtra    = xtra.get('img')
             dataidx = 2 if xtra else 1
 
-            if (lmsg := len(msg)) > dataidx + 1:
+            if (lmsg := len(msg)) > (nmax := dataidx + 1 + len(nds)) or nds and lmsg != nmax:  # arrays only come with data
                 raise RuntimeError(f'incorrect number of messages: {lmsg}')
 
-            data  = json_loads(msg[dataidx].decode()) if lmsg > dataidx else None
-            frame = (
+            arrays = [np.frombuffer(part, dtype).reshape(shape) for (dtype, shape), part in zip(nds, msg[dataidx + 1:])]
+            data   = data_decode(msg[dataidx], codec, arrays) if lmsg > dataidx else None
+            frame  = (
                 Frame(data)
                 if xtra is None else
-                Frame(np.frombuffer(msg[1], np.uint8).reshape(xtra[:2] if xtra[2] == 'GRAY' else (xtra[0], xtra[1], 3)), data, xtra[2])
+                Frame(np.frombuffer(msg[1], np.uint8).reshape(Frame.image_shape(*xtra[:3])), data, xtra[2])
                 if xtra[3] == 'raw' else
                 Frame.from_jpg(msg[1], data, xtra[0], xtra[1], xtra[2])
             )
 
             frames[topic] = frame
 
+        if decode:
+            image_map(lambda frame: frame.image, [f for f in frames.values() if f.has_image and not f.has_raw])
+
         return frames
 
 
@@ -243,7 +604,8 @@ class MQSender(MQ):
         *,
         outs_balance:  bool = False,
         outs_required: list[str] | None = None,
-        outs_jpg:      bool | None = None,
+        outs_jpg:      bool | str | None = None,
+        outs_codec:    str | None = None,
         outs_metrics:  str | bool | None = False,
         metrics_cb:    Callable[[dict], None] | None = None,
         on_exit_msg:   Callable[[str], None] | None = None,
@@ -256,6 +618,7 @@ class MQSender(MQ):
             outs_balance  = outs_balance,
             outs_required = outs_required,
             outs_jpg      = outs_jpg,
+            outs_codec    = outs_codec,
             outs_metrics  = outs_metrics,
             metrics_cb    = metrics_cb,
             on_exit_msg   = on_exit_msg,
@@ -272,6 +635,8 @@ class MQReceiver(MQ):
         *,
         srcs_balance:  bool = False,
         srcs_low_lat:  bool | None = None,
+        srcs_decode:   bool | None = None,
+        srcs_prefetch: int | None = None,
         on_exit_msg:   Callable[[str], None] | None = None,
     ):
         super().__init__(
@@ -280,5 +645,7 @@ class MQReceiver(MQ):
             mq_id         = mq_id,
             srcs_balance  = srcs_balance,
             srcs_low_lat  = srcs_low_lat,
+            srcs_decode   = srcs_decode,
+            srcs_prefetch = srcs_prefetch,
             on_exit_msg   = on_exit_msg,
         )
@@ -33,6 +33,29 @@ Example:
     FilterF: sources=['tcp://FilterC', 'tcp://FilterE?']
     FilterG: sources=['tcp://FilterF']
 
+Binary envelopes:
+
+The header message is JSON by default, which is what outside code listening in will get. Receivers advertise that they
+understand the compact binary envelope with 'env' in their JSON requests and the sender advertises the same in its HELLO
+and topics messages. Once every client connected to a given output has advertised it, that output switches to binary
+envelopes, and a receiver which has seen the sender advertise switches its own requests to binary. The binary envelope
+starts with a version byte (never '{') so both kinds are auto-detected on decode. The fixed fields are struct-packed and
+whatever is left over (like 'xtra') is appended as a JSON trailer. HELLO, CLOSE and OOB messages from the sender always
+stay JSON since they go to everyone, including listeners which never sent a request.
+
+Shared memory channels:
+
+An address of the form 'shm://name' is the same as 'ipc://name' except that large message parts (images) are not sent
+over the socket but are instead written to a ring of POSIX shared memory slots (in /dev/shm). Only the slot name and a
+generation number go over the socket in the envelope and the receiver maps the slot read-only and uses it directly
+without any copy. A receiver can connect to this output as either 'shm://name' or 'ipc://name', it is the same thing.
+Synchronized receivers pin the slots they were sent until the last reference to the buffer (the Frame image) is gone,
+at which point the release is sent upstream with the next request. The sender never overwrites a pinned slot, so a
+received image can be held for as long as needed. If all ZMQ_SHM_SLOTS of a topic are pinned then the message is sent
+inline over the socket instead. Ephemeral receivers do not pin, they copy the data out of shared memory on receipt since
+they don't hold up the sender, checking the generation and dropping the message if the slot was already overwritten.
+This is meant for filters running on the same host.
+
 Environment variables:
     DEBUG_ZEROMQ: If 'true'ish and logging is set to 'debug' then will log each message sent and received (not the
         full contents, just basic info).
@@ -46,7 +69,14 @@ Environment variables:
         the last messages even with LINGER set high.
 
     ZMQ_POLL_TIMEOUT: Length to wait in milliseconds each poll for a message to come in in milliseconds. Requests for
-        more frames are sent at this interval as well.
+        more frames are resent at this interval as well if unanswered, backing off while nothing at all comes in (see
+        ZMQ_REQ_IVL_MAX). Senders and receivers given a ZMQWaker do not need to wake up to check for exit, they can
+        block indefinitely and are woken by the waker.
+
+    ZMQ_REQ_IVL_MAX: Maximum interval in milliseconds for resending unanswered requests. Requests are resent quickly
+        (ZMQ_POLL_TIMEOUT) while connecting or if anything at all was received since the last one, otherwise the
+        interval doubles each time up to this, which must be comfortably less than ZMQ_CONN_TIMEOUT since the requests
+        also keep the connection alive upstream. Default ZMQ_CONN_TIMEOUT / 4.
 
     ZMQ_CONN_TIMEOUT: Length of time in milliseconds without receiving anything from a downstream connection in order to
         consider that client timed out and no longer require a request from it to allow publish of frames.
@@ -65,14 +95,52 @@ Environment variables:
     ZMQ_LOW_LATENCY: If 'true'ish then favor lower latency over higher throughput. Will only help in some cases with
         the right properties. Really on things immediately downstream of VideoIn.
 
+    ZMQ_PREFETCH: Default prefetch window for receivers, how many messages a sender may have in flight to a receiver
+        ahead of the last one it received, set on downstream side. Senders understand any window, this just makes
+        the request grant credit for more than the one next message. Keep well under ZMQ_PUB_HWM / (topics + 1) since
+        the messages are waiting in the socket buffers, and more than ZMQ_SHM_SLOTS on 'shm://' will send inline.
+        Default 1.
+
+    ZMQ_REORDER_TIMEOUT: Milliseconds a balanced receiver waits for a missing message while holding later ones in its
+        reorder buffer before giving up on it. It does not wait at all if every connected sender has already sent
+        something later, since each one sends its share of message ids in order. Default ZMQ_CONN_TIMEOUT.
+
+    ZMQ_REORDER_MAX: Number of messages in the reorder buffer of a balanced receiver after which it stops requesting
+        more from the senders which are already past the missing one (backpressure). Default 32.
+
+    ZMQ_TOPIC_FILTER: If 'true'ish then senders only publish (and encode, if they are asked for messages just-in-time)
+        the topics which at least one connected client wants, which clients tell them in their requests. Doubly
+        ephemeral '??' listeners and outside code never request anything so they only see what the requesting clients
+        want (or everything if nothing is requesting and messages are pushed), and a client only gets the topics it
+        wants once the sender knows about it. Set on upstream side, default False.
+
     ZMQ_WARN_NEWER: Warn on newer messages than expected.
     ZMQ_WARN_OLDER: Warn on older messages than expected.
+
+    ZMQ_SHM_SLOTS: Maximum number of shared memory slots in the ring for each topic message part on 'shm://' outputs.
+        If this many are pinned by receivers still holding on to them then messages are sent inline.
+
+    ZMQ_SHM_MIN_SIZE: Message parts smaller than this many bytes are sent inline even on 'shm://' outputs.
+
+    ZMQ_ENV_BINARY: If 'false'ish then never advertise or send binary envelopes, only JSON. Binary envelopes are still
+        understood if received.
+
+    ZMQ_RECV_ZEROCOPY_MIN: Received message parts of at least this many bytes are passed on as readonly memoryviews of
+        the zeromq message buffer instead of being copied into bytes. Smaller parts are copied since that is cheaper
+        than keeping the zeromq message around.
 """
 
 import logging
+import mmap
 import os
 import re
+import shutil
+import struct
+import threading
+import weakref
+from collections import OrderedDict, deque
 from json import dumps as json_dumps, loads as json_loads
+from multiprocessing.shared_memory import SharedMemory
 from time import time_ns, sleep
 from typing import Callable, NamedTuple
 
@@ -80,7 +148,7 @@ import zmq
 
 from .utils import JSONType, json_getval, rndstr, once
 
-__all__ = ['is_zeromq_addr', 'ZMQMessage', 'ZMQReceiver', 'ZMQSender']
+__all__ = ['is_zeromq_addr', 'ZMQMessage', 'ZMQReceiver', 'ZMQSender', 'ZMQWaker']
 
 logger = logging.getLogger(__name__)
 
@@ -97,12 +165,21 @@ ZMQ_RECONNECT_IVL_MAX = int(os.getenv('ZMQ_RECONNECT_IVL_MAX') or 0)  # in milli
 ZMQ_EXPLICIT_LINGER   = int(os.getenv('ZMQ_EXPLICIT_LINGER') or 20)   # in milliseconds
 ZMQ_POLL_TIMEOUT      = int(os.getenv('ZMQ_POLL_TIMEOUT') or 100)     # in milliseconds, unanswered request resend time and exit check
 ZMQ_CONN_TIMEOUT      = int(os.getenv('ZMQ_CONN_TIMEOUT') or 5000)    # in milliseconds
+ZMQ_REQ_IVL_MAX       = int(os.getenv('ZMQ_REQ_IVL_MAX') or ZMQ_CONN_TIMEOUT // 4)  # in milliseconds, max resend interval of unanswered requests
 ZMQ_CONN_HANDSHAKE    = bool(json_getval((os.getenv('ZMQ_CONN_HANDSHAKE') or 'true').lower()))
 ZMQ_PUSH_HWM          = int(os.getenv('ZMQ_PUSH_HWM') or max(3, min(100, ZMQ_CONN_TIMEOUT // max(1, ZMQ_POLL_TIMEOUT))))  # will start complaining after this many push sends pending
 ZMQ_PUB_HWM           = int(os.getenv('ZMQ_PUB_HWM') or 4 * 5)        # will start dropping after this many messages are backed up, low because messages are expected to be large and we don't want latency building up, 4 because 4 parts per message (each part message counts as individual message I guess?)
 ZMQ_LOW_LATENCY       = bool(json_getval((os.getenv('ZMQ_LOW_LATENCY') or 'false').lower()))
+ZMQ_PREFETCH          = int(os.getenv('ZMQ_PREFETCH') or 1)           # messages allowed in flight ahead of the last one received
+ZMQ_REORDER_TIMEOUT   = int(os.getenv('ZMQ_REORDER_TIMEOUT') or ZMQ_CONN_TIMEOUT)  # in milliseconds, balanced sources wait for missing message
+ZMQ_REORDER_MAX       = int(os.getenv('ZMQ_REORDER_MAX') or 32)       # balanced sources stop requesting from the ones ahead past this many waiting
+ZMQ_TOPIC_FILTER      = bool(json_getval((os.getenv('ZMQ_TOPIC_FILTER') or 'false').lower()))
 ZMQ_WARN_NEWER        = bool(json_getval((os.getenv('ZMQ_WARN_NEWER') or 'true').lower()))
 ZMQ_WARN_OLDER        = bool(json_getval((os.getenv('ZMQ_WARN_OLDER') or 'true').lower()))
+ZMQ_SHM_SLOTS         = max(2, int(os.getenv('ZMQ_SHM_SLOTS') or 8))
+ZMQ_SHM_MIN_SIZE      = int(os.getenv('ZMQ_SHM_MIN_SIZE') or 0x10000)
+ZMQ_ENV_BINARY        = bool(json_getval((os.getenv('ZMQ_ENV_BINARY') or 'true').lower()))
+ZMQ_RECV_ZEROCOPY_MIN = int(os.getenv('ZMQ_RECV_ZEROCOPY_MIN') or 0x10000)
 
 MSG_ID_INITIAL        = 0
 MSG_ID_INITIAL_PREV   = -1
@@ -117,12 +194,94 @@ TOPIC_DELIM_B         = b'/'
 TOPIC_DELIM2          = TOPIC_DELIM * 2
 TOPIC_DELIM_B2        = TOPIC_DELIM_B * 2
 
-is_zeromq_addr        = lambda addr: addr.startswith('tcp://') or addr.startswith('ipc://')
+ENV_VERSION           = 1                              # binary envelope version, first byte, JSON always starts with '{'
+ENV_PUB               = struct.Struct('<BBqiHH')       # version, flags, mid, bal, len(sid), len(topics)
+ENV_REQ               = struct.Struct('<BBqBHH')       # version, flags, mid, eph, len(cid), len(uid)
+ENV_FLAG_BAL          = 1                              # ENV_PUB flags
+ENV_FLAG_TOPICS       = 2
+ENV_FLAG_NEW          = 1                              # ENV_REQ flags
+
+SHM_PATH              = '/dev/shm'
+SHM_HEADER            = struct.Struct('<Q')  # generation of data currently in slot
+
+is_zeromq_addr        = lambda addr: addr.startswith('tcp://') or addr.startswith('ipc://') or addr.startswith('shm://')
 
 ZMQMessage            = list[JSONType | bytes]  # only the first OBLIGATORY element is arbitrary JSONType, rest (if present) MUST be bytes
 ZMQState              = tuple                   # for passing info between a Receiver and Sender
 
 
+def env_pub_prefix(sid: str, mid: int, topics: list[str] | None = None, bal: int | bool = False) -> bytes:
+    """Fixed part of a binary publish envelope, the same for all topics of a send."""
+
+    flags  = (bal and ENV_FLAG_BAL) | (topics is not None and ENV_FLAG_TOPICS)
+    sid    = sid.encode()
+    topics = b'' if topics is None else '\0'.join(topics).encode()
+
+    return ENV_PUB.pack(ENV_VERSION, flags, mid, bal, len(sid), len(topics)) + sid + topics
+
+
+def env_pub_decode(buf: bytes) -> dict[str, JSONType]:
+    """Decode either a JSON or binary publish envelope (sid, mid, topics, bal, + trailer) to the same dict."""
+
+    if buf[:1] == b'{':
+        return json_loads(buf.decode())
+
+    _, flags, mid, bal, lsid, ltopics = ENV_PUB.unpack_from(buf)
+    pos                               = ENV_PUB.size + lsid
+    env                               = {} if len(buf) == (end := pos + ltopics) else json_loads(buf[end:].decode())
+    env['sid']                        = buf[ENV_PUB.size : pos].decode()
+    env['mid']                        = mid
+    env['env']                        = ENV_VERSION
+
+    if flags & ENV_FLAG_TOPICS:
+        env['topics'] = buf[pos : end].decode().split('\0') if ltopics else []
+
+    if flags & ENV_FLAG_BAL:
+        env['bal'] = bal
+
+    return env
+
+
+def env_req_encode(env: dict[str, JSONType]) -> bytes:
+    """Binary request envelope (cid, mid, uid, eph, new, + everything else as trailer)."""
+
+    cid  = (rest := env.copy()).pop('cid').encode()
+    uid  = rest.pop('uid', '').encode()
+    mid  = rest.pop('mid')
+    eph  = rest.pop('eph', 0)
+    new  = rest.pop('new', False)
+
+    rest.pop('env', None)
+
+    return ENV_REQ.pack(ENV_VERSION, new and ENV_FLAG_NEW, mid, eph, len(cid), len(uid)) + cid + uid + \
+        (json_dumps(rest, separators=(',', ':')).encode() if rest else b'')
+
+
+def env_req_decode(buf: bytes) -> dict[str, JSONType]:
+    """Decode either a JSON or binary request envelope to the same dict."""
+
+    if buf[:1] == b'{':
+        return json_loads(buf.decode())
+
+    _, flags, mid, eph, lcid, luid = ENV_REQ.unpack_from(buf)
+    pos                            = ENV_REQ.size + lcid
+    env                            = {} if len(buf) == (end := pos + luid) else json_loads(buf[end:].decode())
+    env['cid']                     = buf[ENV_REQ.size : pos].decode()
+    env['mid']                     = mid
+    env['env']                     = ENV_VERSION
+
+    if luid:
+        env['uid'] = buf[pos : end].decode()
+
+    if eph:
+        env['eph'] = eph
+
+    if flags & ENV_FLAG_NEW:
+        env['new'] = True
+
+    return env
+
+
 class ZMQStateSend(NamedTuple):  # for ZMQSender.send() from ZMQReceiver.recv()
     msg_id:   int
     balanced: bool = False
@@ -132,6 +291,46 @@ class ZMQStateRecv(NamedTuple):  # for ZMQReceiver.recv() from ZMQSender.send()
     msg_id: int
 
 
+class ZMQWaker:
+    """Something to put in the pollers of ZMQSender and ZMQReceiver so that they can block indefinitely and still be
+    woken up immediately on exit. It is a pipe which becomes and stays readable once set(), so every poll including it
+    returns immediately from then on and the send() or recv() returns None as if timed out. Can be bridged from a
+    threading or multiprocessing Event `evt` (e.g. a stop event set by a signal handler or from another process), in
+    which case a thread just blocks waiting for it."""
+
+    def __init__(self, evt=None):
+        self.rfd, self.wfd = os.pipe()
+        self.lock          = threading.Lock()
+        self.state         = False  # True for set, None for closed
+
+        os.set_blocking(self.rfd, False)
+        os.set_blocking(self.wfd, False)
+
+        if evt is not None:
+            threading.Thread(target=lambda: (evt.wait(), self.set()), daemon=True).start()
+
+    def fileno(self) -> int:
+        return self.rfd
+
+    def is_set(self) -> bool:
+        return bool(self.state)
+
+    def set(self):
+        with self.lock:
+            if self.state is False:
+                self.state = True
+
+                os.write(self.wfd, b'\0')
+
+    def close(self):
+        with self.lock:
+            if self.state is not None:
+                self.state = None
+
+                os.close(self.rfd)
+                os.close(self.wfd)
+
+
 class ZMQContext:
     context = (None, 0)
 
@@ -149,14 +348,263 @@ class ZMQContext:
             ZMQContext.context[0].destroy()  # linger=0)
 
 
+class ZMQShmWriter:
+    """Ring of shared memory slots per topic message part for a single 'shm://' output. Slots are allocated lazily and
+    reallocated (under a new name) if a part doesn't fit, the receivers keep their old mappings alive as long as needed.
+    Slots written for synchronized clients are pinned until all those clients release them and are skipped over until
+    then."""
+
+    def __init__(self):
+        if not os.path.isdir(SHM_PATH):
+            raise RuntimeError(f'shm:// outputs need {SHM_PATH}')
+
+        self.prefix = f'ofz_{os.getpid()}_{rndstr(8)}'  # must be unique across processes
+        self.rings  = {}  # {(topic, part index): [next slot index, [SharedMemory | None, ...]], ...}
+        self.pins   = {}  # {'slot name': (generation, {'client full_id', ...}), ...}
+        self.gen    = 0
+        self.nalloc = 0
+
+    def destroy(self):
+        for _, slots in self.rings.values():
+            for shm in slots:
+                if shm is not None:
+                    shm.close()
+                    shm.unlink()
+
+        self.rings = {}
+        self.pins  = {}
+
+    def release(self, full_id: str, rels: list[list]):
+        """Client `full_id` no longer references the slots [['slot name', generation], ...] in `rels`."""
+
+        pins = self.pins
+
+        for name, gen in rels:
+            if (pin := pins.get(name)) is not None and pin[0] == gen:
+                (full_ids := pin[1]).discard(full_id)
+
+                if not full_ids:
+                    del pins[name]
+
+    def unpin(self, full_id: str):
+        """Client `full_id` is gone, release everything it had pinned."""
+
+        pins = self.pins
+
+        for name, (_, full_ids) in list(pins.items()):
+            full_ids.discard(full_id)
+
+            if not full_ids:
+                del pins[name]
+
+    def slot(self, key: tuple[bytes, int], size: int) -> SharedMemory | None:
+        if (ring := self.rings.get(key)) is None:
+            ring = self.rings[key] = [0, [None] * ZMQ_SHM_SLOTS]
+
+        slots = ring[1]
+        pins  = self.pins
+        size += SHM_HEADER.size
+
+        for _ in range(ZMQ_SHM_SLOTS):  # next slot in the ring not pinned by any client
+            ring[0] = ((idx := ring[0]) + 1) % ZMQ_SHM_SLOTS
+
+            if (shm := slots[idx]) is None or shm.name not in pins:
+                break
+
+        else:
+            once(logger.warning, f'all {ZMQ_SHM_SLOTS} shared memory slots pinned downstream, sending inline', t=60*60)
+
+            return None
+
+        if shm is None or shm.size < size:
+            if shm is not None:
+                slots[idx] = None
+
+                shm.close()
+                shm.unlink()
+
+            if shutil.disk_usage(SHM_PATH).free < size:  # writing past the end of a full tmpfs is a SIGBUS, not an exception
+                once(logger.warning, f'not enough space in {SHM_PATH} for {size} bytes, sending inline', t=60*60)
+
+                return None
+
+            shm = slots[idx] = SharedMemory(f'{self.prefix}_{self.nalloc}', create=True, size=size)
+            self.nalloc += 1
+
+        return shm
+
+    def write(self, topic: bytes, parts: list, full_ids: list[str] | tuple) -> list[list] | None:
+        """Write large `parts` to shared memory slots, replacing them IN PLACE in `parts` with empty placeholders. The
+        slots are pinned for each of `full_ids` until released.
+
+        Returns:
+            List of [part index, slot name, generation, size] for the parts written, None if nothing was written.
+        """
+
+        descs = None
+
+        for idx, part in enumerate(parts):
+            if (size := (mv := memoryview(part).cast('B')).nbytes) < ZMQ_SHM_MIN_SIZE or \
+                    (shm := self.slot((topic, idx), size)) is None:
+                continue
+
+            self.gen = gen = self.gen + 1
+            buf            = shm.buf
+
+            buf[SHM_HEADER.size : SHM_HEADER.size + size] = mv
+            SHM_HEADER.pack_into(buf, 0, gen)  # generation last so a reader never sees a valid generation for stale data
+
+            parts[idx] = b''
+
+            if full_ids:
+                self.pins[shm.name] = (gen, set(full_ids))
+
+            (descs := descs or []).append([idx, shm.name, gen, size])
+
+        return descs
+
+
+class ZMQShmReader:
+    """Maps shared memory slots of a 'shm://' source read-only (not through SharedMemory because we don't want the
+    resource tracker unlinking segments which belong to another process). Each received part gets its own mapping so
+    that we know when the last buffer exported from it is gone and the slot can be released upstream."""
+
+    def __init__(self):
+        if not os.path.isdir(SHM_PATH):
+            raise RuntimeError(f'shm:// sources need {SHM_PATH}')
+
+        self.released = deque()  # [['slot name', generation], ...] no longer referenced, appended to from any thread
+
+    def destroy(self):
+        self.released.clear()
+
+    def pop_released(self) -> list[list]:
+        released = self.released
+
+        return [released.popleft() for _ in range(len(released))]
+
+    def read(self, msg: list, descs: list[list], copy: bool = False) -> bool:
+        """Replace placeholder parts in `msg` (IN PLACE) with buffers from shared memory slots as described by `descs`.
+        `msg` is [xtra, part0, part1, ...]. Returns False if any of the slots was already overwritten or is gone."""
+
+        for idx, name, gen, size in descs:
+            try:
+                fd = os.open(os.path.join(SHM_PATH, name), os.O_RDONLY)
+            except FileNotFoundError:
+                return False
+
+            try:
+                mm = mmap.mmap(fd, 0, access=mmap.ACCESS_READ)
+            finally:
+                os.close(fd)
+
+            if SHM_HEADER.unpack_from(mm)[0] != gen:
+                return False
+
+            buf = memoryview(mm)[SHM_HEADER.size : SHM_HEADER.size + size]
+
+            if copy:
+                buf = bytes(buf)
+
+                if SHM_HEADER.unpack_from(mm)[0] != gen:  # was overwritten while we were copying
+                    return False
+
+            else:
+                weakref.finalize(mm, self.released.append, [name, gen])  # mmap lives as long as any buffer from it
+
+            msg[idx + 1] = buf
+
+        return True
+
+
 class ZMQSender:
-    class Client(NamedTuple):
-        client_id: str
-        pull:      zmq.Socket
-        t_last:    int
-        requested: bool
-        ephemeral: int
-        prev_id:   int
+    class Client:  # mutable so that a request updates it in place instead of recreating it
+        __slots__ = ('full_id', 'client_id', 'pull', 't_last', 'gen', 'ephemeral', 'prev_id', 'env', 'window', 'topics')
+
+        def __init__(self, full_id: str, client_id: str, pull: zmq.Socket):
+            self.full_id   = full_id
+            self.client_id = client_id
+            self.pull      = pull
+            self.t_last    = 0
+            self.gen       = -1    # Output.gen at the last request, has requested since the last send if equal to it
+            self.ephemeral = 0
+            self.prev_id   = MSG_ID_INITIAL_PREV
+            self.env       = 0     # binary envelope version the client understands, 0 for JSON only
+            self.window    = 1     # how many messages past prev_id the client allows in flight, 1 for one message per request
+            self.topics    = None  # frozenset of topics the client is subscribed to, None for all
+
+    class Output:  # clients of one bound output with counts kept up to date as they come, request and go
+        __slots__ = ('clients', 'windowed', 'gen', 'nsync', 'nwait', 'nreq', 'nold', 'nall', 'topics', 'prev_id')
+
+        def __init__(self):
+            self.clients  = {}  # {'full_id': Client, ...}
+            self.windowed = {}  # {'full_id': Client, ...} those with window > 1, their credit depends on what is sent
+            self.gen      = 0   # incremented on each send to this output, which uses up all outstanding requests
+            self.nsync    = 0   # non-ephemeral clients
+            self.nwait    = 0   # non-ephemeral clients which have not requested since the last send
+            self.nreq     = 0   # clients which have requested since the last send
+            self.nold     = 0   # clients which don't understand binary envelopes
+            self.nall     = 0   # clients subscribed to all topics
+            self.topics   = {}  # {'topic': number of clients subscribed, ...}
+            self.prev_id  = MSG_ID_INITIAL_PREV  # max prev_id requested, reset when no clients left
+
+        def add(self, client: 'ZMQSender.Client'):
+            self.clients[full_id := client.full_id] = client
+
+            if client.window > 1:
+                self.windowed[full_id] = client
+
+            if requested := client.gen == self.gen:
+                self.nreq += 1
+
+            if not client.ephemeral:
+                self.nsync += 1
+                self.nwait += not requested
+
+            if client.env < ENV_VERSION:
+                self.nold += 1
+
+            if (topics := client.topics) is None:
+                self.nall += 1
+
+            else:
+                for topic in topics:
+                    self.topics[topic] = self.topics.get(topic, 0) + 1
+
+            self.prev_id = max(self.prev_id, client.prev_id)
+
+        def remove(self, client: 'ZMQSender.Client'):
+            del self.clients[full_id := client.full_id]
+
+            self.windowed.pop(full_id, None)
+
+            if requested := client.gen == self.gen:
+                self.nreq -= 1
+
+            if not client.ephemeral:
+                self.nsync -= 1
+                self.nwait -= not requested
+
+            if client.env < ENV_VERSION:
+                self.nold -= 1
+
+            if (topics := client.topics) is None:
+                self.nall -= 1
+
+            else:
+                for topic in topics:
+                    if count := self.topics[topic] - 1:
+                        self.topics[topic] = count
+                    else:
+                        del self.topics[topic]
+
+            if not self.clients:
+                self.prev_id = MSG_ID_INITIAL_PREV
+
+        def sent(self):  # all clients must request again
+            self.gen   += 1
+            self.nwait  = self.nsync
+            self.nreq   = 0
 
     def __init__(self,
         addrs_bind:    str | list[str] | None = None,
@@ -164,12 +612,14 @@ class ZMQSender:
         message_oob:   Callable[[ZMQMessage], None] | None = None,
         balance:       bool = False,
         outs_required: list[str] | None = None,
+        waker:         ZMQWaker | None = None,
     ):
         """Publisher of messages (upon request) to possibly multiple clients at multiple bind addresses.
 
         Args:
             addrs_bind: Single or list of strings of bind addresses to listen on, forms can take:
-                "tcp://*", "tcp:127.0.0.1:5552", "ipc://./pipe_in_cwd", "ipc:///abs_path/subdir/pipe"
+                "tcp://*", "tcp:127.0.0.1:5552", "ipc://./pipe_in_cwd", "ipc:///abs_path/subdir/pipe",
+                "shm://./pipe_in_cwd"
 
             server_id: String ID for this server, if None then will be random string each time.
 
@@ -177,26 +627,47 @@ class ZMQSender:
 
             message_oob: Optional callback for out-of-band messages.
 
-            balance: Whether to send messages round-robin across connections for load balancing or not.
+            balance: Whether to send messages across connections for load balancing or not. Each message goes to
+                the output which has requested and is expected to get to it soonest (messages in flight times
+                observed time per message, least in flight and then round-robin if tied), so work is pulled by the
+                outputs according to how fast they are.
+
+            waker: If set then send() returns None as if timed out as soon as this is set, even with no timeout.
         """
 
         self.server_id     = server_id or rndstr(8, 64)
         self.message_oob   = (lambda l: None) if message_oob is None else message_oob
         self.balance       = balance
         self.outs_required = outs_required or []
-        self.clients       = {}  # {'full_id': Client, ...}
+        self.clients       = OrderedDict()  # {'full_id': Client, ...} least recently heard from first, for timeouts
+        self.client_ids    = {}  # {'client_id': number of clients with it, ...}
+        self.outs          = {}  # {PULL Socket: Output, ...}
         self.min_send_id   = MSG_ID_INITIAL
         self.pull2addr     = pull2addr = {}  # {PULL Socket: 'addr', ...}
+        self.pull2pub      = pull2pub = {}   # {PULL Socket: PUB Socket, ...}
+        self.shm_writers   = shm_writers = {}  # {PUB Socket: ZMQShmWriter, ...} for 'shm://' outputs
+        self.outs_inflight = {}  # {PULL Socket: deque([(msg_id, t_sent), ...]), ...} balanced messages not yet acknowledged
+        self.outs_svc      = {}  # {PULL Socket: [service time estimate or None, t_last_ack], ...} in milliseconds
+        self.topics_wanted = None  # set of topics wanted by the clients being sent to, or None for all, see send()
+        self.addrs_sending = None  # bind addresses of the outputs being sent to, see send()
+        self.outs_stall    = {}  # {'addr': EWMA of milliseconds send() waited on the clients of that output or None, ...}
         context            = ZMQContext.get()
         self.pulls         = pulls  = []
         self.pubs          = pubs   = []
         self.poller        = poller = zmq.Poller()
+        self.waker         = waker
+
+        if waker is not None:
+            poller.register(waker, zmq.POLLIN)
 
         for addr_bind in ('tcp://*',) if addrs_bind is None else (addrs_bind,) if isinstance(addrs_bind, str) else addrs_bind:
+            is_shm = False
+
             pulls.append(pull := context.socket(zmq.PULL))
             pubs.append(pub := context.socket(zmq.PUB))
 
             pull2addr[pull] = addr_bind
+            pull2pub[pull]  = pub
 
             if addr_bind.startswith('tcp://'):
                 host, port = TCP_RE_ADDR.match(addr_bind).groups()
@@ -204,9 +675,12 @@ class ZMQSender:
                 pull_addr  = f'{host}:{port + 1}'
                 pub_addr   = f'{host}:{port}'
 
-            elif addr_bind.startswith('ipc://'):
-                pull_addr = f'{addr_bind}{IPC_REQREP_SUFFIX}'
-                pub_addr  = f'{addr_bind}{IPC_PUBSUB_SUFFIX}'
+            elif addr_bind.startswith('ipc://') or (is_shm := addr_bind.startswith('shm://')):
+                pull_addr = f'ipc://{addr_bind[6:]}{IPC_REQREP_SUFFIX}'
+                pub_addr  = f'ipc://{addr_bind[6:]}{IPC_PUBSUB_SUFFIX}'
+
+                if is_shm:
+                    shm_writers[pub] = ZMQShmWriter()
 
             else:
                 raise ValueError(f'invalid bind address {addr_bind!r}')
@@ -224,6 +698,11 @@ class ZMQSender:
 
             poller.register(pull, zmq.POLLIN)
 
+            self.outs[pull]            = ZMQSender.Output()
+            self.outs_inflight[pull]   = deque()
+            self.outs_svc[pull]        = [None, 0]
+            self.outs_stall[addr_bind] = None
+
             logger.info(f'sender {server_id}: publishing on {pub_addr}, listening on {pull_addr}')
 
     def destroy(self):
@@ -238,7 +717,10 @@ class ZMQSender:
             pub.close()
             pull.close()
 
-            if (addr_bind := self.pull2addr[pull]).startswith('ipc://'):
+            if (shm_writer := self.shm_writers.get(pub)) is not None:
+                shm_writer.destroy()
+
+            if (addr_bind := self.pull2addr[pull]).startswith('ipc://') or addr_bind.startswith('shm://'):
                 fnm = addr_bind[6:]
 
                 try:
@@ -263,6 +745,24 @@ class ZMQSender:
         for pub in self.pubs:
             pub.send_multipart(msg_)
 
+    def drop_client(self, client: Client, why: str):
+        del self.clients[full_id := client.full_id]
+
+        self.outs[pull := client.pull].remove(client)
+
+        if count := self.client_ids[client_id := client.client_id] - 1:
+            self.client_ids[client_id] = count
+        else:
+            del self.client_ids[client_id]
+
+        logger.info(f'disconnected output: {client_id}  @ {self.pull2addr.get(pull, "???")}  ({why})')
+
+        if not self.outs[pull].clients:  # whatever was in flight there is gone
+            self.outs_inflight[pull].clear()
+
+        for shm_writer in self.shm_writers.values():
+            shm_writer.unpin(full_id)
+
     def send(self,
         topicmsgs: dict[str, ZMQMessage] | Callable[[], dict[str, ZMQMessage]],
         state:     ZMQStateSend | None = None,
@@ -279,7 +779,11 @@ class ZMQSender:
                 whole message. This could also be a callable which will be called when a request is received from all
                 downstream clients. Meant for getting latest frames from cameras right at the time they are requested.
                 If the callable returns None to the sender then the sender doesn't send anything and returns
-                immediately, not incrementing the send `msg_id`.
+                immediately, not incrementing the send `msg_id`. When it is called `self.topics_wanted` is the set of
+                topics the clients being sent to are subscribed to (or None for all), a topic whose message is None is
+                listed as published but not sent, so the callable doesn't need to encode topics nobody wants. A topic's
+                message can also be a dict of messages by bind address if outputs get it differently (like the image
+                encoded differently for local and remote outputs), `self.addrs_sending` has the addresses it needs.
 
             state: If not coupling with a ZMQReceiver then set this to None and the message id counter will be kept
                 internally. Otherwise, this must be a state returned from ZMQReceiver.recv() or None for the initial
@@ -311,10 +815,20 @@ class ZMQSender:
 
             balanced = state.balanced
 
-        server_id = self.server_id
-        balance   = self.balance
-        clients   = self.clients
-        poller    = self.poller
+        server_id   = self.server_id
+        balance     = self.balance
+        clients     = self.clients
+        client_ids  = self.client_ids
+        outs        = self.outs
+        poller      = self.poller
+        shm_writers = self.shm_writers
+        pull2pub    = self.pull2pub
+        outs_inflt  = self.outs_inflight
+        outs_svc    = self.outs_svc
+        env_adv     = {'env': ENV_VERSION} if ZMQ_ENV_BINARY else {}  # advertise binary envelope support in JSON messages
+        waker       = self.waker
+        t_call      = time_ns() // 1_000_000
+        stalls      = {}  # {PULL Socket: ms, ...} how long we waited for the last client of an output to request
         do_send   = False
         do_hello  = False
         outputs   = None
@@ -328,20 +842,28 @@ class ZMQSender:
                 if not (socks := poller.poll(poll_timeout)):
                     return ret
 
-                pull, flags = socks[0]
+                pull, flags = socks[0] if not isinstance(socks[0][0], int) else socks[-1]  # int file descriptor is the waker
+
+                if isinstance(pull, int):  # only thing there is the waker
+                    return ret
 
                 if flags != zmq.POLLIN:
                     raise RuntimeError(f'unexpected poll flags {flags}')
 
                 msg = pull.recv_multipart()
 
-                env       = json_loads(msg[0].decode())
+                env       = env_req_decode(msg[0])
                 client_id = env['cid']
                 full_id   = client_id + env.get('uid', '')
                 prev_id   = env['mid']
                 ephemeral = env.get('eph', 0)
+                env_ver   = env.get('env', 0)
                 t         = time_ns() // 1_000_000  # ns -> ms
 
+                if (rels := env.get('rel')) is not None:  # shared memory slots no longer in use by this client
+                    for shm_writer in shm_writers.values():
+                        shm_writer.release(full_id, rels)
+
                 if prev_id <= MSG_ID_SPECIAL:
                     if prev_id == MSG_ID_OOB:  # out-of-band message
                         if DEBUG_ZEROMQ:
@@ -352,10 +874,12 @@ class ZMQSender:
                     elif prev_id == MSG_ID_CLOSE:  # close message
                         logger.debug(f'recv msg CLOSE from {client_id}')
 
-                        if full_id in clients:
-                            del clients[full_id]
+                        if (client := clients.get(full_id)) is not None:
+                            self.drop_client(client, 'close')
 
-                            logger.info(f'disconnected output: {client_id}  @ {self.pull2addr.get(pull, "???")}  (close)')
+                        else:
+                            for shm_writer in shm_writers.values():
+                                shm_writer.unpin(full_id)
 
                     return True
 
@@ -374,7 +898,39 @@ class ZMQSender:
 
                 break
 
-            clients[full_id] = ZMQSender.Client(client_id, pull, t, True, ephemeral, prev_id)
+            if (client := clients.get(full_id)) is None:
+                client = clients[full_id] = ZMQSender.Client(full_id, client_id, pull)
+                client_ids[client_id] = client_ids.get(client_id, 0) + 1
+
+            else:
+                outs[client.pull].remove(client)
+                clients.move_to_end(full_id)  # keep clients in order of last heard from
+
+            out = outs[pull]
+
+            if not ephemeral and client.gen != out.gen:  # not a resend
+                stalls[pull] = max(0, t - t_call)
+
+            client.pull      = pull
+            client.t_last    = t
+            client.gen       = out.gen
+            client.ephemeral = ephemeral
+            client.prev_id   = prev_id
+            client.env       = env_ver
+            client.window    = env.get('win', 1)
+            client.topics    = None if (topics := env.get('top')) is None else frozenset(topics)
+
+            out.add(client)
+
+            if balance and not ephemeral and (inflight := outs_inflt[pull]) and inflight[0][0] <= prev_id:  # acknowledged
+                svc = outs_svc[pull]
+
+                while inflight and (sent := inflight[0])[0] <= prev_id:
+                    inflight.popleft()
+
+                    sample = t - max(sent[1], svc[1])  # time since it was sent or since the previous one done, whichever later
+                    svc[0] = sample if svc[0] is None else svc[0] + (sample - svc[0]) * 0.25
+                    svc[1] = t
 
             if prev_id >= msg_id and not ephemeral:  # if requesting higher frame number than we are sending then discard and return
                 self.min_send_id = min_send_id = prev_id + 1
@@ -384,35 +940,43 @@ class ZMQSender:
 
                 return None  # this will cause outer function to exit as if message was sent
 
-            t_min      = t - ZMQ_CONN_TIMEOUT
-            client_ids = set(client.client_id for client in clients.values())
-            do_send    = all(client_id in client_ids for client_id in self.outs_required)  # True if there are no required outputsset()
-            outputs    = {}  # {pull: (output specific do_send, # requested, max prev_id), ...}
+            check_send(t)
 
-            for full_id, (client_id, pull, t_last, requested, ephemeral, prev_id) in list(clients.items()):
-                if t_last < t_min:  # if connection timed out then remove it from further consideration
-                    del clients[full_id]
+            return True
 
-                    logger.info(f'disconnected output: {client_id}  @ {self.pull2addr.get(pull, "???")}  (timeout)')
+        def check_send(t: int):  # determine do_send and outputs from the current state of the clients
+            nonlocal do_send, outputs
 
-                elif balance:  # if doing this then only one bound output endpoint needs to have all clients requested in order to send to that endpoint only
-                    out_do_send, out_nrequested, out_prev_id = \
-                        (True, 0, MSG_ID_INITIAL_PREV) if (output := outputs.get(pull)) is None else output
+            t_min = t - ZMQ_CONN_TIMEOUT
 
-                    outputs[pull] = (
-                        out_do_send and (requested or ephemeral),
-                        out_nrequested + requested,
-                        max(out_prev_id, prev_id),
-                    )
+            while clients and (client := next(iter(clients.values()))).t_last < t_min:  # oldest first, stop at first alive
+                self.drop_client(client, 'timeout')
+
+            do_send = all(client_id in client_ids for client_id in self.outs_required)  # True if there are no required outputs
+            outputs = {}  # {pull: (output specific do_send, # requested, max prev_id), ...}
+
+            for pull, out in outs.items():
+                if not out.clients:
+                    continue
 
-                elif not requested and not ephemeral:  # if at least one non-ephemeral connection hasn't requested yet then we don't send
+                nwait = out.nwait
+                nreq  = out.nreq
+
+                for client in out.windowed.values():  # credit left from the window of the last request
+                    if client.gen != out.gen and (len(outs_inflt[pull]) < client.window if balance else
+                            client.prev_id + client.window >= msg_id):
+                        nwait -= not client.ephemeral
+                        nreq  += 1
+
+                if balance:  # if doing this then only one bound output endpoint needs to have all clients requested in order to send to that endpoint only
+                    outputs[pull] = (not nwait, nreq, out.prev_id)
+
+                elif nwait:  # if at least one non-ephemeral connection hasn't requested yet then we don't send
                     do_send = False
 
             if balance and all(not (out_do_send and out_nrequested) for out_do_send, out_nrequested, _ in outputs.values()):
                 do_send = False
 
-            return True
-
         def send_maybe() -> bool:
             nonlocal do_hello, topicmsgs
 
@@ -421,9 +985,39 @@ class ZMQSender:
             if (not do_send or not clients) and not push:
                 ret = False
 
-            elif not isinstance(topicmsgs, dict):  # callable(topicmsgs)
-                if (topicmsgs := topicmsgs()) is None:  # if no frames to send just-in-time then say that frames have been sent
-                    ret = True
+            else:
+                if balance:
+                    *_, out_pull = min([(  # the output expected to get to it soonest, then least in flight, then oldest max prev_id
+                                (ninflight := len(outs_inflt[out_pull])) * (outs_svc[out_pull][0] or 0),
+                                ninflight,
+                                out_prev_id,
+                                out_pull,
+                            )
+                            for out_pull, (out_do_send, out_nrequested, out_prev_id) in outputs.items()
+                            if out_do_send and out_nrequested
+                        ], key=lambda o: o[:3]
+                    )
+
+                    pulls = [out_pull]
+                    pubs  = [pull2pub[out_pull]]
+
+                else:
+                    pulls = self.pulls
+                    pubs  = self.pubs
+
+                pub2want = dict.fromkeys(pubs)  # {PUB Socket: set('topic', ...) | None, ...} topics wanted, None for all
+
+                if ZMQ_TOPIC_FILTER:
+                    for pull, pub in zip(pulls, pubs):  # outputs with nobody or anybody subscribed to all get everything
+                        if (out := outs[pull]).clients and not out.nall:
+                            pub2want[pub] = set(out.topics)
+
+                self.topics_wanted = None if None in (wants := pub2want.values()) else set().union(*wants)
+                self.addrs_sending = [self.pull2addr[pull] for pull in pulls]
+
+                if not isinstance(topicmsgs, dict):  # callable(topicmsgs)
+                    if (topicmsgs := topicmsgs()) is None:  # if no frames to send just-in-time then say that frames have been sent
+                        ret = True
 
             if do_hello:
                 do_hello = False
@@ -432,7 +1026,7 @@ class ZMQSender:
                     if DEBUG_ZEROMQ:
                         logger.debug(f'send msg HELLO to all')
 
-                    msg_hello = [TOPIC_DELIM_B2, json_dumps({'sid': self.server_id, 'mid': MSG_ID_HELLO}, separators=(',', ':')).encode()]
+                    msg_hello = [TOPIC_DELIM_B2, json_dumps({'sid': self.server_id, 'mid': MSG_ID_HELLO, **env_adv}, separators=(',', ':')).encode()]
 
                     for pub in self.pubs:
                         pub.send_multipart(msg_hello)
@@ -441,45 +1035,86 @@ class ZMQSender:
                 return ret
 
             if balance:
-                _, out_pull = min([(out_prev_id, out_pull)  # get the output with the oldest max prev_id across its clients
-                        for out_pull, (out_do_send, out_nrequested, out_prev_id) in outputs.items()
-                        if out_do_send and out_nrequested
-                    ], key=lambda o: o[0]
-                )
-
-                pubs        = [self.pubs[self.pulls.index(out_pull)]]
-                pub_clients = [(full_id, (client_id, pull, t_last, _, ephemeral, prev_id))
-                    for full_id, (client_id, pull, t_last, _, ephemeral, prev_id) in clients.items()
-                    if pull is out_pull
-                ]
-
-            else:
-                pubs        = self.pubs
-                pub_clients = list(clients.items())
+                outs_inflt[out_pull].append((msg_id, time_ns() // 1_000_000))
 
-            for full_id, (client_id, pull, t_last, _, ephemeral, prev_id) in pub_clients:  # mark all as sent so they don't trigger another send until requested again
-                clients[full_id] = ZMQSender.Client(client_id, pull, t_last, False, ephemeral, prev_id)
+            for pull, addr in zip(pulls, self.addrs_sending):  # stall is 0 if the output had already requested
+                stall                 = stalls.get(pull, 0)
+                self.outs_stall[addr] = stall if (prev := self.outs_stall[addr]) is None else prev + (stall - prev) * 0.25
 
             if DEBUG_ZEROMQ:
-                logger.debug(f'send msg {msg_id} to ({", ".join(clt[0] for _, clt in pub_clients)}): ({", ".join(topicmsgs)}){"  - push" if push else ""}')
+                logger.debug(f'send msg {msg_id} to ({", ".join(c.client_id for p in pulls for c in outs[p].clients.values())}): ({", ".join(topicmsgs)}){"  - push" if push else ""}')
 
-            env = {'sid': server_id, 'mid': msg_id, 'topics': list(topicmsgs)}
+            env      = {'sid': server_id, 'mid': msg_id, 'topics': list(topicmsgs), **env_adv}
+            pub2pins = {}  # {PUB Socket: ['full_id', ...], ...} synchronized clients pin the shm slots they are sent
+            pub2bin  = {}  # {PUB Socket: bool, ...} binary envelopes only if every client of that output understands them
+
+            for pull, pub in zip(pulls, pubs):
+                out = outs[pull]
+
+                if pub in shm_writers:
+                    pub2pins[pub] = [full_id for full_id, client in out.clients.items() if not client.ephemeral]
+
+                if ZMQ_ENV_BINARY:
+                    pub2bin[pub] = bool(out.clients) and not out.nold
+
+                out.sent()  # so they don't trigger another send until requested again
 
             if balance or balanced:
                 env['bal'] = balance or balanced + 1  # increment balanced index if that is coming from upstream
 
-            msg_topics = [TOPIC_DELIM_B2, json_dumps(env, separators=(',', ':')).encode()]
+            env_bin  = env_pub_prefix(server_id, msg_id, env['topics'], env.get('bal', False)) if any(pub2bin.values()) else None
+            env_json = json_dumps(env, separators=(',', ':')).encode()
+            pub2env  = {}  # {PUB Socket: (trailer, env_json), ...} 'sent' topics in trailer if not all are published there
+            tops2env = {}  # {('topic', ...): (trailer, env_json), ...} same for all outputs which publish the same topics
 
-            for topic, msg in topicmsgs.items():
-                env['xtra'] = msg[0]
-                topic       = f'{"" if topic.startswith("_") else TOPIC_DELIM}{topic}{TOPIC_DELIM}'.encode()
-                msg         = [topic, json_dumps(env, separators=(',', ':')).encode(), *msg[1:]]
+            for pub in pubs:
+                wants = pub2want[pub]
+                tops  = tuple(t for t, m in topicmsgs.items() if m is not None and (wants is None or t in wants))
 
-                for pub in pubs:
-                    pub.send_multipart(msg)
+                if (penv := tops2env.get(tops)) is None:
+                    penv = tops2env[tops] = ({}, env_json) if len(tops) == len(topicmsgs) else (
+                        trailer := {'sent': list(tops)}, json_dumps({**env, **trailer}, separators=(',', ':')).encode())
+
+                pub2env[pub] = penv
+
+            for topic, msgs in topicmsgs.items():
+                if msgs is None:  # nobody wants it so it was not even encoded
+                    continue
+
+                want  = topic
+                topic = f'{"" if topic.startswith("_") else TOPIC_DELIM}{topic}{TOPIC_DELIM}'.encode()
+
+                for pub, addr in zip(pubs, self.addrs_sending):
+                    if (wants := pub2want[pub]) is not None and want not in wants:
+                        continue
+
+                    msg  = msgs[addr] if isinstance(msgs, dict) else msgs
+                    xtra = msg[0]
+                    rest = {**pub2env[pub][0]} if xtra is None else {**pub2env[pub][0], 'xtra': xtra}
+
+                    if (shm_writer := shm_writers.get(pub)) is not None and \
+                            (shm := shm_writer.write(topic, parts := msg[1:], pub2pins.get(pub, ()))) is not None:
+                        rest['shm'] = shm
+
+                    else:
+                        parts = msg[1:]
+
+                    if pub2bin.get(pub):  # fixed part encoded once per send, only the trailer (if any) per topic
+                        hdr = env_bin + json_dumps(rest, separators=(',', ':')).encode() if rest else env_bin
+                    else:
+                        hdr = json_dumps({**env, 'xtra': xtra, **rest}, separators=(',', ':')).encode()
+
+                    pub.send_multipart([topic, hdr, *parts])
 
             for pub in pubs:  # publish heartbeat / topics informative message
-                pub.send_multipart(msg_topics)
+                trailer, pub_json = pub2env[pub]
+
+                if pub2bin.get(pub):
+                    hdr = env_bin + json_dumps(trailer, separators=(',', ':')).encode() if trailer else env_bin
+                else:
+                    hdr = pub_json
+
+                pub.send_multipart([TOPIC_DELIM_B2, hdr])
 
             self.min_send_id = msg_id + 1
 
@@ -491,8 +1126,14 @@ class ZMQSender:
         if res is None:  # someone requested larger message id than currently sending, discard and return
             return ZMQStateRecv(self.min_send_id)
 
+        if clients:  # clients may already allow this message from their prefetch windows without any new request
+            check_send(time_ns() // 1_000_000)
+
         if timeout is None:
             while not send_maybe():  # only after eating up all requests do we check and send if all downstreams requested
+                if waker is not None and waker.is_set():
+                    return None
+
                 if poll_recv(None) is None:
                     break
 
@@ -500,7 +1141,7 @@ class ZMQSender:
             t_timeout = time_ns() + timeout * 1_000_000
 
             while not send_maybe():
-                if not (timeout := max(0, t_timeout - time_ns())):
+                if not (timeout := max(0, t_timeout - time_ns())) or waker is not None and waker.is_set():
                     return None
 
                 if poll_recv(timeout // 1_000_000) is None:
@@ -517,12 +1158,15 @@ class ZMQReceiver:
 
             self.ephemeral   = ephemeral
             self.addr        = addr_connect
+            self.shm_reader  = None   # created on first shared memory message so 'ipc://' sources work with 'shm://' outputs as well
+            self.env_bin     = False  # whether the server has advertised understanding binary envelopes
             self.push        = push = context.socket(zmq.PUSH) if ephemeral < 2 else None
             self.sub         = sub  = context.socket(zmq.SUB)
             self.conn        = False  # if the server is "connected" or not
             self.server_id   = None
             self.unique_id   = rndstr(12, 64)  # unique id for connection because otherwise upstream has no way to differentiate between clients with same client_id on same requestor socket
-            self.min_recv_id = MSG_ID_INITIAL  # this is only used by ephemeral channels individually, synchronized channels have a shared global value
+            self.min_recv_id = MSG_ID_INITIAL  # this is only used by ephemeral and balanced channels individually, synchronized channels have a shared global value
+            self.req_topics  = None  # topics we tell the server we want in requests so it doesn't publish others, None for all
             self.init_recvd  = lambda msg, topic, topics: {t: msg if t == topic else None for t in topics if not t.startswith('_')}  # subscribed to lowercase all so we don't include '_' prefix hidden topics
 
             if addr_connect.startswith('tcp://'):
@@ -531,9 +1175,9 @@ class ZMQReceiver:
                 push_addr  = f'{host}:{port + 1}'
                 sub_addr   = f'{host}:{port}'
 
-            elif addr_connect.startswith('ipc://'):
-                push_addr = f'{addr_connect}{IPC_REQREP_SUFFIX}'
-                sub_addr  = f'{addr_connect}{IPC_PUBSUB_SUFFIX}'
+            elif addr_connect.startswith('ipc://') or addr_connect.startswith('shm://'):
+                push_addr = f'ipc://{addr_connect[6:]}{IPC_REQREP_SUFFIX}'
+                sub_addr  = f'ipc://{addr_connect[6:]}{IPC_PUBSUB_SUFFIX}'
 
             else:
                 raise ValueError(f'invalid bind address {addr_connect!r}')
@@ -573,8 +1217,9 @@ class ZMQReceiver:
 
                     sub.setsockopt_string(zmq.SUBSCRIBE, (src if src.startswith('_') else TOPIC_DELIM + src) + TOPIC_DELIM)
 
-                self.recvd_new = {src: None for src, _ in topics}
-                self.topic_map = dict(topics)
+                self.recvd_new  = {src: None for src, _ in topics}
+                self.topic_map  = dict(topics)
+                self.req_topics = list(self.recvd_new)
 
         @property
         def subscribed_all(self):
@@ -613,12 +1258,39 @@ class ZMQReceiver:
 
             return recvd
 
+        def collect(self, data: dict[str, ZMQMessage]) -> dict[str, ZMQMessage]:  # received topics, mapped, into `data`
+            topic_map = self.topic_map
+
+            for topic, frame in (recvd.items() if (recvd := self.recvd) is not None else ()):
+                if frame is not None:
+                    if (topic := topic_map.get(topic, topic)) in data:
+                        raise RuntimeError(f'duplicate topic {topic!r} from: {self.server_id}  @ {self.addr}')
+
+                    data[topic] = frame
+
+            return data
+
+        def read_shm(self, msg: ZMQMessage, descs: list[list]) -> bool:
+            if (shm_reader := self.shm_reader) is None:
+                shm_reader = self.shm_reader = ZMQShmReader()
+
+            return shm_reader.read(msg, descs, bool(self.ephemeral))  # ephemeral copies out because it doesn't hold up the sender
+
         def send_push(self, msg0: dict[str, JSONType], msg_: list[bytes] = ()):  # WARNING! `msg0` is MUTATED!
             if self.ephemeral < 2:  # do not anything to doubly-ephemeral channels
                 msg0['uid'] = self.unique_id
 
+                if self.env_bin:
+                    env = env_req_encode(msg0)
+
+                else:
+                    if ZMQ_ENV_BINARY:
+                        msg0['env'] = ENV_VERSION
+
+                    env = json_dumps(msg0, separators=(',', ':')).encode()
+
                 try:
-                    self.push.send_multipart([json_dumps(msg0, separators=(',', ':')).encode(), *msg_], zmq.DONTWAIT)
+                    self.push.send_multipart([env, *msg_], zmq.DONTWAIT)
 
                 except zmq.Again:
                     if self.conn:
@@ -632,6 +1304,8 @@ class ZMQReceiver:
         message_oob:    Callable[[ZMQMessage], None] | None = None,
         balance:        bool = False,
         low_latency:    bool | None = None,
+        waker:          ZMQWaker | None = None,
+        prefetch:       int | None = None,
     ):
         """Consumer of published messages (upon request) from possibly multiple publishers at multiple addresses.
 
@@ -644,11 +1318,20 @@ class ZMQReceiver:
 
             message_oob: Function to call on out-of-band messages.
 
-            balance: Indicates that incoming data is load balanced, needed to work properly in that case.
+            balance: Indicates that incoming data is load balanced, needed to work properly in that case. Messages
+                are returned in message id order, ones which arrive ahead of a missing one are held in a reorder buffer
+                until it arrives or can't anymore (ZMQ_REORDER_TIMEOUT, ZMQ_REORDER_MAX).
 
             low_latency: Low latency mode means that next message is NOT preemptively requested when current message is
                 received, leads to lower latency but also lower throughput.
 
+            waker: If set then recv() returns None as if timed out as soon as this is set, even with no timeout.
+
+            prefetch: Number of messages the senders are allowed to have in flight to us ahead of the last one
+                received, waiting in the socket buffers until we get to them. 1 is the classic single preemptive
+                request. Higher helps throughput over high latency links or with bursty processing at the cost of that
+                many messages of extra latency. Ignored in `low_latency` mode.
+
         Notes:
             * An address can have a trailing '?' character which will not be considered part of the address but will
             rather indicate that address to be ephemeral. An ephemeral channel will not hold up a sender for
@@ -666,7 +1349,11 @@ class ZMQReceiver:
         self.message_oob = (lambda m: None) if message_oob is None else message_oob
         self.balance     = balance
         self.low_latency = ZMQ_LOW_LATENCY if low_latency is None else low_latency
+        self.window      = 1 if self.low_latency else max(1, ZMQ_PREFETCH if prefetch is None else prefetch)
         self.prev_id     = MSG_ID_INITIAL_PREV
+        self.reorder     = {}    # {msg_id: (data, balanced), ...} complete balanced messages waiting to be returned in order
+        self.reorder_t   = None  # when we started waiting for a missing balanced message while holding later ones
+        self.waker       = waker
         self.senders     = senders = {}
         context          = ZMQContext.get()
 
@@ -694,6 +1381,9 @@ class ZMQReceiver:
             if sender.ephemeral < 2:
                 sender.push.close()
 
+            if sender.shm_reader is not None:
+                sender.shm_reader.destroy()
+
         ZMQContext.free()
 
     def send_oob(self, msg: ZMQMessage):
@@ -709,6 +1399,9 @@ class ZMQReceiver:
     def new_recv(self):
         self.poller = poller = zmq.Poller()
 
+        if (waker := self.waker) is not None:
+            poller.register(waker, zmq.POLLIN)
+
         for sender in self.senders.values():
             sender.new_recv(poller=poller)
 
@@ -744,29 +1437,71 @@ class ZMQReceiver:
         senders     = self.senders
         sendervs    = senders.values()
         poller      = self.poller
+        waker       = self.waker
+        got_any     = False  # whether anything at all was received since the last request, for resend backoff
+        reorder     = self.reorder
+        taken       = None   # (data, balanced) of the balanced message being returned
+        recvd       = None   # of the sender currently being processed in recv_once()
+
+        def take_balanced() -> bool:  # next balanced message in order from the reorder buffer if we can have it
+            nonlocal min_recv_id, taken
+
+            for mid in [mid for mid in reorder if mid < min_recv_id]:  # we already moved past these
+                del reorder[mid]
+
+            if not reorder:
+                return False
+
+            if (msg_id := min(reorder)) != min_recv_id and self.prev_id != MSG_ID_INITIAL_PREV:  # out of order, not first
+                if any(s.conn and s.min_recv_id <= min_recv_id for s in sendervs):  # someone may still send the missing one
+                    if (t_reorder := self.reorder_t) is None:
+                        self.reorder_t = time_ns()
+
+                        return False
+
+                    if time_ns() - t_reorder < ZMQ_REORDER_TIMEOUT * 1_000_000:
+                        return False
+
+                if ZMQ_WARN_NEWER:
+                    logger.warning(f'balanced message id(s) {min_recv_id}..{msg_id - 1} missing, skipping to {msg_id}')
+
+            self.reorder_t = None
+            min_recv_id    = msg_id
+            taken          = reorder.pop(msg_id)
+
+            return True
 
         def recv_once(timeout) -> bool:  # got_all
-            nonlocal balanced, min_recv_id
+            nonlocal balanced, min_recv_id, got_any
 
             while socks := poller.poll(timeout):
                 while socks:  # we do like this instead of iterate because socks may need to be zeroed out in the loop
                     sub, flags = socks.pop()
 
+                    if isinstance(sub, int):  # int file descriptor is the waker
+                        return False
+
+                    got_any = True
+
                     if flags != zmq.POLLIN:
                         raise RuntimeError(f'unexpected poll flags {flags}')
 
-                    msg = sub.recv_multipart()
+                    msg = sub.recv_multipart(copy=False)  # zmq.Frames, large parts stay where zeromq put them
 
                     sender     = senders[sub]
                     sender_eph = sender.ephemeral
-                    topic      = (t := msg[0])[t.startswith(TOPIC_DELIM_B) : -1].decode()  # empty topics indicates ignore actual message (topics count tho for information)
-                    env        = json_loads(msg[1].decode())
+                    topic      = (t := msg[0].bytes)[t.startswith(TOPIC_DELIM_B) : -1].decode()  # empty topics indicates ignore actual message (topics count tho for information)
+                    env        = env_pub_decode(msg[1].bytes)
                     server_id  = sender.server_id = env['sid']
                     msg_id     = env['mid']
                     topics     = env.get('topics')
-                    msg        = [env.get('xtra'), *msg[2:]]
+                    sent       = env.get('sent', topics)  # the topics actually published to us if not all of them were
+                    msg        = [env.get('xtra'), *(p.buffer.toreadonly() if len(p) >= ZMQ_RECV_ZEROCOPY_MIN else p.bytes for p in msg[2:])]  # view keeps zmq.Frame alive
                     t          = time_ns() // 1_000_000  # ns -> ms
 
+                    if ZMQ_ENV_BINARY and env.get('env', 0) >= ENV_VERSION:  # sender understands binary requests
+                        sender.env_bin = True
+
                     if msg_balanced := not sender_eph and env.get('bal', False):  # ephemeral channels do not transfer balanced message status
                         balanced = msg_balanced  # because we want 'bal' index if balanced pipeline longer than one filter
 
@@ -790,6 +1525,7 @@ class ZMQReceiver:
 
                         elif msg_id == MSG_ID_CLOSE:  # close message
                             sender.min_recv_id = MSG_ID_INITIAL  # for ephemeral only, so that if sender restarts we don't get barrage of older message warnings
+                            sender.env_bin     = False           # whatever restarts there may not understand binary envelopes
 
                             if sender.conn:
                                 logger.info(f'disconnected source: {server_id}  @ {sender.addr}  (close)')
@@ -809,15 +1545,21 @@ class ZMQReceiver:
 
                             return None
 
+                        if (shm := env.get('shm')) and not sender.read_shm(msg, shm):  # only map kept messages
+                            if ZMQ_WARN_OLDER:
+                                logger.warning(f'received stale shared memory message id {msg_id} from {server_id}  ({topic})')
+
+                            return None
+
                         if (recvd := sender.recvd) is None:
-                            recvd = sender.recvd = sender.init_recvd(msg, topic, topics)
+                            recvd = sender.recvd = sender.init_recvd(msg, topic, sent)
 
                         elif msg_id == min_recv_id_:
                             if topic:  # topic == '' is only an informative topics message from the server by this point
                                 recvd[topic] = msg  # topic guaranteed to be one we want because of zmq.SUBSCRIBE
 
                         else:  # msg_id > min_recv_id_, topic == '' msg still useful here for invalidating older messages
-                            recvd = sender.new_recv(msg, topic, topics)  # note that we don't reset 'balanced' here because sender can not change that state from one msg to another
+                            recvd = sender.new_recv(msg, topic, sent)  # note that we don't reset 'balanced' here because sender can not change that state from one msg to another
 
                             return True
 
@@ -829,6 +1571,12 @@ class ZMQReceiver:
 
                         sender.min_recv_id = msg_id
 
+                    elif balance:  # balanced sender, each has its own increasing share of the message ids, put back in order by take_balanced()
+                        if process_msg(max(min_recv_id, sender.min_recv_id)) is None:
+                            continue
+
+                        sender.min_recv_id = msg_id
+
                     else:  # synchronized sender
                         if msg_id > min_recv_id and not msg_balanced and min_recv_id != MSG_ID_INITIAL and ZMQ_WARN_NEWER:
                             logger.warning(f'received newer message id {msg_id} than expected {min_recv_id} from {server_id}  ({topic})')
@@ -836,7 +1584,7 @@ class ZMQReceiver:
                         if (res := process_msg(min_recv_id)) is None:
                             continue
 
-                        elif res and not balance:
+                        elif res:
                             for s in sendervs:  # invalidate all other (non-ephemeral) sender frames and reregister for polling if needed
                                 if s is not sender and not s.ephemeral:
                                     if s.got_all:
@@ -846,14 +1594,6 @@ class ZMQReceiver:
 
                         min_recv_id = msg_id
 
-                        if balance:
-                            if topic:  # topic informative message may be late partial from previous message so we don't allow it to lock sender
-                                for s in sendervs:  # remove all other channels from polling because we are balancing and there may be other messages from other senders if we took too long to process and we do not want to mix sources
-                                    if s is not sender and s.sub in poller:
-                                        poller.unregister(s.sub)
-
-                                socks = None  # force poll again from scratch because there may be other senders that have been polled that have just been removed from checking
-
                     if not sender.subscribed_all and (diff := (sr := set(recvd)) - (st := set(topics))) and (not sender_eph or sr & st):
                         for t in diff:
                             if t != '-':  # special topic name '-' is treated as a topic that will never exist and is subscribed to only to create the connection, so we don't warn on it not being present
@@ -861,14 +1601,28 @@ class ZMQReceiver:
 
                             del recvd[t]
 
-                    if sender.got_all:  # unregister sender from polling if complete because we don't want newer messages
-                        poller.unregister(sender.sub)
+                    if sender.got_all:
+                        if balance:  # into the reorder buffer and ready for the next one from this sender
+                            reorder[msg_id]    = (sender.collect({}), msg_balanced)
+                            sender.min_recv_id = msg_id + 1
+
+                            sender.new_recv()
+                            request(min_recv_id - 1, (sender,))  # it may go on to the next one while we wait for others
+
+                        else:  # unregister sender from polling if complete because we don't want newer messages
+                            poller.unregister(sender.sub)
+
+                if balance:
+                    if take_balanced():
+                        return True
+
+                    continue
 
                 # Return True condition is that all synchronized sender topics received and if any ephemeral senders
                 # then all the individual sender topics must have been received or none at all, no partials. Do not
-                # return if nothing received at all. Also return if a single channel from balaning received entirely.
+                # return if nothing received at all.
 
-                got_all_synced   = True   # should really be 'got_all_synced_or_sources_are_balanced' but that is too long
+                got_all_synced   = True
                 got_any_complete = False
                 got_any_partial  = False
 
@@ -881,20 +1635,30 @@ class ZMQReceiver:
 
                         break
 
-                    elif not s.ephemeral and not balance:
+                    elif not s.ephemeral:
                         got_all_synced = False
 
                         break
 
-                if got_all_synced and got_any_complete and not got_any_partial and not poller.poll(0):  # if more messages waiting then they are more ephemeral messages, try to get them before returning
+                if got_all_synced and got_any_complete and not got_any_partial and \
+                        not [s for s, _ in poller.poll(0) if not isinstance(s, int)]:  # if more messages waiting then they are more ephemeral messages, try to get them before returning
                     return True
 
             return False  # should only get here due to timeout with negative return condition
 
-        def request(prev_id):
+        def request(prev_id, senders=sendervs):
             msg_req = {'cid': client_id, 'mid': prev_id}
 
-            for sender in sendervs:
+            if (window := self.window) > 1:  # senders may send up to prev_id + window without waiting for another request
+                msg_req['win'] = window
+
+            for sender in senders:
+                if balance:
+                    if sender.min_recv_id > prev_id + 1 and len(reorder) >= ZMQ_REORDER_MAX:  # past the one we are waiting
+                        continue                                                                # for, hold it back for now
+
+                    msg_req['mid'] = max(prev_id, sender.min_recv_id - 1)  # never more than it sent so it doesn't skip
+
                 if sender.ephemeral:
                     msg_req['eph'] = sender.ephemeral
                 elif 'eph' in msg_req:
@@ -905,44 +1669,66 @@ class ZMQReceiver:
                 elif 'new' in msg_req:
                     del msg_req['new']
 
+                if (req_topics := sender.req_topics) is not None:
+                    msg_req['top'] = req_topics
+                elif 'top' in msg_req:
+                    del msg_req['top']
+
+                if (shm_reader := sender.shm_reader) is not None and (rels := shm_reader.pop_released()):
+                    msg_req['rel'] = rels
+                elif 'rel' in msg_req:
+                    del msg_req['rel']
+
                 sender.send_push(msg_req)
 
-        got_all = recv_once(0)
+        got_all = recv_once(0) or balance and take_balanced()
 
         t_timeout = float('inf') if timeout is None else time_ns() + timeout * 1_000_000
+        req_ivl   = ZMQ_POLL_TIMEOUT
 
         while True:
             if got_all:
-                if not self.low_latency and balanced != 1:  # first receiver after load balancing split never prefetches because that can confuse splitter, TODO: fix that
-                    request(min_recv_id)  # preemptively request the next expected frame before returning, sacrifices latency for throughput
-
                 self.prev_id = min_recv_id
-                data         = {}
 
-                for sender in sendervs:
-                    topic_map = sender.topic_map
+                if balance:
+                    data, balanced = taken
 
-                    for topic, frame in (recvd.items() if (recvd := sender.recvd) is not None else ()):
-                        if frame is not None:
-                            if (topic := topic_map.get(topic, topic)) in data:
-                                raise RuntimeError(f'duplicate topic {topic!r} from: {sender.server_id}  @ {sender.addr}')
+                else:
+                    data = {}
 
-                            data[topic] = frame
+                    for sender in sendervs:
+                        sender.collect(data)
 
-                self.new_recv()
+                    self.new_recv()
+
+                if not self.low_latency:
+                    request(min_recv_id)  # preemptively request the next expected frame before returning, sacrifices latency for throughput
 
                 if balance and not balanced:
                     once(logger.warning, f'balanced sources receiver received non-balanced message(s)', t=60*60)
 
                 return (data, ZMQStateSend(min_recv_id, balanced))
 
+            if waker is not None and waker.is_set():
+                return None
+
             request(min_recv_id - 1)
 
             if timeout is None:
-                recv_once_timeout = ZMQ_POLL_TIMEOUT
+                recv_once_timeout = req_ivl
             elif not (timeout := max(0, t_timeout - time_ns()) // 1_000_000):
                 return None
             else:
-                recv_once_timeout = min(timeout, ZMQ_POLL_TIMEOUT)
+                recv_once_timeout = min(timeout, req_ivl)
 
-            got_all = recv_once(recv_once_timeout)
+            if balance and (t_reorder := self.reorder_t) is not None:  # wake up to give up on a missing message in time
+                recv_once_timeout = min(recv_once_timeout,
+                    max(0, (t_reorder - time_ns()) // 1_000_000 + ZMQ_REORDER_TIMEOUT + 1))
+
+            got_any = False
+            got_all = recv_once(recv_once_timeout) or balance and take_balanced()
+
+            if got_any or not all(s.conn for s in sendervs if s.ephemeral < 2):  # resend quickly while something is happening or connecting, otherwise back off
+                req_ivl = ZMQ_POLL_TIMEOUT
+            else:
+                req_ivl = min(req_ivl * 2, ZMQ_REQ_IVL_MAX)
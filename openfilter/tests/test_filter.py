@@ -589,6 +589,83 @@ class TestFilter(unittest.TestCase):
             self.assertEqual(runner.wait(), [0, 0])
 
 
+    def test_process_batch(self):
+        class Batcher(Filter):
+            def process_batch(self, frames_batch):
+                return [None if (count := frames['main'].data['count']) == 5 else
+                    Frame({'count': count, 'batch': len(frames_batch)}) for frames in frames_batch]
+
+        with RunnerContext([
+            (QueueToFilters, dict(
+                outputs = 'ipc://test-Q2F',
+                queue   = (qin := mp.Queue()),
+            )),
+            (Batcher, dict(
+                sources          = 'ipc://test-Q2F',
+                outputs          = 'ipc://test-batch',
+                batch_size       = 4,
+                batch_timeout_ms = 500,
+            )),
+            (FiltersToQueue, dict(
+                sources = 'ipc://test-batch',
+                queue   = (qout := FiltersToQueue.Queue()).child_queue,
+            )),
+        ], [qin, qout], exit_time=5) as runner:
+
+            for count in range(10):
+                qin.put({'main': Frame({'count': count})})
+
+            datas = [qout.get()['main'].data for _ in range(9)]
+
+            self.assertEqual([d['count'] for d in datas], [0, 1, 2, 3, 4, 6, 7, 8, 9])  # in order, None not sent
+            self.assertTrue(all(1 <= d['batch'] <= 4 for d in datas))
+            self.assertTrue(any(d['batch'] > 1 for d in datas))
+
+            qin.put(False)
+
+            self.assertFalse(qout.get())
+            self.assertEqual(runner.wait(), [0, 0, 0])
+
+
+    def test_pipeline(self):
+        class Counter(Filter):
+            def process(self, frames):
+                return None if (count := frames['main'].data['count']) == 5 else Frame({'count': count, 'x2': count * 2})
+
+        for batch_size in (None, 3):
+            with RunnerContext([
+                (QueueToFilters, dict(
+                    outputs  = 'ipc://test-Q2F',
+                    queue    = (qin := mp.Queue()),
+                    pipeline = True,
+                )),
+                (Counter, dict(
+                    sources    = 'ipc://test-Q2F',
+                    outputs    = 'ipc://test-pipeline',
+                    pipeline   = True,
+                    batch_size = batch_size,
+                )),
+                (FiltersToQueue, dict(
+                    sources  = 'ipc://test-pipeline',
+                    queue    = (qout := FiltersToQueue.Queue()).child_queue,
+                    pipeline = True,
+                )),
+            ], [qin, qout], exit_time=5) as runner:
+
+                for count in range(20):
+                    qin.put({'main': Frame({'count': count})})
+
+                datas = [qout.get()['main'].data for _ in range(19)]
+
+                self.assertEqual([d['count'] for d in datas], [c for c in range(20) if c != 5])  # in order, None not sent
+                self.assertTrue(all(d['x2'] == d['count'] * 2 for d in datas))
+
+                qin.put(False)
+
+                self.assertFalse(qout.get())
+                self.assertEqual(runner.wait(), [0, 0, 0])
+
+
     def test_metrics_topic_subscribe(self):
         with RunnerContext([
             (QueueToFilters, dict(
@@ -10,6 +10,7 @@ import pickle
 from numpy import array_equal as aeq
 
 from openfilter.filter_runtime import Frame
+from openfilter.filter_runtime import frame as frame_module
 
 
 class TestFrame(unittest.TestCase):
@@ -402,7 +403,7 @@ class TestFrame(unittest.TestCase):
         self.assertTrue((f := frm_raw_gray_rw.ro.ro_bgr).gray is f.gray)
 
         self.assertTrue(frm_raw_gray_ro is frm_raw_gray_ro.ro)
-        self.assertTrue(frm_raw_gray_rw.jpg is not frm_raw_gray_rw.jpg)
+        self.assertTrue(frm_raw_gray_rw.jpg is frm_raw_gray_rw.jpg)  # cached until touched
         self.assertTrue(frm_raw_gray_ro.jpg is frm_raw_gray_ro.jpg)
 
         self.assertTrue(aeq(image_jpg, frm_raw_gray_rw.jpg))
@@ -762,7 +763,7 @@ class TestFrame(unittest.TestCase):
         self.assertFalse(n._Frame__image.flags.writeable)
         self.assertEqual(n._Frame__shapef, ((3, 2, 3), 'BGR'))
         self.assertIs(n._Frame__jpg, False)
-        self.assertIs(f._Frame__ro_bgr, n)
+        self.assertIs(f._Frame__cache[('BGR', 1)], n)
 
         n = (f := frm_raw_rgb_ro.copy()).gray
 
@@ -803,7 +804,7 @@ class TestFrame(unittest.TestCase):
         self.assertFalse(n._Frame__image.flags.writeable)
         self.assertEqual(n._Frame__shapef, ((3, 2, 3), 'BGR'))
         self.assertIs(n._Frame__jpg, False)
-        self.assertIs(f._Frame__ro_bgr, n)
+        self.assertIs(f._Frame__cache[('BGR', 1)], n)
 
         # jpg_rgb
 
@@ -836,7 +837,7 @@ class TestFrame(unittest.TestCase):
         self.assertFalse(n._Frame__image.flags.writeable)
         self.assertEqual(n._Frame__shapef, ((3, 2, 3), 'BGR'))
         self.assertIs(n._Frame__jpg, False)
-        self.assertIs(f._Frame__ro_bgr, n)
+        self.assertIs(f._Frame__cache[('BGR', 1)], n)
 
         n = (f := frm_jpg_rgb.copy()).gray
 
@@ -876,7 +877,7 @@ class TestFrame(unittest.TestCase):
         self.assertFalse(n._Frame__image.flags.writeable)
         self.assertEqual(n._Frame__shapef, ((3, 2, 3), 'BGR'))
         self.assertIs(n._Frame__jpg, False)
-        self.assertIs(f._Frame__ro_bgr, n)
+        self.assertIs(f._Frame__cache[('BGR', 1)], n)
 
         # jpg_plus_rgb
 
@@ -911,7 +912,7 @@ class TestFrame(unittest.TestCase):
         self.assertFalse(n._Frame__image.flags.writeable)
         self.assertEqual(n._Frame__shapef, ((3, 2, 3), 'BGR'))
         self.assertIs(n._Frame__jpg, False)
-        self.assertIs(f._Frame__ro_bgr, n)
+        self.assertIs(f._Frame__cache[('BGR', 1)], n)
 
         n = (f := frm_jpg_plus_rgb.copy()).gray
 
@@ -952,7 +953,7 @@ class TestFrame(unittest.TestCase):
         self.assertFalse(n._Frame__image.flags.writeable)
         self.assertEqual(n._Frame__shapef, ((3, 2, 3), 'BGR'))
         self.assertIs(n._Frame__jpg, False)
-        self.assertIs(f._Frame__ro_bgr, n)
+        self.assertIs(f._Frame__cache[('BGR', 1)], n)
 
         # raw_bgr_rw
 
@@ -1061,7 +1062,7 @@ class TestFrame(unittest.TestCase):
         self.assertFalse(n._Frame__image.flags.writeable)
         self.assertEqual(n._Frame__shapef, ((3, 2, 3), 'RGB'))
         self.assertIs(n._Frame__jpg, False)
-        self.assertIs(f._Frame__ro_rgb, n)
+        self.assertIs(f._Frame__cache[('RGB', 1)], n)
 
         n = (f := frm_raw_bgr_ro.copy()).gray
 
@@ -1102,7 +1103,7 @@ class TestFrame(unittest.TestCase):
         self.assertFalse(n._Frame__image.flags.writeable)
         self.assertEqual(n._Frame__shapef, ((3, 2, 3), 'RGB'))
         self.assertIs(n._Frame__jpg, False)
-        self.assertIs(f._Frame__ro_rgb, n)
+        self.assertIs(f._Frame__cache[('RGB', 1)], n)
 
         # jpg_bgr
 
@@ -1135,7 +1136,7 @@ class TestFrame(unittest.TestCase):
         self.assertFalse(n._Frame__image.flags.writeable)
         self.assertEqual(n._Frame__shapef, ((3, 2, 3), 'RGB'))
         self.assertIs(n._Frame__jpg, False)
-        self.assertIs(f._Frame__ro_rgb, n)
+        self.assertIs(f._Frame__cache[('RGB', 1)], n)
 
         n = (f := frm_jpg_bgr.copy()).gray
 
@@ -1175,7 +1176,7 @@ class TestFrame(unittest.TestCase):
         self.assertFalse(n._Frame__image.flags.writeable)
         self.assertEqual(n._Frame__shapef, ((3, 2, 3), 'RGB'))
         self.assertIs(n._Frame__jpg, False)
-        self.assertIs(f._Frame__ro_rgb, n)
+        self.assertIs(f._Frame__cache[('RGB', 1)], n)
 
         # jpg_plus_bgr
 
@@ -1210,7 +1211,7 @@ class TestFrame(unittest.TestCase):
         self.assertFalse(n._Frame__image.flags.writeable)
         self.assertEqual(n._Frame__shapef, ((3, 2, 3), 'RGB'))
         self.assertIs(n._Frame__jpg, False)
-        self.assertIs(f._Frame__ro_rgb, n)
+        self.assertIs(f._Frame__cache[('RGB', 1)], n)
 
         n = (f := frm_jpg_plus_bgr.copy()).gray
 
@@ -1251,7 +1252,7 @@ class TestFrame(unittest.TestCase):
         self.assertFalse(n._Frame__image.flags.writeable)
         self.assertEqual(n._Frame__shapef, ((3, 2, 3), 'RGB'))
         self.assertIs(n._Frame__jpg, False)
-        self.assertIs(f._Frame__ro_rgb, n)
+        self.assertIs(f._Frame__cache[('RGB', 1)], n)
 
 
         # raw_gray_rw
@@ -1353,7 +1354,7 @@ class TestFrame(unittest.TestCase):
         self.assertFalse(n._Frame__image.flags.writeable)
         self.assertEqual(n._Frame__shapef, ((3, 2, 3), 'BGR'))
         self.assertIs(n._Frame__jpg, False)
-        self.assertIs(f._Frame__ro_bgr, n)
+        self.assertIs(f._Frame__cache[('BGR', 1)], n)
 
         n = (f := frm_raw_gray_ro.copy()).rgb
 
@@ -1362,7 +1363,7 @@ class TestFrame(unittest.TestCase):
         self.assertFalse(n._Frame__image.flags.writeable)
         self.assertEqual(n._Frame__shapef, ((3, 2, 3), 'RGB'))
         self.assertIs(n._Frame__jpg, False)
-        self.assertIs(f._Frame__ro_rgb, n)
+        self.assertIs(f._Frame__cache[('RGB', 1)], n)
 
         n = (f := frm_raw_gray_ro.copy()).gray
 
@@ -1387,7 +1388,7 @@ class TestFrame(unittest.TestCase):
         self.assertFalse(n._Frame__image.flags.writeable)
         self.assertEqual(n._Frame__shapef, ((3, 2, 3), 'BGR'))
         self.assertIs(n._Frame__jpg, False)
-        self.assertIs(f._Frame__ro_bgr, n)
+        self.assertIs(f._Frame__cache[('BGR', 1)], n)
 
         n = (f := frm_raw_gray_ro.copy()).rw_rgb
 
@@ -1404,7 +1405,7 @@ class TestFrame(unittest.TestCase):
         self.assertFalse(n._Frame__image.flags.writeable)
         self.assertEqual(n._Frame__shapef, ((3, 2, 3), 'RGB'))
         self.assertIs(n._Frame__jpg, False)
-        self.assertIs(f._Frame__ro_rgb, n)
+        self.assertIs(f._Frame__cache[('RGB', 1)], n)
 
         # jpg_gray
 
@@ -1430,7 +1431,7 @@ class TestFrame(unittest.TestCase):
         self.assertFalse(n._Frame__image.flags.writeable)
         self.assertEqual(n._Frame__shapef, ((3, 2, 3), 'BGR'))
         self.assertIs(n._Frame__jpg, False)
-        self.assertIs(f._Frame__ro_bgr, n)
+        self.assertIs(f._Frame__cache[('BGR', 1)], n)
 
         n = (f := frm_jpg_gray.copy()).rgb
 
@@ -1439,7 +1440,7 @@ class TestFrame(unittest.TestCase):
         self.assertFalse(n._Frame__image.flags.writeable)
         self.assertEqual(n._Frame__shapef, ((3, 2, 3), 'RGB'))
         self.assertIs(n._Frame__jpg, False)
-        self.assertIs(f._Frame__ro_rgb, n)
+        self.assertIs(f._Frame__cache[('RGB', 1)], n)
 
         n = (f := frm_jpg_gray.copy()).gray
 
@@ -1463,7 +1464,7 @@ class TestFrame(unittest.TestCase):
         self.assertFalse(n._Frame__image.flags.writeable)
         self.assertEqual(n._Frame__shapef, ((3, 2, 3), 'BGR'))
         self.assertIs(n._Frame__jpg, False)
-        self.assertIs(f._Frame__ro_bgr, n)
+        self.assertIs(f._Frame__cache[('BGR', 1)], n)
 
         n = (f := frm_jpg_gray.copy()).rw_rgb
 
@@ -1480,7 +1481,7 @@ class TestFrame(unittest.TestCase):
         self.assertFalse(n._Frame__image.flags.writeable)
         self.assertEqual(n._Frame__shapef, ((3, 2, 3), 'RGB'))
         self.assertIs(n._Frame__jpg, False)
-        self.assertIs(f._Frame__ro_rgb, n)
+        self.assertIs(f._Frame__cache[('RGB', 1)], n)
 
         # jpg_plus_gray
 
@@ -1515,7 +1516,7 @@ class TestFrame(unittest.TestCase):
         self.assertFalse(n._Frame__image.flags.writeable)
         self.assertEqual(n._Frame__shapef, ((3, 2, 3), 'RGB'))
         self.assertIs(n._Frame__jpg, False)
-        self.assertIs(f._Frame__ro_rgb, n)
+        self.assertIs(f._Frame__cache[('RGB', 1)], n)
 
         n = (f := frm_jpg_plus_gray.copy()).gray
 
@@ -1556,7 +1557,7 @@ class TestFrame(unittest.TestCase):
         self.assertFalse(n._Frame__image.flags.writeable)
         self.assertEqual(n._Frame__shapef, ((3, 2, 3), 'RGB'))
         self.assertIs(n._Frame__jpg, False)
-        self.assertIs(f._Frame__ro_rgb, n)
+        self.assertIs(f._Frame__cache[('RGB', 1)], n)
 
 
     def test_jpg(self):
@@ -1573,6 +1574,230 @@ class TestFrame(unittest.TestCase):
         self.assertEqual(Frame.from_jpg(image_jpg, format='BGR').format, 'BGR')
 
 
+    def test_jpg_roundtrip(self):
+        image = np.zeros((64, 96, 3), np.uint8)
+        image[16:48, 24:72] = (255, 128, 0)
+
+        jpg = Frame(image.copy(), {}, 'BGR').ro.jpg
+
+        self.assertEqual(jpg[:2], b'\xff\xd8')
+        self.assertLess(np.abs(Frame.from_jpg(jpg).image.astype(int) - image).mean(), 4)
+
+        jpg = Frame(image[..., 0].copy(), {}, 'GRAY').jpg
+        img = Frame.from_jpg(jpg, format='GRAY').image
+
+        self.assertEqual(img.shape, (64, 96))
+        self.assertLess(np.abs(img.astype(int) - image[..., 0]).mean(), 4)
+
+
+    def test_decoded_at(self):
+        image = np.zeros((60, 90, 3), np.uint8)
+        image[:, 45:] = (0, 0, 255)
+        jpg   = Frame(image, {}, 'BGR').ro.jpg
+
+        f = Frame.from_jpg(jpg, {'a': 1}, 60, 90, 'BGR')
+        h = f.decoded_at(1/2)
+
+        self.assertIs(f._Frame__image, False)  # did not do a full decode
+        self.assertEqual(h.shape, (30, 45, 3))
+        self.assertEqual(h.format, 'BGR')
+        self.assertIs(h.data, f.data)
+        self.assertTrue(h.is_ro)
+        self.assertIs(f.decoded_at(0.5), h)  # cached
+        self.assertEqual(f.decoded_at(1/4).shape, (15, 23, 3))
+        self.assertEqual(f.decoded_at(1/8).shape, (8, 12, 3))
+        self.assertIs(f.decoded_at(1), f)
+        self.assertLess(abs(int(h.image[15, 40, 2]) - 255), 16)
+
+        self.assertEqual(Frame.from_jpg(jpg, format='GRAY').decoded_at(1/2).shape, (30, 45))
+
+        f = Frame(image, {}, 'RGB')  # raw writable, resize and no cache
+        h = f.decoded_at(1/4)
+
+        self.assertEqual(h.shape, (15, 23, 3))
+        self.assertEqual(h.format, 'RGB')
+        self.assertTrue(h.is_ro)
+        self.assertIsNot(f.decoded_at(1/4), h)
+
+        self.assertRaises(ValueError, lambda: f.decoded_at(1/3))
+        self.assertRaises(ValueError, lambda: f.decoded_at(2))
+        self.assertRaises(ValueError, lambda: f.decoded_at(0))
+        self.assertIs(Frame({}).decoded_at(1/2).image, None)
+
+
+    def test_jpg_rw_cache(self):
+        image = np.zeros((32, 48, 3), np.uint8)
+        f     = Frame(image, {}, 'BGR')
+
+        self.assertFalse(f.has_jpg)
+
+        jpg = f.jpg
+
+        self.assertTrue(f.has_jpg)
+        self.assertIs(f.jpg, jpg)  # cached while not modified
+        self.assertIs(f._Frame__jpg, False)  # not cached as a readonly jpg
+        self.assertIsNot(Frame(f, {}).jpg, jpg)  # cache not shared with other Frames
+
+        f.image[:] = 255  # access to writable image invalidates
+
+        self.assertFalse(f.has_jpg)
+        self.assertIsNot(jpg2 := f.jpg, jpg)
+        self.assertGreater(Frame.from_jpg(jpg2).image.mean(), 240)
+        self.assertIs(f.jpg, jpg2)
+
+        image[:] = 0  # modified through outside reference so must touch
+        self.assertIs(f.touch(), f)
+        self.assertIsNot(jpg3 := f.jpg, jpg2)
+        self.assertLess(Frame.from_jpg(jpg3).image.mean(), 16)
+
+        f.rw
+        self.assertIsNot(f.jpg, jpg3)
+
+        jpg = f.jpg
+        f.rw_bgr
+        self.assertIsNot(f.jpg, jpg)
+
+        f = Frame(image, {}, 'BGR').ro  # readonly unaffected
+        jpg = f.jpg
+
+        f.image
+        f.touch()
+        self.assertIs(f.jpg, jpg)
+
+
+    def test_crop(self):
+        image = np.arange(40 * 64 * 3, dtype=np.uint32).astype(np.uint8).reshape(40, 64, 3)
+        f     = Frame(image, {'a': 1}, 'RGB')
+        c     = f.crop(8, 4, 16, 10)
+
+        self.assertEqual(c.shape, (10, 16, 3))
+        self.assertEqual(c.format, 'RGB')
+        self.assertIs(c.data, f.data)
+        self.assertTrue(aeq(c.image, image[4:14, 8:24]))
+        self.assertTrue(np.shares_memory(c.image, image))  # zero-copy view
+        self.assertTrue(c.is_rw)
+        self.assertTrue(f.ro.crop(8, 4, 16, 10).is_ro)
+        self.assertEqual(f.crop(-5, 30, 100, 100).shape, (10, 64, 3))  # clipped
+        self.assertTrue(aeq(f.roi(8, 4, 24, 14).image, c.image))
+        self.assertRaises(ValueError, lambda: f.crop(64, 0, 10, 10))
+        self.assertRaises(ValueError, lambda: f.crop(0, 0, 0, 10))
+        self.assertIs(Frame({}).crop(0, 0, 1, 1).image, None)
+
+        image = np.zeros((48, 80, 3), np.uint8)
+        image[20:30, 40:60] = (0, 255, 0)
+        jpg   = Frame(image, {}, 'BGR').ro.jpg
+        f     = Frame.from_jpg(jpg, {}, 48, 80, 'BGR')
+        c     = f.crop(37, 18, 26, 14)
+
+        self.assertEqual(c.shape, (14, 26, 3))
+        self.assertTrue(c.is_ro)
+        self.assertLess(np.abs(c.image.astype(int) - Frame.from_jpg(jpg).image[18:32, 37:63]).mean(), 2)  # upsampling at block edges can differ
+
+        f = Frame.from_jpg(Frame(image[..., 1].copy(), {}, 'GRAY').jpg, {}, 48, 80, 'GRAY')
+
+        self.assertEqual(f.crop(37, 18, 26, 14).shape, (14, 26))
+
+
+    def test_conversion_cache(self):
+        image = np.random.randint(0, 255, (16, 24, 3), np.uint8)
+        f     = Frame(image, {}, 'BGR').ro
+        hits  = Frame.cache_hits
+        miss  = Frame.cache_misses
+
+        self.assertIs(f.rgb, f.rgb)
+        self.assertEqual((Frame.cache_hits - hits, Frame.cache_misses - miss), (1, 1))
+        self.assertIs(f.rgb.gray, f.gray)  # shared between converted Frames
+        self.assertIs(f.gray.bgr, f)
+        self.assertIs(f.ro_rgb, f.rgb)
+        self.assertIs(f.decoded_at(1/2).rgb, f.rgb.decoded_at(1/2))
+        self.assertEqual(f.rgb.decoded_at(1/2).gray.shape, (8, 12))
+        self.assertIs(f.decoded_at(1/2).gray, f._Frame__cache[('GRAY', 2)])
+        self.assertTrue(aeq(f.rw_rgb.image, f.rgb.image))
+        self.assertTrue(f.rw_rgb.is_rw)
+        self.assertIsNot(f.rw_rgb.image, f.rgb.image)
+
+        g = pickle.loads(pickle.dumps(f))  # survives pickling
+
+        self.assertEqual(set(g._Frame__cache), set(f._Frame__cache))
+        self.assertTrue(aeq(g.rgb.image, f.rgb.image))
+        self.assertTrue(g.rgb.is_ro)
+        self.assertIs(g.rgb, g._Frame__cache[('RGB', 1)])
+        self.assertIs(g.rgb.gray, g.gray)
+
+        f = Frame(image, {}, 'BGR')  # writable, ro conversion cached until touched
+        n = f.ro_rgb
+
+        self.assertIs(f.ro_rgb, n)
+
+        f.image[:] = 0
+
+        self.assertIsNot(m := f.ro_rgb, n)
+        self.assertEqual(m.image.max(), 0)
+        self.assertIsNot(f.rgb, f.rgb)  # writable conversions not cached
+
+        f = Frame.from_jpg(Frame(image, {}, 'BGR').ro.jpg, {}, 16, 24, 'BGR')
+
+        for scale in (1/2, 1/4, 1/8):
+            for frame in (f, f.rgb, f.gray):
+                frame.decoded_at(scale)
+
+        self.assertLessEqual(len(f._Frame__cache), frame_module.FRAME_CACHE_SIZE)  # bounded
+
+
+    def test_yuv(self):
+        bgr  = np.zeros((8, 12, 3), np.uint8)
+        bgr[:, 6:] = (255, 0, 0)
+        bgr[4:]    = (0, 200, 100)
+
+        f = Frame(bgr, {'a': 1}, 'BGR')
+        n = f.nv12
+        i = f.i420
+
+        self.assertEqual((n.format, n.shape, n.height, n.width, n.channels), ('NV12', (12, 12), 8, 12, 3))
+        self.assertEqual((i.format, i.shape, i.height, i.width), ('I420', (12, 12), 8, 12))
+        self.assertTrue(n.is_yuv and i.is_yuv and not f.is_yuv)
+        self.assertEqual(str(n), 'Frame(12x8xNV12)')
+        self.assertIs(n.data, f.data)
+        self.assertTrue(aeq(n.i420.image, i.image))  # I420 <-> NV12 is lossless
+        self.assertTrue(aeq(i.nv12.image, n.image))
+        self.assertTrue(aeq(n.gray.image, n.image[:8]))
+        self.assertTrue(aeq(i.gray.image, i.image[:8]))
+        self.assertLess(np.abs(n.bgr.image.astype(int) - bgr).mean(), 8)
+        self.assertLess(np.abs(i.rgb.image.astype(int) - bgr[..., ::-1]).mean(), 8)
+        self.assertTrue(aeq(n.rw_bgr.image, n.bgr.image))
+        self.assertTrue(aeq(f.gray.nv12.gray.image, f.gray.image))
+
+        ro = n.ro
+
+        self.assertIs(ro.bgr, ro.bgr)
+        self.assertIs(ro.bgr.nv12, ro)
+
+        jpg = ro.jpg
+        j   = Frame.from_jpg(jpg, {}, 8, 12, 'NV12')
+
+        self.assertEqual(j.shape, (12, 12))
+        self.assertLess(np.abs(j.image.astype(int) - n.image).mean(), 8)
+        self.assertEqual(j.decoded_at(1/2).shape, (6, 6))
+        self.assertEqual(j.decoded_at(1/4).shape, (3, 4))  # 2x3 rounded up to even
+        self.assertEqual(n.decoded_at(1/2).shape, (6, 6))
+        self.assertEqual(i.decoded_at(1/4).shape, (3, 4))
+
+        c = n.crop(3, 1, 6, 4)
+
+        self.assertEqual((c.format, c.height, c.width), ('NV12', 6, 8))  # expanded to even
+        self.assertTrue(aeq(c.gray.image, n.gray.image[0:6, 2:10]))
+        self.assertTrue(aeq(c.bgr.image, n.bgr.image[0:6, 2:10]))
+        self.assertTrue(c.is_rw)
+        self.assertTrue(ro.crop(3, 1, 6, 4).is_ro)
+        self.assertTrue(aeq(i.crop(4, 2, 4, 4).i420.image, c.i420.crop(2, 2, 4, 4).image))
+
+        self.assertRaises(ValueError, lambda: Frame(np.zeros((10, 12), np.uint8), {}, 'NV12'))
+        self.assertRaises(ValueError, lambda: Frame(np.zeros((12, 11), np.uint8), {}, 'I420'))
+        self.assertRaises(ValueError, lambda: Frame(np.zeros((8, 12, 3), np.uint8), {}, 'NV12'))
+        self.assertRaises(ValueError, lambda: Frame(np.zeros((7, 12, 3), np.uint8), {}, 'BGR').nv12)
+        self.assertEqual(Frame.image_shape(8, 12, 'I420'), (12, 12))
+
+
     def test_eq(self):
         image_rgb        = np.array([[[1,2,3], [4,5,6]], [[7,8,9],[9,8,7]], [[1,0,0], [2,0,0]]], np.uint8)
         image_bgr        = cv2.cvtColor(image_rgb, cv2.COLOR_RGB2BGR)
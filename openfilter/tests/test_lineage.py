@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+
+import json
+import logging
+import os
+import socket
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from time import sleep, time
+from unittest import mock
+
+from openlineage.client.client import OpenLineageClient
+from openlineage.client.run import RunState
+from openlineage.client.transport.http import HttpConfig, HttpTransport
+
+from openfilter.filter_runtime.lineage.openlineage_client import AsyncEmitter, OpenFilterLineage, \
+    create_openfilter_facet_with_fields, openfilter_facet_schema
+from openfilter.filter_runtime.utils import setLogLevelGlobal
+
+logger = logging.getLogger(__name__)
+
+log_level = int(getattr(logging, (os.getenv('LOG_LEVEL') or 'CRITICAL').upper()))
+
+setLogLevelGlobal(log_level)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+
+        return sock.getsockname()[1]
+
+
+class LineageServer:
+    """Local HTTP stand-in for a lineage backend, collects the posted events."""
+
+    def __init__(self, port):
+        events = self.events = []
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                events.append(json.loads(self.rfile.read(int(self.headers['Content-Length']))))
+                self.send_response(200)
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.server = HTTPServer(('127.0.0.1', port), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+        self.thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class BlockingClient:
+    def __init__(self, delay=0):
+        self.delay  = delay
+        self.events = []
+
+    def emit(self, event):
+        sleep(self.delay)
+        self.events.append(event)
+
+
+def wait_for(cond, timeout=5):
+    t_end = time() + timeout
+
+    while not cond():
+        if time() > t_end:
+            return False
+
+        sleep(0.02)
+
+    return True
+
+
+@mock.patch.dict(os.environ, {'OPENLINEAGE_DISABLED': 'false'})
+class TestLineage(unittest.TestCase):
+    def lineage(self, client, **kwargs):
+        lineage = OpenFilterLineage(client=client, filter_name='TestFilter', interval=60)
+
+        lineage.async_emitter = AsyncEmitter(client, **kwargs)
+
+        return lineage
+
+    def test_facet_fields(self):
+        facet = create_openfilter_facet_with_fields({'_Frame__shapef': ((4, 3), 'GRAY'), 'A-b': {'x': None}}, 'F')
+
+        self.assertEqual(facet, {'frame__shapef': ['(4, 3)', 'GRAY'], 'a_b__x': '', '_producer': facet['_producer'],
+            'schemaURL': facet['schemaURL'], 'type': 'F'})
+
+        misses = openfilter_facet_schema.cache_info().misses
+
+        for i in range(10):
+            create_openfilter_facet_with_fields({'_Frame__shapef': ((i, 3), 'GRAY'), 'A-b': {'x': None}}, 'F')
+
+        self.assertEqual(openfilter_facet_schema.cache_info().misses, misses)  # same schema, not synthesized again
+
+        with self.assertRaises(TypeError):
+            create_openfilter_facet_with_fields({'type': 'x'}, 'F')
+
+    def test_spool_and_replay(self):
+        port   = free_port()
+        client = OpenLineageClient(transport=HttpTransport(HttpConfig(url=f'http://127.0.0.1:{port}', timeout=1, retry={'total': 0})))
+
+        with tempfile.TemporaryDirectory() as spool_path:
+            lineage = self.lineage(client, spool_path=spool_path, retry_interval=0.2)
+
+            t0 = time()
+
+            lineage.emit_start({'a': 1})
+            lineage._emit_event(RunState.RUNNING)
+
+            self.assertLess(time() - t0, 0.5)  # never blocks even though endpoint is down
+            self.assertTrue(wait_for(lambda: any(os.scandir(spool_path))))
+
+            server = LineageServer(port)
+
+            try:
+                lineage._emit_event(RunState.RUNNING)
+
+                self.assertTrue(wait_for(lambda: len(server.events) == 3))
+                self.assertEqual([e['eventType'] for e in server.events], ['START', 'RUNNING', 'RUNNING'])  # spooled first, in order
+                self.assertTrue(wait_for(lambda: not any(os.scandir(spool_path))))  # spool deleted once replayed
+
+            finally:
+                lineage.shutdown()
+                server.close()
+
+    def test_spool_left_over(self):
+        port = free_port()
+
+        with tempfile.TemporaryDirectory() as spool_path:
+            client  = OpenLineageClient(transport=HttpTransport(HttpConfig(url=f'http://127.0.0.1:{port}', timeout=1, retry={'total': 0})))
+            lineage = self.lineage(client, spool_path=spool_path, retry_interval=60)
+
+            lineage.emit_start({'a': 1})
+            lineage.shutdown()
+
+            self.assertTrue(any(os.scandir(spool_path)))
+
+            server = LineageServer(port)
+
+            try:  # new run replays what the previous one could not send
+                lineage = self.lineage(client, spool_path=spool_path)
+
+                lineage.emit_start({'b': 2})
+
+                self.assertTrue(wait_for(lambda: len(server.events) == 2))
+                self.assertEqual([e['run']['facets']['openfilter'].get('a') for e in server.events], [1, None])
+
+                lineage.shutdown()
+
+            finally:
+                server.close()
+
+    def test_dedup_terminal(self):
+        lineage = self.lineage(client := BlockingClient())
+
+        lineage.emit_start({})
+        lineage.emit_stop()
+        lineage.emit_stop()
+        lineage.emit_complete()
+        lineage.emit_complete()
+        lineage.shutdown()
+
+        self.assertEqual([e.eventType for e in client.events], [RunState.START, RunState.ABORT, RunState.COMPLETE])
+
+        lineage.emit_start({})  # new run, allowed again
+        lineage.emit_stop()
+        lineage.shutdown()
+
+        self.assertEqual(len(client.events), 5)
+
+    def test_shutdown_deadline(self):
+        with tempfile.TemporaryDirectory() as spool_path:
+            lineage = self.lineage(BlockingClient(delay=3), spool_path=spool_path)
+
+            lineage.shutdown_timeout = 0.3
+
+            for _ in range(5):
+                lineage._emit_event(RunState.RUNNING)
+
+            t0 = time()
+
+            lineage.shutdown()
+
+            self.assertLess(time() - t0, 1)
+            self.assertTrue(any(os.scandir(spool_path)))  # what was still queued went to the spool
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -6,8 +6,10 @@ import unittest
 from queue import Queue, Empty
 from threading import Event, Thread
 
+import numpy as np
+
 from openfilter.filter_runtime import Frame
-from openfilter.filter_runtime.mq import MQ, MQSender, MQReceiver
+from openfilter.filter_runtime.mq import MQ, MQSender, MQReceiver, HAS_MSGPACK, HAS_ORJSON, OutputsAuto, image_map
 from openfilter.filter_runtime.utils import setLogLevelGlobal
 
 logger = logging.getLogger(__name__)
@@ -211,6 +213,270 @@ class TestMQ(unittest.TestCase):
             sender.destroy()
 
 
+    def test_shm_raw_image(self):
+        sender = ThreadMQSender('shm://test-send', 'sender', outs_jpg=False)
+
+        try:
+            receiver = MQReceiver('shm://test-send', 'receiver')
+
+            try:
+                for i in range(5):
+                    image = np.full((480, 640, 3), i, np.uint8)
+
+                    sender.send(frames := {'main': Frame(image, {'count': i}, 'BGR')})
+
+                    self.assertEqual(frames_recv := receiver.recv(), frames)
+                    self.assertTrue(frames_recv['main'].is_ro)
+
+            finally:
+                receiver.destroy()
+
+        finally:
+            sender.destroy()
+
+
+    def test_shm_large_data(self):
+        sender = ThreadMQSender('shm://test-send', 'sender')
+
+        try:
+            receiver = MQReceiver('shm://test-send', 'receiver')
+
+            try:
+                for i in range(5):
+                    sender.send(frames := {'main': Frame({'boxes': [[j + i] * 4 for j in range(5000)]})})
+
+                    self.assertEqual(receiver.recv(), frames)
+
+            finally:
+                receiver.destroy()
+
+        finally:
+            sender.destroy()
+
+
+    def test_array2buffer(self):
+        image = np.arange(480 * 640 * 3, dtype=np.uint32).astype(np.uint8).reshape(480, 640, 3)
+        frame = Frame(image.copy(), {}, 'BGR').ro
+
+        self.assertTrue(np.shares_memory(np.frombuffer((buf := MQ.array2buffer(frame.image)).buffer, np.uint8), frame.image))
+        self.assertEqual(len(buf), image.nbytes)
+
+        buf = MQ.array2buffer(image)  # writable, must be copied
+        image[...] = 0
+
+        self.assertFalse(np.shares_memory(np.frombuffer(buf.buffer, np.uint8), image))
+        self.assertEqual(buf.bytes[:4], b'\x00\x01\x02\x03')
+
+        buf = MQ.array2buffer(view := frame.image[:, ::2])  # non-contiguous, must be copied
+
+        self.assertEqual(len(buf), view.nbytes)
+        self.assertTrue(np.array_equal(np.frombuffer(buf.buffer, np.uint8).reshape(view.shape), view))
+
+        sender = ThreadMQSender('tcp://127.0.0.1', 'sender', outs_jpg=False)
+
+        try:
+            receiver = MQReceiver('tcp://127.0.0.1', 'receiver')
+
+            try:
+                sender.send(frames := {'main': frame, 'view': Frame(view, {}, 'BGR')})
+
+                self.assertEqual(receiver.recv(), frames)
+
+            finally:
+                receiver.destroy()
+
+        finally:
+            sender.destroy()
+
+
+    def test_data_codecs(self):
+        data = {'boxes': [[i, i + 1, i + 2, i + 3] for i in range(100)], 'name': 'ñ', 'score': 0.5, 'none': None}
+
+        for codec in ('json',) + ('orjson',) * HAS_ORJSON + ('msgpack',) * HAS_MSGPACK:
+            for frame in (Frame(data), Frame(np.zeros((4, 6, 3), np.uint8), data, 'BGR')):
+                topicmsgs = MQ.frames2topicmsgs({'main': frame}, False, codec)
+
+                self.assertEqual((topicmsgs['main'][0] or {}).get('dc'), 'msgpack' if codec == 'msgpack' else None)
+                self.assertEqual(MQ.topicmsgs2frames(topicmsgs), {'main': frame})
+
+    @unittest.skipUnless(HAS_ORJSON, 'orjson not installed')
+    def test_data_codec_orjson(self):
+        topicmsgs = MQ.frames2topicmsgs({'main': Frame({'score': np.float32(0.5), 1: 'a'})}, None, 'orjson')
+
+        self.assertEqual(MQ.topicmsgs2frames(topicmsgs)['main'].data, {'score': 0.5, '1': 'a'})
+
+        topicmsgs = MQ.frames2topicmsgs({'main': Frame({'nan': float('nan')})})  # stdlib writes NaN, orjson can't read
+
+        self.assertTrue(np.isnan(MQ.topicmsgs2frames(topicmsgs)['main'].data['nan']))
+
+    @unittest.skipUnless(HAS_MSGPACK, 'msgpack not installed')
+    def test_data_codec_msgpack(self):
+        data      = {'emb': np.arange(512, dtype=np.float32).reshape(2, 256), 'blob': b'\x00\x01', 'n': np.int64(5)}
+        topicmsgs = MQ.frames2topicmsgs({'main': Frame(data)}, None, 'msgpack')
+        data_recv = MQ.topicmsgs2frames(topicmsgs)['main'].data
+
+        self.assertTrue(np.array_equal(data_recv['emb'], data['emb']))
+        self.assertEqual(data_recv['emb'].dtype, np.float32)
+        self.assertEqual(data_recv['blob'], b'\x00\x01')
+        self.assertEqual(data_recv['n'], 5)
+
+    def test_data_arrays(self):
+        emb   = np.arange(512, dtype=np.float32)
+        mask  = np.eye(4, dtype=bool)[:, ::2]  # non-contiguous
+        data  = {'dets': [{'emb': emb, 'score': 0.5}, {'emb': emb * 2, 'score': np.float32(0.25)}], 'mask': mask,
+            'none': np.zeros((0, 3)), 'list': [1, 2]}
+
+        for codec in ('json',) + ('orjson',) * HAS_ORJSON + ('msgpack',) * HAS_MSGPACK:
+            for image in (None, np.zeros((4, 6, 3), np.uint8)):
+                topicmsgs = MQ.frames2topicmsgs({'main': Frame(image, data, 'BGR')}, False, codec)
+                msg       = topicmsgs['main']
+
+                self.assertEqual(len(msg[0]['nd']), 4)
+                self.assertEqual(len(msg), 2 + (image is not None) + 4)
+                self.assertEqual(len(msg[-4]), 2048)  # 512 float32 as is, not json text
+
+                frame = MQ.topicmsgs2frames(topicmsgs)['main']
+                dets  = frame.data['dets']
+
+                self.assertTrue(np.array_equal(dets[0]['emb'], emb))
+                self.assertEqual(dets[0]['emb'].dtype, np.float32)
+                self.assertTrue(np.array_equal(dets[1]['emb'], emb * 2))
+                self.assertEqual(dets[1]['score'], 0.25)
+                self.assertTrue(np.array_equal(frame.data['mask'], mask))
+                self.assertEqual(frame.data['none'].shape, (0, 3))
+                self.assertEqual(frame.data['list'], [1, 2])
+
+                if image is not None:
+                    self.assertTrue(np.array_equal(frame.image, image))
+
+        sender = ThreadMQSender('tcp://127.0.0.1', 'sender')
+
+        try:
+            receiver = MQReceiver('tcp://127.0.0.1', 'receiver')
+
+            try:
+                sender.send({'main': Frame({'emb': emb.reshape(2, 256)})})
+
+                self.assertTrue(np.array_equal(receiver.recv()['main'].data['emb'], emb.reshape(2, 256)))
+
+            finally:
+                receiver.destroy()
+
+        finally:
+            sender.destroy()
+
+    def test_yuv(self):
+        frame     = Frame(np.random.randint(0, 255, (8, 12, 3), np.uint8), {}, 'BGR').nv12
+        topicmsgs = MQ.frames2topicmsgs({'main': frame}, False)
+
+        self.assertEqual(len(topicmsgs['main'][1]), 8 * 12 * 3 // 2)  # 1.5 bytes per pixel
+
+        recv = MQ.topicmsgs2frames(topicmsgs)['main']
+
+        self.assertEqual((recv.format, recv.height, recv.width), ('NV12', 8, 12))
+        self.assertTrue(np.array_equal(recv.image, frame.image))
+
+        recv = MQ.topicmsgs2frames(MQ.frames2topicmsgs({'main': frame.i420}, True))['main']
+
+        self.assertEqual((recv.format, recv.shape), ('I420', (12, 12)))
+
+    def test_parallel_images(self):
+        images = [np.full((32, 48, 3), (i * 40, 255 - i * 40, 128), np.uint8) for i in range(6)]
+        frames = {f'cam{i}': Frame(image, {'i': i}, 'BGR') for i, image in enumerate(images)}
+
+        frames['dup'] = frames['cam0']  # same frame under two topics
+        topicmsgs     = MQ.frames2topicmsgs(frames, True)
+
+        self.assertTrue(all(f.has_jpg for f in frames.values()))  # encoded up front and cached
+        self.assertEqual(bytes(topicmsgs['cam0'][1]), bytes(topicmsgs['dup'][1]))
+
+        recv = MQ.topicmsgs2frames(topicmsgs)
+
+        self.assertFalse(any(f.has_raw for f in recv.values()))  # lazy by default
+
+        recv = MQ.topicmsgs2frames(topicmsgs, True)
+
+        self.assertTrue(all(f.has_raw for f in recv.values()))
+        self.assertEqual([recv[f'cam{i}'].data['i'] for i in range(6)], list(range(6)))
+
+        for i, image in enumerate(images):
+            self.assertLess(np.abs(recv[f'cam{i}'].image.astype(int) - image).mean(), 2)
+
+        with self.assertRaises(ZeroDivisionError):  # worker exceptions propagate
+            image_map(lambda x: 1 / x, [1, 0, 2])
+
+    def test_outputs_auto(self):
+        auto = OutputsAuto(addrs := ['ipc://test-local', 'tcp://*'], 50, 2)
+
+        self.assertEqual(auto.ladder[0], None)
+        self.assertEqual(auto.ladder[-2:], [(50, 1), (50, 2)])
+        self.assertEqual(auto.encodings(addrs), {'ipc://test-local': None, 'tcp://*': auto.ladder[1]})
+
+        image     = np.full((32, 48, 3), 128, np.uint8)
+        frames    = {'main': Frame(image, {'a': 1}, 'BGR'), 'data': Frame({'b': 2})}
+        topicmsgs = auto.topicmsgs(frames, 'json', None, addrs)
+
+        self.assertEqual(list(topicmsgs['main']), addrs)  # image encoded per output, data once for all
+        self.assertIsInstance(topicmsgs['data'], list)
+        self.assertEqual(topicmsgs['main']['ipc://test-local'][0]['img'], [32, 48, 'BGR', 'raw'])
+        self.assertEqual(topicmsgs['main']['tcp://*'][0]['img'], [32, 48, 'BGR', 'jpg'])
+
+        recv = MQ.topicmsgs2frames(MQ.frames2topicmsgs(frames, (50, 2)))['main']
+
+        self.assertEqual((recv.height, recv.width, recv.data), (16, 24, {'a': 1}))
+        self.assertLess(np.abs(recv.image.astype(int) - 128).mean(), 2)
+
+        def sends(n, stalls):
+            for _ in range(n):
+                auto.t_last = None  # keep interval at 100ms
+
+                auto.update(stalls, addrs)
+
+        auto.ival = 100
+
+        sends(OutputsAuto.HOLD, {'ipc://test-local': 0, 'tcp://*': 50})  # tcp holds up sends, compress it more
+        self.assertEqual([out[0] for out in auto.outs.values()], [0, 2])
+
+        sends(OutputsAuto.HOLD, {'ipc://test-local': 0, 'tcp://*': 50})  # that didn't help, undo and wait longer
+        self.assertEqual([out[0] for out in auto.outs.values()], [0, 1])
+        self.assertEqual(auto.outs['tcp://*'][2], OutputsAuto.HOLD * 2)
+
+        sends(OutputsAuto.HOLD * 2, {'ipc://test-local': 0, 'tcp://*': 1})  # link is fine, back to as is
+        self.assertEqual([out[0] for out in auto.outs.values()], [0, 0])
+
+    def test_outputs_auto_send(self):
+        sender = ThreadMQSender(['ipc://test-send', 'tcp://127.0.0.1:5560'], 'sender', outs_jpg='auto')
+
+        try:
+            receiver1 = ThreadMQReceiver('ipc://test-send', 'receiver1')
+
+            try:
+                receiver2 = ThreadMQReceiver('tcp://127.0.0.1:5560', 'receiver2')
+
+                try:
+                    for i in range(3):
+                        sender.send({'main': Frame(np.full((32, 48, 3), i, np.uint8), {'count': i}, 'BGR')})
+
+                        frames1 = receiver1.recv(5000)['main']
+                        frames2 = receiver2.recv(5000)['main']
+
+                        self.assertEqual((frames1.data, frames2.data), ({'count': i}, {'count': i}))
+                        self.assertTrue(frames1.has_raw and not frames1.has_jpg)  # local gets raw
+                        self.assertTrue(frames2.has_jpg and not frames2.has_raw)  # tcp gets jpg
+
+                finally:
+                    receiver2.destroy()
+
+            finally:
+                receiver1.destroy()
+
+        finally:
+            sender.destroy()
+
+    def test_data_codec_invalid(self):
+        with self.assertRaises(ValueError):
+            MQSender('tcp://127.0.0.1', 'sender', outs_codec='pickle')
+
 
 if __name__ == '__main__':
     unittest.main()
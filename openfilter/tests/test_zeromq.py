@@ -3,12 +3,15 @@
 import logging
 import os
 import unittest
+from mmap import mmap
 from queue import Queue
 from random import randint
-from threading import Thread
-from time import sleep
+from threading import Event, Thread
+from time import sleep, time
 
-from openfilter.filter_runtime.zeromq import ZMQStateRecv, ZMQStateSend, ZMQReceiver, ZMQSender, logger as zeromq_logger
+from openfilter.filter_runtime import zeromq
+from openfilter.filter_runtime.zeromq import ZMQStateRecv, ZMQStateSend, ZMQReceiver, ZMQSender, ZMQWaker, \
+    logger as zeromq_logger
 
 zeromq_logger.setLevel(int(getattr(logging, (os.getenv('LOG_LEVEL') or 'CRITICAL').upper())))
 
@@ -135,6 +138,30 @@ class TestZeroMQOld(unittest.TestCase):
             sendt.join()
 
 
+class TestZeroMQEnv(unittest.TestCase):
+    def test_env_codec(self):
+        for env in [
+            {'sid': 'server', 'mid': 5, 'topics': ['main', 'other'], 'xtra': {'img': [480, 640, 'BGR', 'jpg']}},
+            {'sid': 'server', 'mid': 0, 'topics': [], 'bal': 2},
+            {'sid': 'server', 'mid': 3, 'topics': ['main'], 'xtra': None, 'shm': [[0, 'name', 1, 100]]},
+        ]:
+            rest = {k: v for k in ('xtra', 'shm') if (v := env.get(k)) is not None}
+            buf  = zeromq.env_pub_prefix(env['sid'], env['mid'], env['topics'], env.get('bal', False))
+            buf += zeromq.json_dumps(rest).encode() if rest else b''
+
+            self.assertNotEqual(buf[:1], b'{')
+            self.assertEqual(zeromq.env_pub_decode(buf), {**{k: v for k, v in env.items() if v is not None}, 'env': 1})
+            self.assertEqual(zeromq.env_pub_decode(zeromq.json_dumps(env).encode()), env)
+
+        for env in [
+            {'cid': 'client', 'mid': 7, 'uid': 'uniq'},
+            {'cid': 'client', 'mid': -3, 'uid': 'uniq', 'eph': 2, 'new': True, 'rel': [['name', 3]]},
+            {'cid': 'client', 'mid': -2, 'xtra': {'a': 1}},
+        ]:
+            self.assertEqual(zeromq.env_req_decode(zeromq.env_req_encode(env)), {**env, 'env': 1})
+            self.assertEqual(zeromq.env_req_decode(zeromq.json_dumps(env).encode()), env)
+
+
 class TestZeroMQTCP(unittest.TestCase):
     """This test was written before the ZMQ_CONN_HANDSHAKE mechanism was implemented. Which changes the startup, but
     does not invalidate the packet flow expected in these tests. For this reason the test is left as it is still very
@@ -618,6 +645,67 @@ class TestZeroMQTCP(unittest.TestCase):
             sendr1.destroy()
 
 
+    def test_topic_filter(self):
+        topic_filter            = zeromq.ZMQ_TOPIC_FILTER
+        zeromq.ZMQ_TOPIC_FILTER = True
+        sendr                   = ZMQSender(self.SERVER1, 'server')
+
+        try:
+            recvr1 = ZMQReceiver([(self.CLIENT1, [('main', 'main')])], 'client1')
+
+            try:
+                recvr2 = ZMQReceiver(self.CLIENT1+'??', 'client2')
+
+                try:
+                    sleep(0.1)
+
+                    self.assertEqual(recvl(recvr1, timeout=0), None)
+
+                    sleep(0.1)
+
+                    wanted = []
+
+                    def topicmsgs():
+                        wanted.append(sendr.topics_wanted)
+
+                        return {'main': [None, b'm0'], 'othr': None}  # 'othr' not wanted so not encoded
+
+                    self.assertEqual(send(sendr, topicmsgs, timeout=100), 1)
+                    self.assertEqual(wanted, [{'main'}])
+
+                    sleep(0.01)
+
+                    self.assertEqual(recvl(recvr1, timeout=1000), (0, {'main': [None, b'm0']}))
+                    self.assertEqual(recvl(recvr2, timeout=1000), (0, {'main': [None, b'm0']}))  # only sees what is wanted
+
+                    self.assertEqual(send(sendr, {'main': [None, b'm1'], 'othr': [None, b'o1']}, timeout=100), 2)
+
+                    sleep(0.01)
+
+                    self.assertEqual(recvl(recvr1, timeout=1000), (1, {'main': [None, b'm1']}))
+                    self.assertEqual(recvl(recvr2, timeout=1000), (1, {'main': [None, b'm1']}))
+
+                    zeromq.ZMQ_TOPIC_FILTER = False
+
+                    self.assertEqual(send(sendr, d := {'main': [None, b'm2'], 'othr': [None, b'o2']}, timeout=100), 3)
+
+                    sleep(0.01)
+
+                    self.assertEqual(recvl(recvr1, timeout=1000), (2, {'main': [None, b'm2']}))
+                    self.assertEqual(recvl(recvr2, timeout=1000), (2, d))
+
+                finally:
+                    recvr2.destroy()
+
+            finally:
+                recvr1.destroy()
+
+        finally:
+            sendr.destroy()
+
+            zeromq.ZMQ_TOPIC_FILTER = topic_filter
+
+
     def test_send_recv_ephemeral(self):
         sendr = ZMQSender(self.SERVER1, 'server')
 
@@ -918,6 +1006,108 @@ class TestZeroMQTCP(unittest.TestCase):
             sendr1.destroy()
 
 
+    def test_outputs_balance_inflight(self):
+        sendr = ZMQSender([self.SERVER1, self.SERVER2], 'server', balance=True)
+
+        try:
+            recvr1 = ZMQReceiver(self.CLIENT1, 'client1', prefetch=2)
+
+            try:
+                recvr2 = ZMQReceiver(self.CLIENT2, 'client2', prefetch=2)
+
+                try:
+                    self.assertEqual(recvl(recvr1, timeout=0), None)
+                    self.assertEqual(recvl(recvr2, timeout=0), None)
+
+                    sleep(0.1)
+
+                    for i in range(4):  # two in flight to each, least in flight first
+                        self.assertEqual(send(sendr, {'main': [None, f'm{i}'.encode()]}, timeout=100), i + 1)
+
+                    self.assertEqual(send(sendr, {'main': [None, b'm4']}, timeout=100), None)  # both windows full
+
+                    self.assertEqual(recvl(recvr1, timeout=100), (0, {'main': [None, b'm0']}))
+                    self.assertEqual(recvl(recvr2, timeout=100), (1, {'main': [None, b'm1']}))
+                    self.assertEqual(recvl(recvr1, timeout=100), (2, {'main': [None, b'm2']}))
+                    self.assertEqual(recvl(recvr2, timeout=100), (3, {'main': [None, b'm3']}))
+
+                    self.assertEqual(send(sendr, {'main': [None, b'm4']}, timeout=100), 5)
+
+                finally:
+                    recvr2.destroy()
+
+            finally:
+                recvr1.destroy()
+
+        finally:
+            sendr.destroy()
+
+
+    def test_sources_balance_reorder(self):
+        sendr1 = ZMQSender(self.SERVER1, 'server1')
+
+        try:
+            sendr2 = ZMQSender(self.SERVER2, 'server2')
+
+            try:
+                sendr3 = ZMQSender(self.SERVER3, 'server3')
+
+                try:
+                    recvr = ZMQReceiver([self.CLIENT1, self.CLIENT2, self.CLIENT3], 'client', balance=True)
+
+                    try:
+                        self.assertEqual(recvl(recvr, timeout=0), None)
+
+                        sleep(0.1)
+
+                        d = [{'main': [None, f'm{i}'.encode()]} for i in range(9)]
+
+                        self.assertEqual(send(sendr1, d[0], sendstate(0), timeout=100), 1)
+                        self.assertEqual(recvl(recvr, timeout=100), (0, d[0]))
+
+                        self.assertEqual(send(sendr3, d[2], sendstate(2), timeout=100), 3)  # overtakes 1
+                        self.assertEqual(recvl(recvr, timeout=100), None)  # held waiting for 1
+
+                        self.assertEqual(send(sendr2, d[1], sendstate(1), timeout=100), 2)
+                        self.assertEqual(recvl(recvr, timeout=100), (1, d[1]))
+                        self.assertEqual(recvl(recvr, timeout=0), (2, d[2]))
+
+                        self.assertEqual(send(sendr1, d[4], sendstate(4), timeout=100), 5)  # 3 lost
+                        self.assertEqual(send(sendr2, d[5], sendstate(5), timeout=100), 6)
+                        self.assertEqual(send(sendr3, d[6], sendstate(6), timeout=100), 7)
+                        self.assertEqual(recvl(recvr, timeout=100), (4, d[4]))  # everyone is past 3, can't come anymore
+                        self.assertEqual(recvl(recvr, timeout=100), (5, d[5]))
+                        self.assertEqual(recvl(recvr, timeout=100), (6, d[6]))
+
+                        reorder_timeout = zeromq.ZMQ_REORDER_TIMEOUT
+
+                        try:
+                            zeromq.ZMQ_REORDER_TIMEOUT = 300
+
+                            self.assertEqual(send(sendr1, d[8], sendstate(8), timeout=100), 9)  # 7 lost but could still come
+                            self.assertEqual(recvl(recvr, timeout=100), None)
+
+                            t0 = time()
+
+                            self.assertEqual(recvl(recvr, timeout=1000), (8, d[8]))
+                            self.assertLess(time() - t0, 0.5)
+
+                        finally:
+                            zeromq.ZMQ_REORDER_TIMEOUT = reorder_timeout
+
+                    finally:
+                        recvr.destroy()
+
+                finally:
+                    sendr3.destroy()
+
+            finally:
+                sendr2.destroy()
+
+        finally:
+            sendr1.destroy()
+
+
     def test_outputs_balance_doubly_ephemeral_watch(self):
         sendr = ZMQSender([self.SERVER1, self.SERVER2, self.SERVER3], 'server', balance=True)
 
@@ -1218,6 +1408,137 @@ class TestZeroMQTCP(unittest.TestCase):
             sendr.destroy()
 
 
+    def test_recv_zerocopy(self):
+        sendr = ZMQSender(self.SERVER1, 'server')
+
+        try:
+            recvr = ZMQReceiver(self.CLIENT1, 'client')
+
+            try:
+                self.assertEqual(recvl(recvr, timeout=0), None)
+
+                sleep(0.1)
+
+                big = bytes(range(256)) * (zeromq.ZMQ_RECV_ZEROCOPY_MIN // 256)
+
+                self.assertEqual(send(sendr, {'main': [None, big, b'small']}), 1)
+
+                _, d = recvl(recvr, timeout=1000)
+                msg  = d['main']
+
+                self.assertIsInstance(msg[1], memoryview)  # not copied out of the zmq message
+                self.assertTrue(msg[1].readonly)
+                self.assertEqual(msg[1], big)
+                self.assertIsInstance(msg[2], bytes)
+                self.assertEqual(msg[2], b'small')
+
+            finally:
+                recvr.destroy()
+
+        finally:
+            sendr.destroy()
+
+
+    def test_env_binary(self):
+        sendr = ZMQSender(self.SERVER1, 'server')
+
+        try:
+            recvr = ZMQReceiver(self.CLIENT1, 'client')
+
+            try:
+                self.assertEqual(recvl(recvr, timeout=0), None)
+
+                sleep(0.1)
+
+                for i in range(4):  # first JSON with advertisement, then binary both ways
+                    d = {'main': [{'i': i}, b'data'], 'other': [None]}
+
+                    self.assertEqual(send(sendr, d), i + 1)
+                    self.assertEqual(recvl(recvr, timeout=1000), (i, d))
+
+                self.assertTrue(all(s.env_bin for s in recvr.senders.values()))
+                self.assertTrue(all(c.env == zeromq.ENV_VERSION for c in sendr.clients.values()))
+
+            finally:
+                recvr.destroy()
+
+        finally:
+            sendr.destroy()
+
+
+    def test_prefetch(self):
+        sendr = ZMQSender(self.SERVER1, 'server')
+
+        try:
+            recvr = ZMQReceiver(self.CLIENT1, 'client', prefetch=4)
+
+            try:
+                self.assertEqual(recvl(recvr, timeout=0), None)  # request first message with a window of 4
+
+                sleep(0.1)
+
+                for i in range(4):  # all sent on the single request
+                    self.assertEqual(send(sendr, {'main': [None, str(i).encode()]}, timeout=100), i + 1)
+
+                self.assertEqual(send(sendr, {'main': [None, b'4']}, timeout=100), None)  # window full
+
+                self.assertEqual(recvl(recvr, timeout=1000), (0, {'main': [None, b'0']}))  # request on receipt opens window by 1
+
+                self.assertEqual(send(sendr, {'main': [None, b'4']}, timeout=1000), 5)
+                self.assertEqual(send(sendr, {'main': [None, b'5']}, timeout=100), None)
+
+                for i in range(1, 5):  # were waiting in the socket buffers in order
+                    self.assertEqual(recvl(recvr, timeout=1000), (i, {'main': [None, str(i).encode()]}))
+
+                for i in range(5, 120):  # steady state
+                    self.assertEqual(send(sendr, d := {'main': [None, str(i).encode()]}, timeout=1000), i + 1)
+                    self.assertEqual(recvl(recvr, timeout=1000), (i, d))
+
+                    sleep(0.0002)
+
+            finally:
+                recvr.destroy()
+
+        finally:
+            sendr.destroy()
+
+
+    def test_waker(self):
+        waker = ZMQWaker(evt := Event())
+        sendr = ZMQSender(self.SERVER1, 'server', waker=waker)
+
+        try:
+            recvr = ZMQReceiver(self.CLIENT2, 'client', waker=waker)  # nobody there, would wait forever
+
+            try:
+                res = []
+                thrd_recv = Thread(target=lambda: res.append(recvr.recv()))
+                thrd_send = Thread(target=lambda: res.append(sendr.send({'main': [None]})))  # nobody requesting
+
+                thrd_recv.start()
+                thrd_send.start()
+                sleep(0.3)
+
+                self.assertTrue(thrd_recv.is_alive() and thrd_send.is_alive())
+
+                t0 = time()
+
+                evt.set()
+                thrd_recv.join(1)
+                thrd_send.join(1)
+
+                self.assertLess(time() - t0, 0.5)  # woken immediately, not on a poll timeout
+                self.assertEqual(res, [None, None])
+                self.assertIsNone(recvr.recv())  # and stays woken
+
+            finally:
+                recvr.destroy()
+
+        finally:
+            sendr.destroy()
+            waker.close()
+
+
 class TestZeroMQIPC(TestZeroMQTCP):
     SERVER1 = 'ipc://ipc_5550'
     SERVER2 = 'ipc://ipc_5552'
@@ -1261,5 +1582,121 @@ class TestZeroMQIPC(TestZeroMQTCP):
     #         sendr.destroy()
 
 
+class TestZeroMQSHM(TestZeroMQTCP):
+    SERVER1 = 'shm://ipc_5550'
+    SERVER2 = 'shm://ipc_5552'
+    SERVER3 = 'shm://ipc_5554'
+    CLIENT1 = 'shm://ipc_5550'
+    CLIENT2 = 'ipc://ipc_5552'  # ipc:// client to shm:// server is same thing
+    CLIENT3 = 'shm://ipc_5554'
+
+
+    def test_shm_large(self):
+        sendr = ZMQSender(self.SERVER1, 'server')
+
+        try:
+            recvr = ZMQReceiver(self.CLIENT1, 'client')
+
+            try:
+                self.assertEqual(recvl(recvr, timeout=0), None)
+
+                sleep(0.1)
+
+                for i in range(20):
+                    big = bytes([i]) * 0x20000
+
+                    self.assertEqual(send(sendr, {'main': [{'i': i}, big, b'small']}), i + 1)
+
+                    msg_id, d = recvl(recvr, timeout=1000)
+                    msg       = d['main']
+
+                    self.assertEqual(msg_id, i)
+                    self.assertEqual(msg[0], {'i': i})
+                    self.assertIsInstance(msg[1], memoryview)  # mapped directly from shared memory, not copied
+                    self.assertTrue(msg[1].readonly)
+                    self.assertEqual(msg[1], big)
+                    self.assertEqual(msg[2], b'small')
+
+                    sleep(0.0002)
+
+            finally:
+                recvr.destroy()
+
+        finally:
+            sendr.destroy()
+
+
+    def test_shm_stale(self):
+        sendr = ZMQSender(self.SERVER1, 'server')
+
+        try:
+            recvr = ZMQReceiver(self.CLIENT1 + '?', 'client')
+
+            try:
+                self.assertEqual(recvl(recvr, timeout=0), None)
+
+                sleep(0.1)
+
+                for i in range(nsent := zeromq.ZMQ_SHM_SLOTS + 2):  # ephemeral doesn't pin so ring is overwritten
+                    self.assertEqual(send(sendr, {'main': [None, bytes([i]) * 0x20000]}, push=True), i + 1)
+
+                sleep(0.1)
+
+                _, d = recvl(recvr, timeout=1000)  # oldest ones dropped as stale, first valid one copied out
+                data = d['main'][1]
+
+                self.assertIsInstance(data, bytes)
+                self.assertEqual(data, data[:1] * 0x20000)
+                self.assertEqual(data[0], nsent - zeromq.ZMQ_SHM_SLOTS)
+
+            finally:
+                recvr.destroy()
+
+        finally:
+            sendr.destroy()
+
+
+    def test_shm_pinned(self):
+        sendr = ZMQSender(self.SERVER1, 'server')
+
+        try:
+            recvr = ZMQReceiver(self.CLIENT1, 'client')
+
+            try:
+                self.assertEqual(recvl(recvr, timeout=0), None)
+
+                sleep(0.1)
+
+                held = []
+
+                for i in range(zeromq.ZMQ_SHM_SLOTS + 2):  # hold on to everything received, no slot may be overwritten
+                    self.assertEqual(send(sendr, {'main': [None, bytes([i]) * 0x20000]}), i + 1)
+
+                    _, d = recvl(recvr, timeout=1000)
+
+                    held.append(data := d['main'][1])
+
+                    self.assertEqual(isinstance(data.obj, mmap), i < zeromq.ZMQ_SHM_SLOTS)  # all pinned -> inline
+
+                for i, data in enumerate(held):
+                    self.assertEqual(data, bytes([i]) * 0x20000)
+
+                del data, d
+                held.clear()  # releases are sent upstream with the next request, which is the prefetch of the next recv
+
+                for i in range(2):
+                    self.assertEqual(send(sendr, {'main': [None, b'x' * 0x20000]}), zeromq.ZMQ_SHM_SLOTS + 3 + i)
+
+                    _, d = recvl(recvr, timeout=1000)
+
+                    self.assertEqual(isinstance(d['main'][1].obj, mmap), i == 1)
+
+            finally:
+                recvr.destroy()
+
+        finally:
+            sendr.destroy()
+
+
 if __name__ == '__main__':
     unittest.main()